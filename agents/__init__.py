@@ -4,6 +4,14 @@ Communication agents for different channels
 
 from agents.email_agent import EmailAgent
 from agents.sms_agent import SMSAgent, TwilioSMSAgent
+from agents.push_receiver import PushNotificationReceiver, LocalNotifier
+from agents.message_cache import MessageCache
+from agents.rate_limiter import GmailRateLimiter
+from agents.service_pool import GmailServicePool
+from agents.fake_gmail import FakeGmailService
+from agents.attachment_extractor import AttachmentExtractor
 
-__all__ = ['EmailAgent', 'SMSAgent', 'TwilioSMSAgent']
+__all__ = ['EmailAgent', 'SMSAgent', 'TwilioSMSAgent', 'PushNotificationReceiver', 'LocalNotifier',
+           'MessageCache', 'GmailRateLimiter', 'GmailServicePool',
+           'FakeGmailService', 'AttachmentExtractor']
 
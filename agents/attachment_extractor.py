@@ -0,0 +1,252 @@
+"""
+Text extraction from job-description attachments (PDF, DOCX, plain text)
+
+Recruiters often send the job description as an attachment with a one-line
+body. The mail agents call AttachmentExtractor only when a body is thin.
+Parsing runs in a small process pool, so a pathological file can be killed
+at its time limit without taking down the agent. Results are cached in
+SQLite by content hash (and by message/part, so a cached attachment is
+not even downloaded again).
+"""
+
+import io
+import os
+import re
+import time
+import zipfile
+import hashlib
+import sqlite3
+import threading
+import multiprocessing
+from typing import Optional
+from xml.etree import ElementTree
+
+try:
+    from pypdf import PdfReader
+except ImportError:
+    PdfReader = None
+
+from utils.metrics import metrics
+
+
+PDF_TYPES = ('application/pdf',)
+DOCX_TYPES = ('application/vnd.openxmlformats-officedocument.wordprocessingml.document',)
+TEXT_TYPES = ('text/plain',)
+
+WORD_NAMESPACE = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+
+def _extract_pdf(data: bytes, max_chars: int) -> str:
+    if PdfReader is None:
+        raise ImportError("pypdf is required for PDF attachments (pip install pypdf)")
+
+    reader = PdfReader(io.BytesIO(data))
+    pages, length = [], 0
+    for page in reader.pages:
+        text = page.extract_text() or ''
+        pages.append(text)
+        length += len(text)
+        if length >= max_chars:
+            break
+    return '\n'.join(pages)
+
+
+def _extract_docx(data: bytes, max_chars: int) -> str:
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        # Guard against zip bombs: the document part is read with a size cap
+        with archive.open('word/document.xml') as document:
+            xml = document.read(max_chars * 20)
+
+    paragraphs = []
+    try:
+        for _, element in ElementTree.iterparse(io.BytesIO(xml)):
+            if element.tag == f'{WORD_NAMESPACE}p':
+                text = ''.join(node.text or '' for node in element.iter(f'{WORD_NAMESPACE}t'))
+                if text:
+                    paragraphs.append(text)
+                element.clear()
+    except ElementTree.ParseError:
+        # Cut off by the size cap; keep the paragraphs read so far
+        pass
+    return '\n'.join(paragraphs)
+
+
+def _extract(kind: str, data: bytes, max_chars: int) -> str:
+    """Runs in a worker process"""
+    if kind == 'pdf':
+        text = _extract_pdf(data, max_chars)
+    elif kind == 'docx':
+        text = _extract_docx(data, max_chars)
+    else:
+        text = data[:max_chars * 4].decode('utf-8', 'replace')
+    return re.sub(r'[ \t]+', ' ', re.sub(r'\n\s*\n+', '\n\n', text)).strip()[:max_chars]
+
+
+def attachment_kind(mime_type: str, filename: str = '') -> Optional[str]:
+    """'pdf', 'docx' or 'text' for supported attachments, else None"""
+    mime_type = (mime_type or '').lower()
+    extension = os.path.splitext(filename or '')[1].lower()
+
+    if mime_type in PDF_TYPES or extension == '.pdf':
+        return 'pdf' if PdfReader is not None else None
+    if mime_type in DOCX_TYPES or extension == '.docx':
+        return 'docx'
+    if mime_type in TEXT_TYPES or extension == '.txt':
+        return 'text'
+    return None
+
+
+class AttachmentExtractor:
+    """Process-pool text extraction with per-file size/time limits and a hash-keyed cache"""
+
+    def __init__(self, cache_path: str = "data/attachment_cache.db", workers: int = 2,
+                 max_file_bytes: int = 5 * 1024 * 1024, timeout: float = 20.0,
+                 max_chars: int = 20000):
+        """
+        Args:
+            cache_path: SQLite file for extracted text
+            workers: Extraction processes
+            max_file_bytes: Larger attachments are skipped without being downloaded
+            timeout: Seconds one file may take before its worker is killed
+            max_chars: Cap on text kept per attachment
+        """
+        self.cache_path = cache_path
+        self.workers = workers
+        self.max_file_bytes = max_file_bytes
+        self.timeout = timeout
+        self.max_chars = max_chars
+
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.cache_path) or '.', exist_ok=True)
+        conn = sqlite3.connect(self.cache_path)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS attachment_text (
+                content_hash TEXT PRIMARY KEY,
+                text TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        # Message part -> content hash, so known attachments aren't downloaded again
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS attachment_refs (
+                ref TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL
+            )
+        """)
+        conn.commit()
+        conn.close()
+
+    def supports(self, mime_type: str, filename: str = '', size: int = 0) -> bool:
+        """Whether an attachment is worth downloading"""
+        return attachment_kind(mime_type, filename) is not None and size <= self.max_file_bytes
+
+    def cached_text(self, ref: str) -> Optional[str]:
+        """Text previously extracted for a message part (e.g. 'msg_id/part_id')"""
+        conn = sqlite3.connect(self.cache_path)
+        row = conn.execute("""
+            SELECT t.text FROM attachment_refs r
+            JOIN attachment_text t ON t.content_hash = r.content_hash
+            WHERE r.ref = ?
+        """, (ref,)).fetchone()
+        conn.close()
+        return row[0] if row else None
+
+    def extract(self, data: bytes, mime_type: str, filename: str = '', ref: Optional[str] = None) -> str:
+        """
+        Text of an attachment ('' if unsupported, too large, too slow or unreadable)
+
+        Args:
+            data: Attachment bytes
+            mime_type: Declared MIME type
+            filename: Used when the MIME type is generic (application/octet-stream)
+            ref: Optional message part reference remembered for cached_text()
+        """
+        kind = attachment_kind(mime_type, filename)
+        if kind is None or len(data) > self.max_file_bytes:
+            return ''
+
+        content_hash = hashlib.sha256(data).hexdigest()
+        conn = sqlite3.connect(self.cache_path)
+        row = conn.execute("SELECT text FROM attachment_text WHERE content_hash = ?", (content_hash,)).fetchone()
+        conn.close()
+
+        if row is not None:
+            metrics.increment('attachments.cache_hits')
+            text = row[0]
+        else:
+            text = self._run(kind, data, filename)
+            if text is None:
+                return ''
+
+        conn = sqlite3.connect(self.cache_path)
+        conn.execute("INSERT OR IGNORE INTO attachment_text (content_hash, text, created_at) VALUES (?, ?, ?)",
+                     (content_hash, text, time.time()))
+        if ref:
+            conn.execute("INSERT OR REPLACE INTO attachment_refs (ref, content_hash) VALUES (?, ?)",
+                         (ref, content_hash))
+        conn.commit()
+        conn.close()
+        return text
+
+    def _get_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                # Fresh processes now and then keep parser memory leaks in check
+                self._pool = multiprocessing.get_context('spawn').Pool(self.workers, maxtasksperchild=50)
+            return self._pool
+
+    def _run(self, kind: str, data: bytes, filename: str) -> Optional[str]:
+        """Extract in the pool; None on timeout (not cached, so a later read retries)"""
+        if kind == 'text':
+            return _extract(kind, data, self.max_chars)
+
+        started = time.perf_counter()
+        try:
+            text = self._get_pool().apply_async(_extract, (kind, data, self.max_chars)).get(self.timeout)
+        except multiprocessing.TimeoutError:
+            print(f"Attachment {filename or kind} took over {self.timeout}s - skipped")
+            metrics.increment('attachments.timeouts')
+            # The worker may be stuck; replace the whole pool
+            self.close()
+            return None
+        except Exception as e:
+            print(f"Could not extract text from {filename or kind}: {e}")
+            metrics.increment('attachments.errors')
+            return ''
+
+        metrics.increment('attachments.extracted')
+        metrics.observe('attachments.extract_seconds', time.perf_counter() - started)
+        return text
+
+    def close(self):
+        """Terminate the worker processes"""
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.terminate()
+                self._pool.join()
+                self._pool = None
+
+
+if __name__ == "__main__":
+    # Extract a generated DOCX twice; the second read comes from the cache
+    import tempfile
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.writestr('word/document.xml', (
+            f'<w:document xmlns:w="{WORD_NAMESPACE[1:-1]}"><w:body>'
+            '<w:p><w:r><w:t>Senior SDET - Acme Systems</w:t></w:r></w:p>'
+            '<w:p><w:r><w:t>Remote, $150k-$170k. </w:t></w:r><w:r><w:t>Java, Selenium, CI/CD.</w:t></w:r></w:p>'
+            '</w:body></w:document>'
+        ))
+
+    extractor = AttachmentExtractor(cache_path=os.path.join(tempfile.mkdtemp(), 'attachments.db'))
+    for _ in range(2):
+        start = time.perf_counter()
+        text = extractor.extract(buffer.getvalue(), DOCX_TYPES[0], 'JD.docx', ref='demo/1')
+        print(f"{time.perf_counter() - start:.3f}s: {text!r}")
+    print(f"By reference: {extractor.cached_text('demo/1')!r}")
+    print(f"PDF support: {'yes' if PdfReader is not None else 'no (pip install pypdf)'}")
+    extractor.close()
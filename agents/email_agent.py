@@ -5,28 +5,117 @@ Email Agent for handling recruiter emails via Gmail API
 import os
 import base64
 import re
-from typing import List, Dict, Optional
+import queue
+import threading
+from typing import List, Dict, Iterator, Optional
 from datetime import datetime
 from email.mime.text import MIMEText
 
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
+from agents.mime_walker import DEFAULT_BODY_MAX_BYTES, extract_body, list_attachments
+from agents.rate_limiter import GmailRateLimiter, is_rate_limit_error
+from agents.recruiter_classifier import RecruiterClassifier, is_recruiter_heuristic
+from agents.service_pool import GmailServicePool
+
+
+REPLY_SIGNATURE = "\n\n--\nElena\nJava Selenium Automation Architect"
+
 
 class EmailAgent:
     """Handles email communication with recruiters"""
     
     SCOPES = ['https://www.googleapis.com/auth/gmail.modify']
     
+    # Gmail accepts at most 100 calls in one batch HTTP request
+    MAX_BATCH_SIZE = 100
+    
+    # sync_state key holding the last mailbox historyId seen
+    HISTORY_ID_KEY = 'gmail_history_id'
+    
+    # messages.batchModify accepts at most 1000 message IDs per call
+    MAX_BATCH_MODIFY_IDS = 1000
+    
+    # Headers the recruiter screening pass needs (fetched with format='metadata')
+    SCREENING_HEADERS = ['From', 'Subject', 'Date']
+    
+    # Bump when _parse_message output changes so cached parses are ignored
+    PARSER_VERSION = 3
+    
+    # Built-in labels, whose IDs are the same as their names
+    SYSTEM_LABELS = {'INBOX', 'UNREAD', 'STARRED', 'IMPORTANT', 'SPAM', 'TRASH', 'SENT', 'DRAFT'}
+    
     def __init__(self, credentials_path: str = "credentials/gmail_credentials.json",
-                 token_path: str = "credentials/gmail_token.json"):
+                 token_path: str = "credentials/gmail_token.json",
+                 batch_size: int = MAX_BATCH_SIZE,
+                 state_manager=None,
+                 incremental_sync: bool = False,
+                 recruiter_model_path: Optional[str] = None,
+                 message_cache=None,
+                 rate_limiter: Optional[GmailRateLimiter] = None,
+                 service=None,
+                 body_max_bytes: int = DEFAULT_BODY_MAX_BYTES,
+                 strip_quoted_replies: bool = True,
+                 attachment_extractor=None,
+                 attachment_min_body_chars: int = 200):
+        """
+        Args:
+            credentials_path: OAuth client secrets file
+            token_path: Where the authorized user token is cached
+            batch_size: Calls per Gmail batch HTTP request (max 100)
+            state_manager: StateManager used to persist the sync checkpoint
+            incremental_sync: Fetch only mail added since the last poll via
+                              the Gmail history API (requires state_manager)
+            recruiter_model_path: Trained recruiter classifier; keyword
+                                  heuristics are used if the file doesn't exist
+            message_cache: Optional MessageCache of parsed messages
+            rate_limiter: GmailRateLimiter shared by all calls (default:
+                          250 quota units/s)
+            service: Ready-made Gmail service (e.g. FakeGmailService); skips
+                     OAuth and is shared by all threads
+            body_max_bytes: Cap on the body text decoded per message
+            strip_quoted_replies: Drop quoted reply history from bodies
+            attachment_extractor: Optional AttachmentExtractor; when set, text
+                                  from PDF/DOCX attachments is appended to
+                                  bodies shorter than attachment_min_body_chars
+        """
         self.credentials_path = credentials_path
         self.token_path = token_path
-        self.service = None
-        self._authenticate()
+        self.batch_size = max(1, min(batch_size, self.MAX_BATCH_SIZE))
+        self.state_manager = state_manager
+        self.incremental_sync = incremental_sync and state_manager is not None
+        # Sync values from the last fetch, stored by commit_sync_checkpoint() once its mail is handled
+        self._pending_checkpoint: Dict[str, str] = {}
+        self.message_cache = message_cache
+        self.rate_limiter = rate_limiter or GmailRateLimiter()
+        self.body_max_bytes = body_max_bytes
+        self.strip_quoted_replies = strip_quoted_replies
+        self.attachment_extractor = attachment_extractor
+        self.attachment_min_body_chars = attachment_min_body_chars
+        self._service = None
+        self._service_pool: Optional[GmailServicePool] = None
+        
+        # Label name -> ID, loaded on first use
+        self._label_ids: Optional[Dict[str, str]] = None
+        self._labels_lock = threading.RLock()
+        
+        # Label/unread changes queued until flush_modifications():
+        # msg_id -> {'add': set of label names, 'remove': set of label names}
+        self._pending_modifications: Dict[str, Dict[str, set]] = {}
+        self._modifications_lock = threading.Lock()
+        
+        self.recruiter_classifier = RecruiterClassifier.load_if_valid(recruiter_model_path)
+        
+        if self.message_cache is not None:
+            self.message_cache.bind_parser(self.PARSER_VERSION, self._parse_options())
+        
+        if service is not None:
+            self.service = service
+        else:
+            self._authenticate()
     
     def _authenticate(self):
         """Authenticate with Gmail API"""
@@ -56,7 +145,24 @@ class EmailAgent:
             with open(self.token_path, 'w') as token:
                 token.write(creds.to_json())
         
-        self.service = build('gmail', 'v1', credentials=creds)
+        self._service_pool = GmailServicePool(creds)
+    
+    def _execute(self, request, method: str, count: int = 1):
+        """Execute an API request (or batch of count calls) within the Gmail quota"""
+        return self.rate_limiter.execute(request, method, count)
+    
+    @property
+    def service(self):
+        """Gmail service for the calling thread, so EmailAgent can be used from a thread pool"""
+        if self._service_pool is not None:
+            return self._service_pool.get()
+        return self._service
+    
+    @service.setter
+    def service(self, value):
+        # An explicitly assigned service is shared by all threads
+        self._service = value
+        self._service_pool = None
     
     def get_unread_recruiter_emails(self, max_results: int = 10) -> List[Dict]:
         """
@@ -71,184 +177,478 @@ class EmailAgent:
             - body: Email body (plain text)
             - date: Received date
             - labels: Gmail labels
+        
+        With incremental sync enabled, only unread mail added since the
+        previous call is returned (max_results is the page size of full resyncs).
         """
-        try:
-            # Search for unread emails
-            query = "is:unread"
+        if self.incremental_sync:
+            return self._get_new_recruiter_emails(max_results)
+        
+        return list(self.iter_unread_recruiter_emails(page_size=max_results, max_messages=max_results))
+    
+    def iter_unread_recruiter_emails(self, page_size: int = 100,
+                                     max_messages: Optional[int] = None,
+                                     prefetch: bool = False) -> Iterator[Dict]:
+        """
+        Stream unread recruiter emails page by page, following nextPageToken
+        
+        Only one page is held in memory at a time (two with prefetch), and
+        the first emails are yielded as soon as their page is fetched.
+        
+        Args:
+            page_size: Messages listed per page (Gmail allows up to 500)
+            max_messages: Stop after listing this many unread messages
+            prefetch: Fetch the next page on a background thread while the
+                      caller works on the current one
+        
+        Yields:
+            Email dicts, same structure as get_unread_recruiter_emails()
+        """
+        if self.incremental_sync:
+            yield from self._get_new_recruiter_emails(max_messages or page_size)
+            return
+        
+        if prefetch and self._service_pool is not None:
+            yield from self._iter_pages_prefetched(page_size, max_messages)
+            return
+        
+        for page in self._iter_unread_pages(page_size, max_messages):
+            yield from page
+    
+    def _iter_unread_pages(self, page_size: int, max_messages: Optional[int]) -> Iterator[List[Dict]]:
+        """Parsed recruiter emails, one list per page of unread messages"""
+        page_token = None
+        listed = 0
+        
+        while True:
+            if max_messages:
+                page_size = min(page_size, max_messages - listed)
             
-            results = self.service.users().messages().list(
-                userId='me',
-                q=query,
-                maxResults=max_results
-            ).execute()
+            try:
+                # Search for unread emails
+                results = self._execute(self.service.users().messages().list(
+                    userId='me',
+                    q="is:unread",
+                    maxResults=page_size,
+                    pageToken=page_token
+                ), 'messages.list')
+            except HttpError as error:
+                print(f"Gmail API error: {error}")
+                return
             
             messages = results.get('messages', [])
+            listed += len(messages)
             
-            email_list = []
-            for msg in messages:
-                email_data = self._parse_email(msg['id'])
-                
-                # Filter for recruiter emails (basic heuristics)
-                if self._is_likely_recruiter(email_data):
-                    email_list.append(email_data)
+            yield self._fetch_recruiter_emails([msg['id'] for msg in messages])
+            
+            page_token = results.get('nextPageToken')
+            if not page_token or (max_messages and listed >= max_messages):
+                return
+    
+    def _iter_pages_prefetched(self, page_size: int, max_messages: Optional[int]) -> Iterator[Dict]:
+        """Run _iter_unread_pages on a background thread with a one-page buffer"""
+        pages: queue.Queue = queue.Queue(maxsize=1)
+        stop = threading.Event()
+        done = object()
+        
+        def hand_over(item) -> bool:
+            # Wait for room in the buffer unless the consumer has gone away
+            while not stop.is_set():
+                try:
+                    pages.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        
+        def produce():
+            # self.service gives this thread its own connection
+            try:
+                for page in self._iter_unread_pages(page_size, max_messages):
+                    if not hand_over(page):
+                        return
+            except Exception as e:
+                print(f"Error prefetching emails: {e}")
+            finally:
+                hand_over(done)
+        
+        producer = threading.Thread(target=produce, name='gmail-prefetch', daemon=True)
+        producer.start()
+        
+        try:
+            while True:
+                page = pages.get()
+                if page is done:
+                    return
+                yield from page
+        finally:
+            # Consumer stopped early (or finished): let the producer exit
+            stop.set()
+    
+    def _fetch_recruiter_emails(self, msg_ids: List[str], unread_only: bool = False) -> List[Dict]:
+        """
+        Fetch, parse and filter messages, keeping the order of msg_ids
+        
+        Screening runs on headers only (format='metadata'); full payloads
+        are fetched and decoded just for the messages that pass.
+        """
+        headers_only = self._fetch_messages(msg_ids, format='metadata',
+                                            metadata_headers=self.SCREENING_HEADERS)
+        
+        candidates = {}
+        for msg_id in msg_ids:
+            if msg_id not in headers_only:
+                continue
             
-            return email_list
+            header_data = self._parse_message(headers_only[msg_id], include_body=False)
             
+            if unread_only and 'UNREAD' not in header_data['labels']:
+                continue
+            
+            # Filter for recruiter emails (basic heuristics)
+            if self._is_likely_recruiter(header_data):
+                candidates[msg_id] = header_data['labels']
+        
+        parsed = self._get_parsed_messages(candidates)
+        
+        return [parsed[msg_id] for msg_id in candidates if msg_id in parsed]
+    
+    def _get_parsed_messages(self, labels_by_id: Dict[str, List[str]]) -> Dict[str, Dict]:
+        """
+        Parsed messages for the given IDs, from the message cache where possible
+        
+        Args:
+            labels_by_id: Message ID -> current label IDs (labels are mutable,
+                          so they are never taken from the cache)
+        """
+        parsed = {}
+        if self.message_cache is not None:
+            for msg_id, email_data in self.message_cache.get_many(labels_by_id).items():
+                parsed[msg_id] = dict(email_data, labels=labels_by_id[msg_id])
+        
+        # Fetch full bodies in batch requests instead of one call each
+        missing = [msg_id for msg_id in labels_by_id if msg_id not in parsed]
+        fetched = {
+            msg_id: self._parse_message(message)
+            for msg_id, message in self._fetch_messages(missing).items()
+        }
+        
+        if self.message_cache is not None and fetched:
+            self.message_cache.put_many(fetched)
+        
+        parsed.update(fetched)
+        return parsed
+    
+    def _get_new_recruiter_emails(self, max_results: int) -> List[Dict]:
+        """Incremental poll: recruiter emails added since the stored historyId"""
+        start_history_id = self.state_manager.get_sync_value(self.HISTORY_ID_KEY)
+        
+        if not start_history_id:
+            return self._full_resync(max_results)
+        
+        try:
+            msg_ids, latest_history_id = self._list_history(start_history_id)
+        except HttpError as error:
+            # Gmail keeps roughly a week of history; older IDs return 404
+            if error.resp.status == 404:
+                print("Gmail history ID expired - running full resync")
+                return self._full_resync(max_results)
+            print(f"Gmail API error: {error}")
+            return []
+        
+        emails = self._fetch_recruiter_emails(msg_ids, unread_only=True)
+        self._pending_checkpoint = {self.HISTORY_ID_KEY: latest_history_id}
+        
+        return emails
+    
+    def commit_sync_checkpoint(self):
+        """
+        Store the historyId reached by the last incremental fetch
+        
+        Call only once the fetched mail has been handled: until then a crash
+        or failed cycle fetches the same messages again next time.
+        """
+        checkpoint, self._pending_checkpoint = self._pending_checkpoint, {}
+        for key, value in checkpoint.items():
+            self.state_manager.set_sync_value(key, value)
+    
+    def _list_history(self, start_history_id: str):
+        """
+        List messages added since start_history_id
+        
+        Returns:
+            (message IDs in arrival order, latest mailbox historyId)
+        """
+        msg_ids = []
+        latest_history_id = start_history_id
+        page_token = None
+        
+        while True:
+            response = self._execute(self.service.users().history().list(
+                userId='me',
+                startHistoryId=start_history_id,
+                historyTypes=['messageAdded'],
+                pageToken=page_token
+            ), 'history.list')
+            
+            for record in response.get('history', []):
+                for added in record.get('messagesAdded', []):
+                    message = added.get('message', {})
+                    # Skip our own sent replies and anything already read
+                    if 'UNREAD' in message.get('labelIds', ['UNREAD']):
+                        msg_ids.append(message['id'])
+            
+            latest_history_id = response.get('historyId', latest_history_id)
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                break
+        
+        return list(dict.fromkeys(msg_ids)), latest_history_id
+    
+    def _full_resync(self, page_size: int) -> List[Dict]:
+        """
+        Fresh unread search that also resets the history checkpoint
+        
+        Every page of unread mail is listed before the checkpoint moves:
+        mail left on a later page would never come back through history.
+        """
+        try:
+            # Take the checkpoint first so mail arriving during the search isn't missed
+            profile = self._execute(self.service.users().getProfile(userId='me'), 'getProfile')
+            history_id = profile['historyId']
         except HttpError as error:
             print(f"Gmail API error: {error}")
             return []
+        
+        emails = []
+        page_token = None
+        while True:
+            try:
+                results = self._execute(self.service.users().messages().list(
+                    userId='me',
+                    q="is:unread",
+                    maxResults=page_size,
+                    pageToken=page_token
+                ), 'messages.list')
+            except HttpError as error:
+                # Keep the old checkpoint; the next cycle resyncs again
+                print(f"Gmail API error during resync: {error}")
+                return emails
+            
+            emails.extend(self._fetch_recruiter_emails([msg['id'] for msg in results.get('messages', [])]))
+            
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                break
+        
+        self._pending_checkpoint = {self.HISTORY_ID_KEY: str(history_id)}
+        return emails
+    
+    def _fetch_messages(self, msg_ids: List[str], format: str = 'full',
+                        metadata_headers: Optional[List[str]] = None) -> Dict[str, Dict]:
+        """
+        Fetch several messages using Gmail batch HTTP requests
+        
+        Up to batch_size messages.get calls share one round trip. Messages
+        that fail are reported and left out of the result.
+        
+        Returns:
+            Dict of message ID -> raw Gmail message resource
+        """
+        fetched = {}
+        throttled = {}
+        
+        def on_response(request_id, response, exception):
+            if exception is not None:
+                if is_rate_limit_error(exception):
+                    throttled[request_id] = exception
+                else:
+                    print(f"Error fetching email {request_id}: {exception}")
+            else:
+                fetched[request_id] = response
+        
+        pending = list(dict.fromkeys(msg_ids))
+        for attempt in range(self.rate_limiter.max_retries + 1):
+            for start in range(0, len(pending), self.batch_size):
+                chunk = pending[start:start + self.batch_size]
+                batch = self.service.new_batch_http_request(callback=on_response)
+                for msg_id in chunk:
+                    params = {'userId': 'me', 'id': msg_id, 'format': format}
+                    if format == 'metadata' and metadata_headers:
+                        params['metadataHeaders'] = metadata_headers
+                    batch.add(self.service.users().messages().get(**params), request_id=msg_id)
+                
+                try:
+                    self._execute(batch, 'messages.get', count=len(chunk))
+                except HttpError as error:
+                    print(f"Gmail batch request failed: {error}")
+            
+            # Individual calls inside a batch can be rate limited too
+            if not throttled:
+                break
+            pending = list(throttled)
+            if attempt == self.rate_limiter.max_retries:
+                print(f"Gave up fetching {len(pending)} email(s) after repeated rate limiting")
+                break
+            self.rate_limiter.backoff(attempt, next(iter(throttled.values())))
+            throttled.clear()
+        
+        return fetched
     
     def _parse_email(self, msg_id: str) -> Dict:
-        """Parse email message and extract relevant data"""
+        """Fetch and parse a single email message"""
         try:
-            message = self.service.users().messages().get(
+            message = self._execute(self.service.users().messages().get(
                 userId='me',
                 id=msg_id,
                 format='full'
-            ).execute()
-            
-            headers = message['payload']['headers']
-            
-            # Extract headers
-            email_data = {
-                'id': msg_id,
-                'thread_id': message['threadId'],
-                'labels': message.get('labelIds', []),
-                'snippet': message.get('snippet', ''),
-            }
-            
-            for header in headers:
-                name = header['name'].lower()
-                value = header['value']
-                
-                if name == 'from':
-                    # Parse "Name <email@domain.com>" format
-                    match = re.match(r'(.+?)\s*<(.+?)>', value)
-                    if match:
-                        email_data['from_name'] = match.group(1).strip()
-                        email_data['from'] = match.group(2).strip()
-                    else:
-                        email_data['from'] = value
-                        email_data['from_name'] = value
-                
-                elif name == 'subject':
-                    email_data['subject'] = value
-                
-                elif name == 'date':
-                    email_data['date'] = value
-            
-            # Extract body
-            email_data['body'] = self._get_email_body(message['payload'])
+            ), 'messages.get')
             
-            return email_data
+            return self._parse_message(message)
             
         except HttpError as error:
             print(f"Error parsing email {msg_id}: {error}")
             return {}
     
+    def _parse_message(self, message: Dict, include_body: bool = True) -> Dict:
+        """Extract relevant data from a Gmail message resource"""
+        headers = message['payload']['headers']
+        
+        # Extract headers
+        email_data = {
+            'id': message['id'],
+            'thread_id': message['threadId'],
+            'labels': message.get('labelIds', []),
+            'snippet': message.get('snippet', ''),
+            # When Gmail received it (epoch seconds), for handling mail in arrival order
+            'received_at': int(message.get('internalDate', 0)) / 1000,
+        }
+        
+        for header in headers:
+            name = header['name'].lower()
+            value = header['value']
+            
+            if name == 'from':
+                # Parse "Name <email@domain.com>" format
+                match = re.match(r'(.+?)\s*<(.+?)>', value)
+                if match:
+                    email_data['from_name'] = match.group(1).strip()
+                    email_data['from'] = match.group(2).strip()
+                else:
+                    email_data['from'] = value
+                    email_data['from_name'] = value
+            
+            elif name == 'subject':
+                email_data['subject'] = value
+            
+            elif name == 'date':
+                email_data['date'] = value
+        
+        # Extract body
+        if include_body:
+            email_data['body'] = self._get_email_body(message['payload'])
+            
+            # A one-line body usually means the details are in an attachment
+            if (self.attachment_extractor is not None
+                    and len(email_data['body'].strip()) < self.attachment_min_body_chars):
+                attachment_text = self._get_attachment_text(message)
+                if attachment_text:
+                    email_data['body'] = f"{email_data['body'].strip()}\n\n{attachment_text}".strip()
+        
+        return email_data
+    
+    def _parse_options(self) -> Dict:
+        """Settings that change _parse_message output (part of the message cache key)"""
+        extractor = self.attachment_extractor
+        return {
+            'backend': 'gmail',
+            'body_max_bytes': self.body_max_bytes,
+            'strip_quoted_replies': self.strip_quoted_replies,
+            'attachments': None if extractor is None else {
+                'min_body_chars': self.attachment_min_body_chars,
+                'max_file_bytes': extractor.max_file_bytes,
+                'max_chars': extractor.max_chars,
+            },
+        }
+    
     def _get_email_body(self, payload: Dict) -> str:
-        """Extract plain text body from email payload"""
-        body = ""
-        
-        if 'parts' in payload:
-            for part in payload['parts']:
-                if part['mimeType'] == 'text/plain':
-                    if 'data' in part['body']:
-                        body = base64.urlsafe_b64decode(part['body']['data']).decode('utf-8')
-                        break
-                elif part['mimeType'] == 'multipart/alternative' and 'parts' in part:
-                    body = self._get_email_body(part)
-                    if body:
-                        break
-        else:
-            if 'body' in payload and 'data' in payload['body']:
-                body = base64.urlsafe_b64decode(payload['body']['data']).decode('utf-8')
+        """Bounded plain text body (HTML converted, attachments and quoted history skipped)"""
+        return extract_body(payload, max_bytes=self.body_max_bytes, strip_quotes=self.strip_quoted_replies)
+    
+    def _get_attachment_text(self, message: Dict) -> str:
+        """Text of supported attachments, downloading only those not extracted before"""
+        texts = []
+        for attachment in list_attachments(message['payload']):
+            filename = attachment['filename']
+            if not self.attachment_extractor.supports(attachment['mime_type'], filename, attachment['size']):
+                continue
+            
+            ref = f"{message['id']}/{attachment['part_id']}"
+            text = self.attachment_extractor.cached_text(ref)
+            if text is None:
+                data = attachment['data']
+                if not data:
+                    try:
+                        response = self._execute(self.service.users().messages().attachments().get(
+                            userId='me', messageId=message['id'], id=attachment['attachment_id']
+                        ), 'messages.attachments.get')
+                    except HttpError as error:
+                        print(f"Error downloading attachment {filename}: {error}")
+                        continue
+                    data = response.get('data', '')
+                
+                content = base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+                text = self.attachment_extractor.extract(content, attachment['mime_type'], filename, ref=ref)
+            
+            if text:
+                texts.append(f"[Attachment: {filename}]\n{text}")
         
-        return body
+        return '\n\n'.join(texts)
     
     def _is_likely_recruiter(self, email_data: Dict) -> bool:
-        """Heuristic to identify recruiter emails"""
-        
-        sender = email_data.get('from', '').lower()
-        from_name = email_data.get('from_name', '').lower()
-        subject = email_data.get('subject', '').lower()
-        body = email_data.get('body', '').lower()
-        
-        # Exclude known non-recruiter domains (financial, marketing, etc.)
-        excluded_domains = [
-            'robinhood', 'lenscrafters', 'amazon', 'walmart', 'target',
-            'bestbuy', 'ebay', 'paypal', 'venmo', 'chase', 'bankofamerica',
-            'wellsfargo', 'citibank', 'capitalone', 'discover', 'americanexpress',
-            'netflix', 'spotify', 'hulu', 'disney', 'apple', 'google.com',
-            'facebook', 'instagram', 'twitter', 'tiktok', 'snapchat',
-            'uber', 'lyft', 'doordash', 'grubhub', 'instacart'
-        ]
-        
-        # If from excluded domain, not a recruiter
-        if any(domain in sender for domain in excluded_domains):
-            return False
-        
-        # Job board and recruiter domains (usually legitimate)
-        recruiter_domains = [
-            'indeed', 'linkedin', 'dice', 'glassdoor', 'ziprecruiter',
-            'monster', 'careerbuilder', 'simplyhired', 'hired', 'angellist',
-            'greenhouse', 'lever', 'workday', 'taleo', 'icims',
-            'recruiting', 'talent', 'staffing', 'search', 'placement'
-        ]
-        
-        # If from known recruiter domain, likely a recruiter
-        if any(domain in sender or domain in from_name for domain in recruiter_domains):
-            # Check if it's a specific job vs generic alert
-            # Specific jobs mention company names and specific roles
-            has_company_name = any(company in subject for company in [
-                ' at ', ' with ', ' - ', 'company', 'corporation', 'group', 
-                'systems', 'solutions', 'technologies', 'services', 'inc'
-            ])
-            
-            # If subject has a company/role mentioned, it's specific enough
-            if has_company_name:
-                return True
-            
-            # Filter truly generic alerts
-            very_generic = [
-                'job alert for:', 'saved search:', 'your daily job', 
-                'jobs you might like', 'based on your resume'
-            ]
-            
-            if any(alert in subject for alert in very_generic):
-                return False  # Too generic
-            
-            return True  # From recruiter domain, specific enough
-        
-        # Keywords that strongly suggest recruiter email (require multiple matches)
-        strong_recruiter_keywords = [
-            'recruiter', 'recruiting', 'talent acquisition', 'talent partner',
-            'hr specialist', 'hiring manager', 'staffing', 'placement'
-        ]
-        
-        combined_text = f"{subject} {from_name}"
-        
-        # If sender identifies as recruiter, it's a recruiter
-        if any(keyword in combined_text for keyword in strong_recruiter_keywords):
-            return True
+        """
+        Identify recruiter emails
         
-        # Job-specific keywords in subject (not just body)
-        job_keywords = [
-            'position with', 'role with', 'opportunity with',
-            'interview', 'job description', 'job opening',
-            'we have an opening', 'reaching out to you for',
-            'job title:', 'location:', 'pay:', 'salary:'
-        ]
+        Uses the trained classifier when a model file is available, otherwise
+        the keyword heuristics. Both use only sender and subject, so this can
+        run on metadata-only fetches.
+        """
+        if self.recruiter_classifier is not None:
+            return self.recruiter_classifier.is_recruiter(email_data)
         
-        # Check for job-specific language in subject
-        subject_matches = sum(1 for keyword in job_keywords if keyword in subject)
+        return is_recruiter_heuristic(email_data)
+    
+    def watch(self, topic_name: str, label_ids: Optional[List[str]] = None) -> Optional[Dict]:
+        """
+        Ask Gmail to publish mailbox changes to a Cloud Pub/Sub topic
         
-        if subject_matches >= 2:  # Need at least 2 job keywords in subject
-            return True
+        The watch lasts up to 7 days and must be renewed before it expires.
         
-        return False
+        Returns:
+            Dict with historyId and expiration (ms since epoch), or None on error
+        """
+        try:
+            return self._execute(self.service.users().watch(
+                userId='me',
+                body={
+                    'topicName': topic_name,
+                    'labelIds': label_ids or ['INBOX'],
+                    'labelFilterBehavior': 'include'
+                }
+            ), 'watch')
+        except HttpError as error:
+            print(f"Error registering Gmail watch: {error}")
+            return None
+    
+    def stop_watch(self):
+        """Stop push notifications for this mailbox"""
+        try:
+            self._execute(self.service.users().stop(userId='me'), 'stop')
+        except HttpError as error:
+            print(f"Error stopping Gmail watch: {error}")
     
-    def send_reply(self, thread_id: str, to: str, subject: str, body: str) -> bool:
+    def send_reply(self, thread_id: str, to: str, subject: str, body: str,
+                   in_reply_to: Optional[str] = None, references: Optional[str] = None) -> bool:
         """
         Send a reply email
         
@@ -257,34 +657,27 @@ class EmailAgent:
             to: Recipient email address
             subject: Email subject (will be prefixed with "Re: " if not already)
             body: Email body text
+            in_reply_to: Message-ID being answered, if known
+            references: That message's References header
             
         Returns:
             True if sent successfully
         """
+        # Ensure subject has Re: prefix
+        if not subject.lower().startswith('re:'):
+            subject = f"Re: {subject}"
+        
+        return self.send_message(to, subject, body + REPLY_SIGNATURE, thread_id=thread_id,
+                                 in_reply_to=in_reply_to, references=references)
+    
+    def send_message(self, to: str, subject: str, body: str, thread_id: Optional[str] = None,
+                     in_reply_to: Optional[str] = None, references: Optional[str] = None) -> bool:
+        """Send an email as-is (no Re: prefix or signature), optionally within a thread"""
         try:
-            # Ensure subject has Re: prefix
-            if not subject.lower().startswith('re:'):
-                subject = f"Re: {subject}"
-            
-            message = MIMEText(body)
-            message['to'] = to
-            message['subject'] = subject
-            
-            # Add signature
-            signature = "\n\n--\nElena\nJava Selenium Automation Architect"
-            message.set_payload(message.get_payload() + signature)
-            
-            raw_message = base64.urlsafe_b64encode(message.as_bytes()).decode('utf-8')
-            
-            send_message = {
-                'raw': raw_message,
-                'threadId': thread_id
-            }
-            
-            result = self.service.users().messages().send(
+            result = self._execute(self.service.users().messages().send(
                 userId='me',
-                body=send_message
-            ).execute()
+                body=self._build_message(to, subject, body, thread_id, in_reply_to, references)
+            ), 'messages.send')
             
             print(f"Email sent successfully. Message ID: {result['id']}")
             return True
@@ -293,43 +686,198 @@ class EmailAgent:
             print(f"Error sending email: {error}")
             return False
     
+    def send_replies(self, replies: List[Dict]) -> List[bool]:
+        """
+        Send several reply emails using Gmail batch HTTP requests
+        
+        Each reply is a dict with the send_reply arguments (thread_id, to,
+        subject, body and optionally in_reply_to/references). Up to batch_size
+        messages.send calls share one round trip.
+        
+        Returns:
+            One success flag per reply, in order
+        """
+        sent = [False] * len(replies)
+        throttled = {}
+        
+        def on_response(request_id, response, exception):
+            index = int(request_id)
+            if exception is not None:
+                if is_rate_limit_error(exception):
+                    throttled[index] = exception
+                else:
+                    print(f"Error sending email: {exception}")
+            else:
+                sent[index] = True
+                print(f"Email sent successfully. Message ID: {response['id']}")
+        
+        bodies = {}
+        for index, reply in enumerate(replies):
+            subject = reply['subject']
+            if not subject.lower().startswith('re:'):
+                subject = f"Re: {subject}"
+            bodies[index] = self._build_message(reply['to'], subject, reply['body'] + REPLY_SIGNATURE,
+                                                reply.get('thread_id'), reply.get('in_reply_to'),
+                                                reply.get('references'))
+        
+        pending = list(bodies)
+        for attempt in range(self.rate_limiter.max_retries + 1):
+            for start in range(0, len(pending), self.batch_size):
+                chunk = pending[start:start + self.batch_size]
+                batch = self.service.new_batch_http_request(callback=on_response)
+                for index in chunk:
+                    batch.add(self.service.users().messages().send(userId='me', body=bodies[index]),
+                              request_id=str(index))
+                
+                try:
+                    self._execute(batch, 'messages.send', count=len(chunk))
+                except HttpError as error:
+                    print(f"Gmail batch request failed: {error}")
+            
+            if not throttled:
+                break
+            pending = sorted(throttled)
+            if attempt == self.rate_limiter.max_retries:
+                print(f"Gave up sending {len(pending)} email(s) after repeated rate limiting")
+                break
+            self.rate_limiter.backoff(attempt, next(iter(throttled.values())))
+            throttled.clear()
+        
+        return sent
+    
+    def _build_message(self, to: str, subject: str, body: str, thread_id: Optional[str] = None,
+                       in_reply_to: Optional[str] = None, references: Optional[str] = None) -> Dict:
+        """messages.send body for a plain-text email"""
+        message = MIMEText(body)
+        message['to'] = to
+        message['subject'] = subject
+        if in_reply_to:
+            chain = (references or '').split()
+            if in_reply_to not in chain:
+                chain.append(in_reply_to)
+            message['In-Reply-To'] = in_reply_to
+            message['References'] = ' '.join(chain)
+        
+        send_message = {'raw': base64.urlsafe_b64encode(message.as_bytes()).decode('utf-8')}
+        if thread_id:
+            send_message['threadId'] = thread_id
+        return send_message
+    
     def mark_as_read(self, msg_id: str):
         """Mark an email as read"""
         try:
-            self.service.users().messages().modify(
+            self._execute(self.service.users().messages().modify(
                 userId='me',
                 id=msg_id,
                 body={'removeLabelIds': ['UNREAD']}
-            ).execute()
+            ), 'messages.modify')
         except HttpError as error:
             print(f"Error marking email as read: {error}")
     
     def add_label(self, msg_id: str, label_name: str):
         """Add a custom label to an email"""
-        try:
-            # First, get or create the label
-            label_id = self._get_or_create_label(label_name)
-            
+        for attempt in range(2):
+            try:
+                # First, get or create the label
+                label_id = self._get_or_create_label(label_name)
+                
+                if label_id:
+                    self._execute(self.service.users().messages().modify(
+                        userId='me',
+                        id=msg_id,
+                        body={'addLabelIds': [label_id]}
+                    ), 'messages.modify')
+                return
+            except HttpError as error:
+                # A cached label ID goes stale if the label was deleted in Gmail
+                if attempt == 0 and self._is_stale_label_error(error):
+                    self._label_ids = None
+                    continue
+                print(f"Error adding label: {error}")
+                return
+    
+    def queue_label(self, msg_id: str, label_name: str):
+        """Queue a label to add at the next flush_modifications()"""
+        with self._modifications_lock:
+            self._pending_modifications.setdefault(msg_id, {'add': set(), 'remove': set()})['add'].add(label_name)
+    
+    def queue_mark_as_read(self, msg_id: str):
+        """Queue marking an email read at the next flush_modifications()"""
+        with self._modifications_lock:
+            self._pending_modifications.setdefault(msg_id, {'add': set(), 'remove': set()})['remove'].add('UNREAD')
+    
+    def flush_modifications(self) -> int:
+        """
+        Apply all queued label/unread changes with messages.batchModify
+        
+        Messages needing identical changes share one call (up to 1000 IDs).
+        
+        Returns:
+            Number of batchModify calls made
+        """
+        with self._modifications_lock:
+            pending, self._pending_modifications = self._pending_modifications, {}
+        
+        # Group messages by the exact change they need
+        groups: Dict[tuple, List[str]] = {}
+        for msg_id, change in pending.items():
+            key = (frozenset(change['add']), frozenset(change['remove']))
+            groups.setdefault(key, []).append(msg_id)
+        
+        calls = 0
+        for (add_names, remove_names), msg_ids in groups.items():
+            for start in range(0, len(msg_ids), self.MAX_BATCH_MODIFY_IDS):
+                chunk = msg_ids[start:start + self.MAX_BATCH_MODIFY_IDS]
+                for attempt in range(2):
+                    try:
+                        body = {
+                            'ids': chunk,
+                            'addLabelIds': self._resolve_label_ids(add_names),
+                            'removeLabelIds': self._resolve_label_ids(remove_names)
+                        }
+                        self._execute(self.service.users().messages().batchModify(userId='me', body=body),
+                                      'messages.batchModify')
+                        calls += 1
+                        break
+                    except HttpError as error:
+                        if attempt == 0 and self._is_stale_label_error(error):
+                            self._label_ids = None
+                            continue
+                        print(f"Error applying label changes to {len(chunk)} email(s): {error}")
+                        break
+        
+        return calls
+    
+    def _resolve_label_ids(self, label_names) -> List[str]:
+        """Label IDs for names; system labels (UNREAD, INBOX, ...) are their own IDs"""
+        label_ids = []
+        for name in sorted(label_names):
+            label_id = name if name in self.SYSTEM_LABELS else self._get_or_create_label(name)
             if label_id:
-                self.service.users().messages().modify(
-                    userId='me',
-                    id=msg_id,
-                    body={'addLabelIds': [label_id]}
-                ).execute()
-        except HttpError as error:
-            print(f"Error adding label: {error}")
+                label_ids.append(label_id)
+        return label_ids
+    
+    def _is_stale_label_error(self, error: HttpError) -> bool:
+        return error.resp.status in (400, 404) and self._label_ids is not None
     
     def _get_or_create_label(self, label_name: str) -> Optional[str]:
-        """Get label ID or create if doesn't exist"""
+        """Get label ID (cached) or create if doesn't exist"""
+        # Serialized so parallel callers don't create the same label twice
+        with self._labels_lock:
+            return self._get_or_create_label_locked(label_name)
+    
+    def _get_or_create_label_locked(self, label_name: str) -> Optional[str]:
         try:
-            # Get all labels
-            results = self.service.users().labels().list(userId='me').execute()
-            labels = results.get('labels', [])
+            if self._label_ids is None:
+                # Get all labels once; later lookups come from the cache
+                results = self._execute(self.service.users().labels().list(userId='me'), 'labels.list')
+                self._label_ids = {
+                    label['name']: label['id'] for label in results.get('labels', [])
+                }
             
             # Check if label exists
-            for label in labels:
-                if label['name'] == label_name:
-                    return label['id']
+            if label_name in self._label_ids:
+                return self._label_ids[label_name]
             
             # Create new label
             label_object = {
@@ -338,11 +886,12 @@ class EmailAgent:
                 'messageListVisibility': 'show'
             }
             
-            created_label = self.service.users().labels().create(
+            created_label = self._execute(self.service.users().labels().create(
                 userId='me',
                 body=label_object
-            ).execute()
+            ), 'labels.create')
             
+            self._label_ids[label_name] = created_label['id']
             return created_label['id']
             
         except HttpError as error:
@@ -350,18 +899,23 @@ class EmailAgent:
             return None
     
     def get_thread_messages(self, thread_id: str) -> List[Dict]:
-        """Get all messages in a thread"""
+        """
+        Get all messages in a thread
+        
+        One lightweight threads.get lists the messages; content comes from
+        the message cache, and only uncached messages are fetched.
+        """
         try:
-            thread = self.service.users().threads().get(
+            thread = self._execute(self.service.users().threads().get(
                 userId='me',
-                id=thread_id
-            ).execute()
+                id=thread_id,
+                format='minimal'
+            ), 'threads.get')
             
-            messages = []
-            for msg in thread['messages']:
-                messages.append(self._parse_email(msg['id']))
+            labels_by_id = {msg['id']: msg.get('labelIds', []) for msg in thread['messages']}
+            parsed = self._get_parsed_messages(labels_by_id)
             
-            return messages
+            return [parsed[msg_id] for msg_id in labels_by_id if msg_id in parsed]
             
         except HttpError as error:
             print(f"Error getting thread: {error}")
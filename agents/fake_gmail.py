@@ -0,0 +1,492 @@
+"""
+In-memory fake of the Gmail API for offline load and soak testing
+
+FakeGmailService mimics the googleapiclient resource interface that
+EmailAgent uses (users().messages()/labels()/threads()/history(), batch
+HTTP requests, getProfile, watch/stop), so it can be passed straight to
+EmailAgent(service=...). Latency and errors can be injected to see how the
+pipeline behaves against a slow or flaky API.
+"""
+
+import time
+import base64
+import random
+import threading
+from email import message_from_bytes
+from typing import Callable, Dict, List, Optional
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+
+SYSTEM_LABELS = ('INBOX', 'UNREAD', 'SENT', 'DRAFT', 'SPAM', 'TRASH', 'STARRED', 'IMPORTANT')
+
+RECRUITER_SENDERS = [
+    ('Jane Miller', 'jane.miller@talentbridge-staffing.com'),
+    ('Raj Patel', 'raj@apexrecruiting.io'),
+    ('Maria Lopez', 'mlopez@insightglobal-talent.com'),
+    ('Tom Becker', 'tbecker@hired.com'),
+    ('Priya Shah', 'priya.shah@linkedin.com'),
+]
+
+RECRUITER_SUBJECTS = [
+    'Senior QA Automation Engineer role with {company}',
+    'Test Automation Architect opportunity with {company}',
+    'SDET Lead - Remote - {company}',
+    'Interview request: Selenium Architect at {company}',
+]
+
+RECRUITER_BODIES = [
+    "Hi Elena,\n\nI came across your profile and have a {role} position with {company}. "
+    "It's a 12 month contract, remote, Java/Selenium stack. Would you be open to a quick call this week?\n\nThanks",
+    "Hello Elena,\n\nWe're hiring a {role} for {company}. What is your current rate expectation "
+    "and availability for an interview?\n\nBest regards",
+]
+
+OTHER_SENDERS = [
+    ('Amazon.com', 'shipment-tracking@amazon.com'),
+    ('Netflix', 'info@mailer.netflix.com'),
+    ('Chase', 'no.reply.alerts@chase.com'),
+    ('Weekly Digest', 'newsletter@techweekly.dev'),
+]
+
+OTHER_SUBJECTS = ['Your order has shipped', 'New arrivals this week', 'Your statement is ready',
+                  'Top stories for you']
+
+COMPANIES = ['Acme Systems', 'Globex Technologies', 'Initech Solutions', 'Umbrella Group', 'Stark Services']
+
+
+def _http_error(status: int, reason: str = '', retry_after: Optional[float] = None) -> HttpError:
+    headers = {'status': str(status)}
+    if retry_after is not None:
+        headers['retry-after'] = str(retry_after)
+    content = ('{"error": {"code": %d, "errors": [{"reason": "%s"}]}}' % (status, reason)).encode('utf-8')
+    return HttpError(httplib2.Response(headers), content)
+
+
+def _label_query_name(name: str) -> str:
+    """How Gmail search refers to a label: 'AI-Recruiter/Processed' -> 'ai-recruiter-processed'"""
+    return name.lower().replace('/', '-').replace(' ', '-')
+
+
+class _Request:
+    def __init__(self, service: 'FakeGmailService', method: str, handler: Callable):
+        self._service = service
+        self.method = method
+        self._handler = handler
+
+    def execute(self):
+        self._service._round_trip()
+        self._service._maybe_fail(self.method)
+        return self._handler()
+
+
+class _BatchRequest:
+    """Mirrors googleapiclient BatchHttpRequest: one round trip, per-call callbacks"""
+
+    def __init__(self, service: 'FakeGmailService', callback: Optional[Callable]):
+        self._service = service
+        self._callback = callback
+        self._requests = []
+
+    def add(self, request: _Request, callback: Optional[Callable] = None, request_id: Optional[str] = None):
+        self._requests.append((request_id or str(len(self._requests) + 1), request, callback))
+
+    def execute(self):
+        self._service._round_trip()
+        for request_id, request, callback in self._requests:
+            response, exception = None, None
+            try:
+                self._service._maybe_fail(request.method)
+                response = request._handler()
+            except HttpError as error:
+                exception = error
+            for cb in (callback, self._callback):
+                if cb:
+                    cb(request_id, response, exception)
+
+
+class _Resource:
+    """users(), messages(), labels(), threads() and history() all resolve to one of these"""
+
+    def __init__(self, service: 'FakeGmailService', methods: Dict[str, Callable]):
+        self._service = service
+        self._methods = methods
+
+    def __getattr__(self, name):
+        if name not in self._methods:
+            raise AttributeError(name)
+        return self._methods[name]
+
+
+class FakeGmailService:
+    """Thread-safe in-memory Gmail mailbox behind the googleapiclient interface"""
+
+    def __init__(self, latency: float = 0.0, latency_jitter: float = 0.0,
+                 error_rate: float = 0.0, error_status: int = 429,
+                 email_address: str = 'elena@example.com', seed: Optional[int] = None):
+        """
+        Args:
+            latency: Seconds added to every HTTP round trip (a batch is one round trip)
+            latency_jitter: Extra uniformly random latency up to this many seconds
+            error_rate: Fraction of calls that fail with error_status
+            error_status: HTTP status of injected errors (429 is sent with Retry-After)
+            email_address: Address reported by getProfile
+            seed: Seed for synthetic content, latency jitter and error injection
+        """
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.email_address = email_address
+
+        self._random = random.Random(seed)
+        self._lock = threading.RLock()
+        self._messages: Dict[str, Dict] = {}
+        self._order: List[str] = []  # Oldest first
+        self._labels: Dict[str, str] = {label: label for label in SYSTEM_LABELS}  # ID -> name
+        self._history: List[Dict] = []
+        self._attachments: Dict[str, bytes] = {}
+        self._history_id = 1000
+        self._next_id = 1
+        self._last_internal_date = 0
+
+        self.sent: List[Dict] = []
+        self.calls: Dict[str, int] = {}
+        self.round_trips = 0
+        self.injected_errors = 0
+
+    # --- Mailbox setup ---
+
+    def add_message(self, sender: str, subject: str, body: str, thread_id: Optional[str] = None,
+                    label_ids: Optional[List[str]] = None, to: Optional[str] = None,
+                    attachments: Optional[List[tuple]] = None) -> Dict:
+        """
+        Deliver a message and record it in history; returns the message resource
+
+        attachments are (filename, mime_type, bytes) tuples, served by
+        messages.attachments.get like real (non-inline) Gmail attachments.
+        """
+        with self._lock:
+            msg_id = f"{self._next_id:016x}"
+            self._next_id += 1
+            self._history_id += 1
+            # Strictly increasing, like delivery order
+            self._last_internal_date = max(self._last_internal_date + 1, int(time.time() * 1000))
+
+            message = {
+                'id': msg_id,
+                'threadId': thread_id or msg_id,
+                'labelIds': list(label_ids if label_ids is not None else ['INBOX', 'UNREAD']),
+                'snippet': body[:100],
+                'historyId': str(self._history_id),
+                'internalDate': str(self._last_internal_date),
+                'payload': {
+                    'mimeType': 'text/plain',
+                    'headers': [
+                        {'name': 'From', 'value': sender},
+                        {'name': 'To', 'value': to or self.email_address},
+                        {'name': 'Subject', 'value': subject},
+                        {'name': 'Date', 'value': time.strftime('%a, %d %b %Y %H:%M:%S +0000', time.gmtime())},
+                    ],
+                    'body': {
+                        'size': len(body),
+                        'data': base64.urlsafe_b64encode(body.encode('utf-8')).decode('ascii'),
+                    },
+                },
+            }
+            if attachments:
+                text_part = dict(message['payload'], partId='0', headers=[])
+                parts = [text_part]
+                for index, (filename, mime_type, data) in enumerate(attachments, start=1):
+                    attachment_id = f"att-{msg_id}-{index}"
+                    self._attachments[attachment_id] = data
+                    parts.append({'partId': str(index), 'mimeType': mime_type, 'filename': filename,
+                                  'headers': [], 'body': {'attachmentId': attachment_id, 'size': len(data)}})
+                message['payload'] = {'mimeType': 'multipart/mixed', 'headers': message['payload']['headers'],
+                                      'body': {'size': 0}, 'parts': parts}
+
+            self._messages[msg_id] = message
+            self._order.append(msg_id)
+            self._history.append({
+                'id': str(self._history_id),
+                'messages': [{'id': msg_id, 'threadId': message['threadId']}],
+                'messagesAdded': [{'message': self._minimal(message)}],
+            })
+            return message
+
+    def populate(self, count: int, recruiter_ratio: float = 0.5) -> int:
+        """Fill the inbox with synthetic recruiter and non-recruiter mail; returns recruiter count"""
+        recruiters = 0
+        for _ in range(count):
+            company = self._random.choice(COMPANIES)
+            if self._random.random() < recruiter_ratio:
+                name, address = self._random.choice(RECRUITER_SENDERS)
+                subject = self._random.choice(RECRUITER_SUBJECTS).format(company=company)
+                body = self._random.choice(RECRUITER_BODIES).format(company=company,
+                                                                     role=subject.split(' role')[0])
+                recruiters += 1
+            else:
+                name, address = self._random.choice(OTHER_SENDERS)
+                subject = self._random.choice(OTHER_SUBJECTS)
+                body = f"{subject}. View this message in your browser."
+            self.add_message(f"{name} <{address}>", subject, body)
+        return recruiters
+
+    # --- Transport simulation ---
+
+    def _round_trip(self):
+        with self._lock:
+            self.round_trips += 1
+            delay = self.latency + (self._random.uniform(0, self.latency_jitter) if self.latency_jitter else 0)
+        if delay:
+            time.sleep(delay)
+
+    def _maybe_fail(self, method: str):
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+            fail = self.error_rate and self._random.random() < self.error_rate
+            if fail:
+                self.injected_errors += 1
+        if fail:
+            if self.error_status == 429:
+                raise _http_error(429, 'rateLimitExceeded', retry_after=0.01)
+            raise _http_error(self.error_status, 'backendError')
+
+    def _request(self, method: str, handler: Callable) -> _Request:
+        return _Request(self, method, handler)
+
+    def new_batch_http_request(self, callback: Optional[Callable] = None) -> _BatchRequest:
+        return _BatchRequest(self, callback)
+
+    # --- Resource tree ---
+
+    def users(self):
+        return _Resource(self, {
+            'messages': lambda: _Resource(self, {
+                'list': self._messages_list,
+                'get': self._messages_get,
+                'modify': self._messages_modify,
+                'batchModify': self._messages_batch_modify,
+                'send': self._messages_send,
+                'attachments': lambda: _Resource(self, {'get': self._attachments_get}),
+            }),
+            'labels': lambda: _Resource(self, {
+                'list': self._labels_list,
+                'create': self._labels_create,
+            }),
+            'threads': lambda: _Resource(self, {'get': self._threads_get}),
+            'history': lambda: _Resource(self, {'list': self._history_list}),
+            'getProfile': self._get_profile,
+            'watch': self._watch,
+            'stop': self._stop,
+        })
+
+    # --- Messages ---
+
+    def _matches(self, message: Dict, query: str) -> bool:
+        labels = set(message['labelIds'])
+        label_names = {_label_query_name(self._labels.get(label, label)) for label in labels}
+        headers = {h['name'].lower(): h['value'].lower() for h in message['payload']['headers']}
+
+        for term in query.lower().split():
+            negate = term.startswith('-')
+            term = term.lstrip('-')
+            key, _, value = term.partition(':')
+
+            if key == 'is':
+                hit = value.upper() in labels
+            elif key in ('in', 'label'):
+                hit = value in label_names
+            elif key in ('from', 'to', 'subject'):
+                hit = value in headers.get(key, '')
+            else:
+                hit = term in headers.get('subject', '') or term in message['snippet'].lower()
+
+            if hit == negate:
+                return False
+        return True
+
+    def _messages_list(self, userId='me', q='', labelIds=None, maxResults=100, pageToken=None, **kwargs):
+        def handler():
+            with self._lock:
+                matching = [
+                    msg_id for msg_id in reversed(self._order)  # Newest first, like Gmail
+                    if self._matches(self._messages[msg_id], q or '')
+                    and all(label in self._messages[msg_id]['labelIds'] for label in (labelIds or []))
+                ]
+            start = int(pageToken or 0)
+            end = start + min(maxResults or 100, 500)
+            result = {
+                'messages': [{'id': msg_id, 'threadId': self._messages[msg_id]['threadId']}
+                             for msg_id in matching[start:end]],
+                'resultSizeEstimate': len(matching),
+            }
+            if end < len(matching):
+                result['nextPageToken'] = str(end)
+            return result
+        return self._request('messages.list', handler)
+
+    def _messages_get(self, userId='me', id=None, format='full', metadataHeaders=None, **kwargs):
+        def handler():
+            with self._lock:
+                message = self._messages.get(id)
+                if message is None:
+                    raise _http_error(404, 'notFound')
+                if format == 'minimal':
+                    return self._minimal(message)
+                if format == 'metadata':
+                    wanted = {h.lower() for h in metadataHeaders or []}
+                    return dict(message, payload={
+                        'mimeType': message['payload']['mimeType'],
+                        'headers': [h for h in message['payload']['headers']
+                                    if not wanted or h['name'].lower() in wanted],
+                    }, labelIds=list(message['labelIds']))
+                return dict(message, labelIds=list(message['labelIds']))
+        return self._request('messages.get', handler)
+
+    def _attachments_get(self, userId='me', messageId=None, id=None, **kwargs):
+        def handler():
+            with self._lock:
+                data = self._attachments.get(id)
+            if data is None:
+                raise _http_error(404, 'notFound')
+            return {'size': len(data), 'data': base64.urlsafe_b64encode(data).decode('ascii')}
+        return self._request('messages.attachments.get', handler)
+
+    def _apply_labels(self, msg_id: str, add: List[str], remove: List[str]):
+        """Caller holds the lock"""
+        message = self._messages.get(msg_id)
+        if message is None:
+            raise _http_error(404, 'notFound')
+        for label in add:
+            if label not in self._labels:
+                raise _http_error(400, 'invalidArgument')
+        message['labelIds'] = [label for label in message['labelIds'] if label not in remove]
+        message['labelIds'] += [label for label in add if label not in message['labelIds']]
+
+    def _messages_modify(self, userId='me', id=None, body=None, **kwargs):
+        def handler():
+            with self._lock:
+                self._apply_labels(id, (body or {}).get('addLabelIds', []), (body or {}).get('removeLabelIds', []))
+                return self._minimal(self._messages[id])
+        return self._request('messages.modify', handler)
+
+    def _messages_batch_modify(self, userId='me', body=None, **kwargs):
+        def handler():
+            body_ = body or {}
+            with self._lock:
+                for msg_id in body_.get('ids', []):
+                    self._apply_labels(msg_id, body_.get('addLabelIds', []), body_.get('removeLabelIds', []))
+            return ''
+        return self._request('messages.batchModify', handler)
+
+    def _messages_send(self, userId='me', body=None, **kwargs):
+        def handler():
+            mime = message_from_bytes(base64.urlsafe_b64decode(body['raw']))
+            payload = mime.get_payload(decode=True) or b''
+            message = self.add_message(
+                sender=self.email_address,
+                subject=mime.get('subject', ''),
+                body=payload.decode('utf-8', 'replace'),
+                thread_id=body.get('threadId'),
+                label_ids=['SENT'],
+                to=mime.get('to', '')
+            )
+            with self._lock:
+                self.sent.append({'id': message['id'], 'threadId': message['threadId'],
+                                  'to': mime.get('to', ''), 'subject': mime.get('subject', '')})
+            return {'id': message['id'], 'threadId': message['threadId'], 'labelIds': ['SENT']}
+        return self._request('messages.send', handler)
+
+    # --- Labels, threads, history ---
+
+    def _labels_list(self, userId='me', **kwargs):
+        def handler():
+            with self._lock:
+                return {'labels': [
+                    {'id': label_id, 'name': name, 'type': 'system' if label_id in SYSTEM_LABELS else 'user'}
+                    for label_id, name in self._labels.items()
+                ]}
+        return self._request('labels.list', handler)
+
+    def _labels_create(self, userId='me', body=None, **kwargs):
+        def handler():
+            with self._lock:
+                if body['name'] in self._labels.values():
+                    raise _http_error(409, 'duplicate')
+                label_id = f"Label_{len(self._labels) + 1}"
+                self._labels[label_id] = body['name']
+                return {'id': label_id, 'name': body['name']}
+        return self._request('labels.create', handler)
+
+    def _threads_get(self, userId='me', id=None, format='full', **kwargs):
+        def handler():
+            with self._lock:
+                messages = [self._minimal(self._messages[msg_id]) for msg_id in self._order
+                            if self._messages[msg_id]['threadId'] == id]
+            if not messages:
+                raise _http_error(404, 'notFound')
+            return {'id': id, 'messages': messages}
+        return self._request('threads.get', handler)
+
+    def _history_list(self, userId='me', startHistoryId=None, historyTypes=None, pageToken=None,
+                      maxResults=100, **kwargs):
+        def handler():
+            start = int(startHistoryId)
+            with self._lock:
+                if self._history and start < int(self._history[0]['id']) - 1:
+                    raise _http_error(404, 'notFound')
+                records = [record for record in self._history if int(record['id']) > start]
+                history_id = str(self._history_id)
+
+            offset = int(pageToken or 0)
+            result = {'history': records[offset:offset + maxResults], 'historyId': history_id}
+            if offset + maxResults < len(records):
+                result['nextPageToken'] = str(offset + maxResults)
+            return result
+        return self._request('history.list', handler)
+
+    def expire_history(self):
+        """Drop history records, as Gmail does after about a week (forces a full resync)"""
+        with self._lock:
+            self._history = self._history[-1:]
+
+    def _get_profile(self, userId='me', **kwargs):
+        def handler():
+            with self._lock:
+                return {'emailAddress': self.email_address, 'messagesTotal': len(self._messages),
+                        'historyId': str(self._history_id)}
+        return self._request('getProfile', handler)
+
+    def _watch(self, userId='me', body=None, **kwargs):
+        def handler():
+            with self._lock:
+                return {'historyId': str(self._history_id),
+                        'expiration': str(int((time.time() + 7 * 86400) * 1000))}
+        return self._request('watch', handler)
+
+    def _stop(self, userId='me', **kwargs):
+        return self._request('stop', lambda: '')
+
+    @staticmethod
+    def _minimal(message: Dict) -> Dict:
+        return {'id': message['id'], 'threadId': message['threadId'], 'labelIds': list(message['labelIds'])}
+
+    def count(self, query: str) -> int:
+        """Number of messages matching a search query (no simulated latency)"""
+        with self._lock:
+            return sum(1 for msg_id in self._order if self._matches(self._messages[msg_id], query))
+
+
+if __name__ == "__main__":
+    service = FakeGmailService(seed=1)
+    recruiters = service.populate(20)
+
+    page = service.users().messages().list(userId='me', q='is:unread', maxResults=5).execute()
+    first = service.users().messages().get(userId='me', id=page['messages'][0]['id']).execute()
+    headers = {h['name']: h['value'] for h in first['payload']['headers']}
+
+    print(f"Messages: 20 ({recruiters} recruiter)  unread: {service.count('is:unread')}")
+    print(f"First page: {len(page['messages'])}  next page token: {page.get('nextPageToken')}")
+    print(f"Newest: {headers['From']} - {headers['Subject']}")
@@ -0,0 +1,329 @@
+"""
+In-process fake IMAP/SMTP server for testing ImapAgent without a mail account
+
+FakeMailServer listens on localhost and speaks the subset of IMAP4rev1 that
+ImapAgent uses (LOGIN, SELECT, STATUS, IDLE, UID SEARCH/FETCH/STORE with
+FLAGS, INTERNALDATE and BODY[]) plus
+plain SMTP, over one in-memory mailbox. Point ImapAgent at imap_port and
+smtp_port with use_ssl=False; sent mail is collected in server.sent (and
+SMTP connections counted in server.smtp_sessions).
+"""
+
+import re
+import email
+import shlex
+import time
+import threading
+import socketserver
+from email import policy
+from email.message import EmailMessage
+from email.utils import format_datetime, make_msgid
+from imaplib import Time2Internaldate
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Set
+
+
+def _parse_uid_set(spec: str, max_uid: int) -> Set[int]:
+    """'1:3,7,9:*' -> {1, 2, 3, 7, 9, ..., max_uid}"""
+    uids = set()
+    for part in spec.split(','):
+        bounds = [max_uid if value == '*' else int(value) for value in part.split(':')]
+        low, high = min(bounds), max(bounds)
+        uids.update(range(low, high + 1))
+    return uids
+
+
+class _ImapHandler(socketserver.StreamRequestHandler):
+    """One IMAP client connection"""
+
+    def setup(self):
+        super().setup()
+        self._write_lock = threading.Lock()
+
+    def send(self, data):
+        with self._write_lock:
+            self.wfile.write(data if isinstance(data, bytes) else data.encode('utf-8'))
+            self.wfile.flush()
+
+    def handle(self):
+        server: FakeMailServer = self.server.mail
+        self.send('* OK FakeMailServer ready\r\n')
+
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            tag, _, rest = line.decode('utf-8').rstrip('\r\n').partition(' ')
+            command, _, args = rest.partition(' ')
+            command = command.upper()
+
+            if command == 'CAPABILITY':
+                self.send(f'* CAPABILITY IMAP4rev1 IDLE\r\n{tag} OK CAPABILITY completed\r\n')
+            elif command == 'LOGIN':
+                self.send(f'{tag} OK LOGIN completed\r\n')
+            elif command in ('SELECT', 'EXAMINE'):
+                with server.lock:
+                    self.send(f'* {len(server.messages)} EXISTS\r\n'
+                              f'* OK [UIDVALIDITY {server.uidvalidity}] UIDs valid\r\n'
+                              f'* OK [UIDNEXT {server.uid_next}] Predicted next UID\r\n'
+                              f'{tag} OK [READ-WRITE] {command} completed\r\n')
+            elif command == 'STATUS':
+                with server.lock:
+                    self.send(f'* STATUS "{server.mailbox}" (UIDNEXT {server.uid_next})\r\n'
+                              f'{tag} OK STATUS completed\r\n')
+            elif command == 'NOOP':
+                self.send(f'{tag} OK NOOP completed\r\n')
+            elif command == 'LOGOUT':
+                self.send(f'* BYE logging out\r\n{tag} OK LOGOUT completed\r\n')
+                return
+            elif command == 'IDLE':
+                self._idle(tag, server)
+            elif command == 'UID':
+                self._uid(tag, args, server)
+            else:
+                self.send(f'{tag} BAD unknown command {command}\r\n')
+
+    def _idle(self, tag: str, server: 'FakeMailServer'):
+        with server.lock:
+            seen = len(server.messages)
+        done = threading.Event()
+
+        def notify():
+            with server.changed:
+                while not done.is_set():
+                    if len(server.messages) > seen:
+                        self.send(f'* {len(server.messages)} EXISTS\r\n')
+                        return
+                    server.changed.wait(0.05)
+
+        notifier = threading.Thread(target=notify, daemon=True)
+        self.send('+ idling\r\n')
+        notifier.start()
+        self.rfile.readline()  # DONE
+        done.set()
+        notifier.join()
+        self.send(f'{tag} OK IDLE terminated\r\n')
+
+    def _uid(self, tag: str, args: str, server: 'FakeMailServer'):
+        command, _, args = args.partition(' ')
+        command = command.upper()
+
+        with server.lock:
+            if command == 'SEARCH':
+                uids = server.search(shlex.split(args))
+                self.send('* SEARCH' + ''.join(f' {uid}' for uid in uids) + '\r\n')
+            elif command == 'FETCH':
+                spec, _, items = args.partition(' ')
+                for number, message in server.select(spec):
+                    self.send(server.fetch_response(number, message, items.upper()))
+            elif command == 'STORE':
+                spec, op, flags = args.split(' ', 2)
+                flags = set(flags.strip('()').split())
+                for _, message in server.select(spec):
+                    if op.upper().startswith('+'):
+                        message['flags'] |= flags
+                    else:
+                        message['flags'] -= flags
+            else:
+                self.send(f'{tag} BAD unknown UID command {command}\r\n')
+                return
+        self.send(f'{tag} OK UID {command} completed\r\n')
+
+
+class _SmtpHandler(socketserver.StreamRequestHandler):
+    """One SMTP client connection (no TLS, no AUTH)"""
+
+    def handle(self):
+        server: FakeMailServer = self.server.mail
+        with server.lock:
+            server.smtp_sessions += 1
+        self.reply('220 FakeMailServer ESMTP')
+
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line[:4].decode('ascii', 'replace').upper()
+
+            if command in ('EHLO', 'HELO'):
+                self.reply('250-localhost\r\n250 8BITMIME')
+            elif command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                lines = []
+                while True:
+                    data = self.rfile.readline()
+                    if data in (b'.\r\n', b'.\n', b''):
+                        break
+                    lines.append(data[1:] if data.startswith(b'..') else data)
+                with server.lock:
+                    server.sent.append(email.message_from_bytes(b''.join(lines), policy=policy.default))
+                self.reply('250 OK queued')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('250 OK')
+
+    def reply(self, text: str):
+        self.wfile.write(f'{text}\r\n'.encode('ascii'))
+        self.wfile.flush()
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class FakeMailServer:
+    """Thread-safe in-memory mailbox behind local IMAP and SMTP listeners"""
+
+    def __init__(self, mailbox: str = 'INBOX', uidvalidity: int = 1, address: str = 'elena@example.com'):
+        """
+        Args:
+            mailbox: Name reported by SELECT/STATUS
+            uidvalidity: Initial UIDVALIDITY of the mailbox
+            address: Recipient of added messages
+        """
+        self.mailbox = mailbox
+        self.uidvalidity = uidvalidity
+        self.address = address
+        self.uid_next = 1
+        self.messages: List[Dict] = []  # Oldest first: {'uid', 'flags', 'raw', 'received'}
+        self.sent: List[EmailMessage] = []
+        self.smtp_sessions = 0
+
+        self.lock = threading.RLock()
+        self.changed = threading.Condition(self.lock)
+        self._servers: List[_Server] = []
+        self.imap_port: Optional[int] = None
+        self.smtp_port: Optional[int] = None
+
+    # --- Lifecycle ---
+
+    def start(self) -> 'FakeMailServer':
+        """Listen on free localhost ports (imap_port, smtp_port)"""
+        for handler in (_ImapHandler, _SmtpHandler):
+            server = _Server(('127.0.0.1', 0), handler)
+            server.mail = self
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            self._servers.append(server)
+        self.imap_port = self._servers[0].server_address[1]
+        self.smtp_port = self._servers[1].server_address[1]
+        return self
+
+    def stop(self):
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
+        self._servers = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # --- Mailbox setup ---
+
+    def add_message(self, sender: str, subject: str, body: str, message_id: Optional[str] = None,
+                    in_reply_to: Optional[str] = None, references: Optional[str] = None,
+                    flags: Iterable[str] = ()) -> int:
+        """Deliver a message (wakes IDLE clients); returns its UID"""
+        message = EmailMessage()
+        message['From'] = sender
+        message['To'] = self.address
+        message['Subject'] = subject
+        message['Date'] = format_datetime(datetime.now(timezone.utc))
+        message['Message-ID'] = message_id or make_msgid(domain='fake.local')
+        if in_reply_to:
+            message['In-Reply-To'] = in_reply_to
+            message['References'] = references or in_reply_to
+        message.set_content(body)
+
+        with self.changed:
+            uid = self.uid_next
+            self.uid_next += 1
+            self.messages.append({'uid': uid, 'flags': set(flags), 'raw': message.as_bytes(),
+                                  'received': time.time()})
+            self.changed.notify_all()
+        return uid
+
+    def flags(self, uid: int) -> Set[str]:
+        """Current flags of a message"""
+        with self.lock:
+            return set(next(m['flags'] for m in self.messages if m['uid'] == uid))
+
+    def renumber(self):
+        """Rebuild the mailbox: new UIDVALIDITY, UIDs assigned again from 1"""
+        with self.lock:
+            self.uidvalidity += 1
+            for uid, message in enumerate(self.messages, start=1):
+                message['uid'] = uid
+            self.uid_next = len(self.messages) + 1
+
+    # --- Protocol helpers (called with the lock held) ---
+
+    def select(self, spec: str):
+        """(sequence number, message) pairs whose UID is in an IMAP UID set"""
+        max_uid = self.messages[-1]['uid'] if self.messages else 0
+        uids = _parse_uid_set(spec, max_uid)
+        return [(n, m) for n, m in enumerate(self.messages, start=1) if m['uid'] in uids]
+
+    def search(self, criteria: List[str]) -> List[int]:
+        """UIDs matching search criteria (ALL, UNSEEN, UID set, HEADER, OR)"""
+        tokens = list(criteria)
+
+        def matcher():
+            key = tokens.pop(0).upper()
+            if key == 'ALL':
+                return lambda m: True
+            if key == 'UNSEEN':
+                return lambda m: '\\Seen' not in m['flags']
+            if key == 'UID':
+                spec = tokens.pop(0)
+                max_uid = self.messages[-1]['uid'] if self.messages else 0
+                uids = _parse_uid_set(spec, max_uid)
+                return lambda m: m['uid'] in uids
+            if key == 'HEADER':
+                name, value = tokens.pop(0), tokens.pop(0)
+                return lambda m: value in str(email.message_from_bytes(m['raw']).get(name, ''))
+            if key == 'OR':
+                left, right = matcher(), matcher()
+                return lambda m: left(m) or right(m)
+            raise ValueError(f"unsupported search key {key}")
+
+        tests = []
+        while tokens:
+            tests.append(matcher())
+        return [m['uid'] for m in self.messages if all(test(m) for test in tests)]
+
+    def fetch_response(self, number: int, message: Dict, items: str) -> bytes:
+        """Untagged FETCH response for FLAGS (and INTERNALDATE) plus BODY[] or BODY[HEADER.FIELDS (...)]"""
+        flags = ' '.join(sorted(message['flags']))
+        internal_date = f" INTERNALDATE {Time2Internaldate(message['received'])}" if 'INTERNALDATE' in items else ''
+        fields = re.search(r'HEADER\.FIELDS \(([^)]*)\)', items)
+        if fields:
+            parsed = email.message_from_bytes(message['raw'])
+            names = fields.group(1).split()
+            data = ''.join(f"{name.title()}: {parsed[name]}\r\n" for name in names if parsed[name])
+            data = (data + '\r\n').encode('utf-8')
+            section = f"BODY[HEADER.FIELDS ({fields.group(1)})]"
+        else:
+            data = message['raw']
+            section = 'BODY[]'
+        head = f"* {number} FETCH (UID {message['uid']} FLAGS ({flags}){internal_date} {section} {{{len(data)}}}\r\n"
+        return head.encode('utf-8') + data + b')\r\n'
+
+
+if __name__ == "__main__":
+    # Deliver a message and read it back with imaplib
+    import imaplib
+
+    with FakeMailServer() as server:
+        server.add_message('Jane Miller <jane@talentbridge-staffing.com>', 'QA Architect role', 'Hi Elena')
+        conn = imaplib.IMAP4('127.0.0.1', server.imap_port)
+        conn.login('elena', 'secret')
+        conn.select('INBOX')
+        print(conn.uid('SEARCH', None, 'UNSEEN'))
+        print(conn.uid('FETCH', '1', '(UID FLAGS BODY.PEEK[HEADER.FIELDS (FROM SUBJECT)])')[1][0])
+        conn.logout()
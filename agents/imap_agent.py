@@ -0,0 +1,677 @@
+"""
+IMAP mail backend - drop-in alternative to the Gmail API EmailAgent
+
+New mail is noticed through IMAP IDLE on a dedicated connection
+(wait_for_mail), fetched incrementally by UID, and replies go out over SMTP.
+Gmail-style labels are stored as IMAP keywords.
+
+Works against any IMAP/SMTP server. For local testing, e.g. GreenMail:
+    docker run -p 3025:3025 -p 3143:3143 greenmail/standalone
+    MAIL_BACKEND=imap IMAP_HOST=localhost IMAP_PORT=3143 IMAP_SSL=false \\
+    SMTP_HOST=localhost SMTP_PORT=3025 python main.py --idle
+
+test_imap_agent.py runs the agent against agents.fake_imap.FakeMailServer,
+an in-process IMAP/SMTP server, with no setup.
+"""
+
+import os
+import re
+import ssl
+import time
+import email
+import select
+import imaplib
+import smtplib
+import threading
+from contextlib import contextmanager
+from email import policy
+from email.message import EmailMessage
+from email.utils import parseaddr, make_msgid
+from typing import Dict, Iterator, List, Optional
+
+from agents.email_agent import REPLY_SIGNATURE
+from agents.mime_walker import DEFAULT_BODY_MAX_BYTES, extract_message_body
+from agents.recruiter_classifier import RecruiterClassifier, is_recruiter_heuristic
+
+
+UID_PATTERN = re.compile(rb'UID (\d+)')
+FLAGS_PATTERN = re.compile(rb'FLAGS \(([^)]*)\)')
+EXISTS_PATTERN = re.compile(rb'\* \d+ (EXISTS|RECENT)')
+
+
+def uid_set(uids: List[int]) -> str:
+    """Compact IMAP sequence set: [1, 2, 3, 7] -> '1:3,7'"""
+    ranges = []
+    for uid in sorted(set(uids)):
+        if ranges and uid == ranges[-1][1] + 1:
+            ranges[-1][1] = uid
+        else:
+            ranges.append([uid, uid])
+    return ','.join(str(a) if a == b else f"{a}:{b}" for a, b in ranges)
+
+
+def label_keyword(label_name: str) -> str:
+    """IMAP keyword for a label name ('AI-Recruiter/Processed' -> 'AI-Recruiter_Processed')"""
+    return re.sub(r'[^A-Za-z0-9_.\-]', '_', label_name)
+
+
+class ImapAgent:
+    """Handles email over IMAP (fetch, IDLE) and SMTP (send)"""
+
+    UIDVALIDITY_KEY = 'imap_uidvalidity'
+    LAST_UID_KEY = 'imap_last_uid'
+    SCREENING_FIELDS = 'FROM SUBJECT DATE'
+    # Servers may drop an IDLE after 30 minutes (RFC 2177)
+    IDLE_RENEW_SECONDS = 25 * 60
+
+    # Bump when _parse_message output changes so cached parses are ignored
+    PARSER_VERSION = 3
+
+    def __init__(self, host: str, username: str, password: str, port: int = 993,
+                 use_ssl: bool = True, mailbox: str = 'INBOX',
+                 smtp_host: Optional[str] = None, smtp_port: int = 587, smtp_ssl: bool = False,
+                 from_address: Optional[str] = None,
+                 batch_size: int = 100,
+                 state_manager=None,
+                 incremental_sync: bool = False,
+                 recruiter_model_path: Optional[str] = None,
+                 message_cache=None,
+                 body_max_bytes: int = DEFAULT_BODY_MAX_BYTES,
+                 strip_quoted_replies: bool = True,
+                 attachment_extractor=None,
+                 attachment_min_body_chars: int = 200):
+        """
+        Args:
+            host, port, use_ssl: IMAP server
+            username, password: Login for both IMAP and SMTP
+            mailbox: Folder to watch
+            smtp_host, smtp_port, smtp_ssl: Outgoing server (defaults to the IMAP
+                                            host; STARTTLS is used when offered)
+            from_address: Sender address for replies (defaults to username)
+            batch_size: Messages per UID FETCH command
+            state_manager: StateManager used to persist the UID checkpoint
+            incremental_sync: Fetch only mail with UIDs above the checkpoint
+            recruiter_model_path: Trained recruiter classifier
+            message_cache: Optional MessageCache of parsed messages
+            body_max_bytes: Cap on the body text decoded per message
+            strip_quoted_replies: Drop quoted reply history from bodies
+            attachment_extractor: Optional AttachmentExtractor for PDF/DOCX
+                                  job descriptions (used on thin bodies)
+            attachment_min_body_chars: Bodies shorter than this get attachment text
+        """
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.username = username
+        self.password = password
+        self.mailbox = mailbox
+        self.smtp_host = smtp_host or host
+        self.smtp_port = smtp_port
+        self.smtp_ssl = smtp_ssl
+        self.from_address = from_address or username
+        self.batch_size = max(1, batch_size)
+        self.state_manager = state_manager
+        self.incremental_sync = incremental_sync and state_manager is not None
+        # Sync values from the last fetch, stored by commit_sync_checkpoint() once its mail is handled
+        self._pending_checkpoint: Dict[str, str] = {}
+        self.message_cache = message_cache
+        self.body_max_bytes = body_max_bytes
+        self.strip_quoted_replies = strip_quoted_replies
+        self.attachment_extractor = attachment_extractor
+        self.attachment_min_body_chars = attachment_min_body_chars
+        if self.message_cache is not None:
+            self.message_cache.bind_parser(self.PARSER_VERSION, self._parse_options())
+
+        self.uidvalidity: Optional[str] = None
+        self._conn: Optional[imaplib.IMAP4] = None
+        self._idle_conn: Optional[imaplib.IMAP4] = None
+        self._idle_count = 0
+        self._lock = threading.RLock()
+
+        # Flag changes queued until flush_modifications():
+        # msg_id -> {'add': set of flags, 'remove': set of flags}
+        self._pending_modifications: Dict[str, Dict[str, set]] = {}
+        self._modifications_lock = threading.Lock()
+
+        self.recruiter_classifier = RecruiterClassifier.load_if_valid(recruiter_model_path)
+
+    # --- Connections ---
+
+    def _connect(self) -> imaplib.IMAP4:
+        """Open, log in and select the mailbox"""
+        if self.use_ssl:
+            conn = imaplib.IMAP4_SSL(self.host, self.port, ssl_context=ssl.create_default_context())
+        else:
+            conn = imaplib.IMAP4(self.host, self.port)
+
+        conn.login(self.username, self.password)
+        typ, data = conn.select(f'"{self.mailbox}"')
+        if typ != 'OK':
+            raise imaplib.IMAP4.error(f"Cannot select {self.mailbox}: {data}")
+
+        uidvalidity = conn.response('UIDVALIDITY')[1][0]
+        self.uidvalidity = uidvalidity.decode() if uidvalidity else '0'
+        return conn
+
+    def _run(self, command):
+        """Run command(conn) on the main connection, reconnecting once if it dropped"""
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._conn is None:
+                        self._conn = self._connect()
+                    return command(self._conn)
+                except (imaplib.IMAP4.abort, OSError):
+                    self._conn = None
+                    if attempt:
+                        raise
+
+    def _uid(self, conn: imaplib.IMAP4, command: str, *args) -> List:
+        typ, data = conn.uid(command, *args)
+        if typ != 'OK':
+            raise imaplib.IMAP4.error(f"UID {command} failed: {data}")
+        return data
+
+    def close(self):
+        """Log out of both connections"""
+        for conn in (self._conn, self._idle_conn):
+            if conn is not None:
+                try:
+                    conn.logout()
+                except (imaplib.IMAP4.error, OSError):
+                    pass
+        self._conn = self._idle_conn = None
+
+    # --- Fetching ---
+
+    def get_unread_recruiter_emails(self, max_results: int = 10) -> List[Dict]:
+        """
+        Fetch unread emails that appear to be from recruiters
+
+        Returns the same dicts as EmailAgent.get_unread_recruiter_emails();
+        'labels' holds the message's IMAP flags.
+        """
+        if self.incremental_sync:
+            return self._get_new_recruiter_emails(max_results)
+
+        return list(self.iter_unread_recruiter_emails(page_size=max_results, max_messages=max_results))
+
+    def iter_unread_recruiter_emails(self, page_size: int = 100,
+                                     max_messages: Optional[int] = None,
+                                     prefetch: bool = False) -> Iterator[Dict]:
+        """Stream unread recruiter emails, newest first, one FETCH round trip pair per page"""
+        if self.incremental_sync:
+            yield from self._get_new_recruiter_emails(max_messages or page_size)
+            return
+
+        try:
+            uids = self._run(lambda conn: self._search(conn, 'UNSEEN'))
+        except (imaplib.IMAP4.error, OSError) as error:
+            print(f"IMAP error: {error}")
+            return
+
+        uids = sorted(uids, reverse=True)[:max_messages or None]
+        for start in range(0, len(uids), page_size):
+            yield from self._fetch_recruiter_emails(uids[start:start + page_size])
+
+    def _search(self, conn: imaplib.IMAP4, *criteria) -> List[int]:
+        data = self._uid(conn, 'SEARCH', None, *criteria)
+        return [int(uid) for uid in (data[0] or b'').split()]
+
+    def _get_new_recruiter_emails(self, max_results: int) -> List[Dict]:
+        """Incremental poll: recruiter emails with UIDs above the stored checkpoint"""
+        try:
+            uids, checkpoint = self._run(self._list_new_uids)
+        except (imaplib.IMAP4.error, OSError) as error:
+            print(f"IMAP error: {error}")
+            return []
+
+        if checkpoint is None:
+            # First run or UIDVALIDITY changed: the new checkpoint (UIDNEXT-1) is
+            # past every unread message, so all of them must be handled now
+            return self._fetch_recruiter_emails(sorted(uids))
+
+        emails = self._fetch_recruiter_emails(uids, unread_only=True)
+        self._pending_checkpoint = {self.LAST_UID_KEY: str(checkpoint)}
+        return emails
+
+    def commit_sync_checkpoint(self):
+        """
+        Store the UID checkpoint reached by the last incremental fetch
+
+        Call only once the fetched mail has been handled: until then a crash
+        or failed cycle fetches the same messages again next time.
+        """
+        checkpoint, self._pending_checkpoint = self._pending_checkpoint, {}
+        for key, value in checkpoint.items():
+            self.state_manager.set_sync_value(key, value)
+
+    def _list_new_uids(self, conn: imaplib.IMAP4):
+        """UIDs added since the checkpoint and the new checkpoint to store"""
+        last_uid = self.state_manager.get_sync_value(self.LAST_UID_KEY)
+        stored_validity = self.state_manager.get_sync_value(self.UIDVALIDITY_KEY)
+
+        if last_uid is None or stored_validity != self.uidvalidity:
+            # UIDs from another UIDVALIDITY mean nothing; start a new checkpoint
+            typ, data = conn.status(f'"{self.mailbox}"', '(UIDNEXT)')
+            uid_next = int(re.search(rb'UIDNEXT (\d+)', data[0]).group(1))
+            self._pending_checkpoint = {self.UIDVALIDITY_KEY: self.uidvalidity,
+                                        self.LAST_UID_KEY: str(uid_next - 1)}
+            return self._search(conn, 'UNSEEN'), None
+
+        last_uid = int(last_uid)
+        # "n:*" always matches the highest UID, even when it is below n
+        uids = [uid for uid in self._search(conn, 'UID', f'{last_uid + 1}:*') if uid > last_uid]
+        return uids, max(uids, default=last_uid)
+
+    def _fetch_recruiter_emails(self, uids: List[int], unread_only: bool = False) -> List[Dict]:
+        """
+        Screen on headers, then fetch full messages for recruiters only
+
+        Each step is a single UID FETCH over the whole set of UIDs, so a page
+        costs two round trips no matter how many messages it holds.
+        """
+        if not uids:
+            return []
+
+        try:
+            headers = self._run(lambda conn: self._fetch(
+                conn, uids, f'(UID FLAGS BODY.PEEK[HEADER.FIELDS ({self.SCREENING_FIELDS})])'))
+        except (imaplib.IMAP4.error, OSError) as error:
+            print(f"IMAP fetch failed: {error}")
+            return []
+
+        candidates = {}
+        for uid in uids:
+            if uid not in headers:
+                continue
+            flags, raw, _ = headers[uid]
+            if unread_only and '\\Seen' in flags:
+                continue
+            header_data = self._parse_message(uid, raw, flags, include_body=False)
+            if self._is_likely_recruiter(header_data):
+                candidates[uid] = flags
+
+        parsed = self._get_parsed_messages(candidates)
+        return [parsed[uid] for uid in candidates if uid in parsed]
+
+    def _get_parsed_messages(self, flags_by_uid: Dict[int, List[str]]) -> Dict[int, Dict]:
+        """Parsed messages from the message cache where possible, the rest in one FETCH"""
+        parsed = {}
+        if self.message_cache is not None:
+            ids = {self._message_id(uid): uid for uid in flags_by_uid}
+            for msg_id, email_data in self.message_cache.get_many(ids).items():
+                parsed[ids[msg_id]] = dict(email_data, labels=flags_by_uid[ids[msg_id]])
+
+        missing = [uid for uid in flags_by_uid if uid not in parsed]
+        fetched = {}
+        if missing:
+            try:
+                messages = self._run(lambda conn: self._fetch(conn, missing, '(UID FLAGS INTERNALDATE BODY.PEEK[])'))
+            except (imaplib.IMAP4.error, OSError) as error:
+                print(f"IMAP fetch failed: {error}")
+                messages = {}
+            fetched = {uid: self._parse_message(uid, raw, flags, received_at=received_at)
+                       for uid, (flags, raw, received_at) in messages.items()}
+
+        if self.message_cache is not None and fetched:
+            self.message_cache.put_many({email_data['id']: email_data for email_data in fetched.values()})
+
+        parsed.update(fetched)
+        return parsed
+
+    def _fetch(self, conn: imaplib.IMAP4, uids: List[int], items: str) -> Dict[int, tuple]:
+        """UID FETCH in batch_size chunks; returns uid -> (flags, literal bytes, INTERNALDATE or None)"""
+        results = {}
+        for start in range(0, len(uids), self.batch_size):
+            data = self._uid(conn, 'FETCH', uid_set(uids[start:start + self.batch_size]), items)
+
+            # Responses are (b'n (UID x FLAGS (...) BODY[...] {size}', literal) tuples;
+            # attributes sent after the literal arrive as a separate bytes item
+            record = None
+            for item in data + [None]:
+                if isinstance(item, tuple) or item is None:
+                    if record:
+                        meta, literal = record
+                        uid_match = UID_PATTERN.search(meta)
+                        flags_match = FLAGS_PATTERN.search(meta)
+                        if uid_match:
+                            flags = flags_match.group(1).decode().split() if flags_match else []
+                            internal_date = imaplib.Internaldate2tuple(meta)
+                            received_at = time.mktime(internal_date) if internal_date else None
+                            results[int(uid_match.group(1))] = (flags, literal, received_at)
+                    record = [item[0], item[1]] if item else None
+                elif record is not None and isinstance(item, bytes):
+                    record[0] += item
+        return results
+
+    def _message_id(self, uid: int) -> str:
+        """Message ID used across the app; UIDs are only unique within one UIDVALIDITY"""
+        return f"{self.uidvalidity}-{uid}"
+
+    def _parse_message(self, uid: int, raw: bytes, flags: List[str], include_body: bool = True,
+                       received_at: Optional[float] = None) -> Dict:
+        """Extract relevant data from an RFC 822 message (or just its headers)"""
+        message = email.message_from_bytes(raw or b'', policy=policy.default)
+
+        from_name, from_address = parseaddr(str(message.get('From', '')))
+        message_id = str(message.get('Message-ID', '')).strip()
+
+        # Thread on the root of the References chain, like Gmail threads
+        references = str(message.get('References', '')).split()
+        root = references[0] if references else str(message.get('In-Reply-To', '')).strip() or message_id
+
+        email_data = {
+            'id': self._message_id(uid),
+            'thread_id': root.strip('<>') or self._message_id(uid),
+            'message_id': message_id,
+            'references': ' '.join(references),
+            'labels': flags,
+            'from': from_address,
+            'from_name': from_name or from_address,
+            'subject': str(message.get('Subject', '')),
+            'date': str(message.get('Date', '')),
+            # Server arrival time (INTERNALDATE, epoch seconds), for handling mail in order
+            'received_at': received_at,
+        }
+
+        if include_body:
+            email_data['body'] = self._get_email_body(message)
+            if (self.attachment_extractor is not None
+                    and len(email_data['body'].strip()) < self.attachment_min_body_chars):
+                attachment_text = self._get_attachment_text(message, email_data['id'])
+                if attachment_text:
+                    email_data['body'] = f"{email_data['body'].strip()}\n\n{attachment_text}".strip()
+            email_data['snippet'] = ' '.join(email_data['body'].split())[:100]
+
+        return email_data
+
+    def _parse_options(self) -> Dict:
+        """Settings that change _parse_message output (part of the message cache key)"""
+        extractor = self.attachment_extractor
+        return {
+            'backend': 'imap',
+            'body_max_bytes': self.body_max_bytes,
+            'strip_quoted_replies': self.strip_quoted_replies,
+            'attachments': None if extractor is None else {
+                'min_body_chars': self.attachment_min_body_chars,
+                'max_file_bytes': extractor.max_file_bytes,
+                'max_chars': extractor.max_chars,
+            },
+        }
+
+    def _get_email_body(self, message) -> str:
+        """Bounded plain text body (HTML converted, attachments and quoted history skipped)"""
+        return extract_message_body(message, max_bytes=self.body_max_bytes,
+                                    strip_quotes=self.strip_quoted_replies)
+
+    def _get_attachment_text(self, message, message_id: str) -> str:
+        """Text of supported attachments (already downloaded with the message)"""
+        texts = []
+        for index, part in enumerate(message.walk()):
+            if part.is_multipart():
+                continue
+            filename = part.get_filename() or ''
+            if part.get_content_disposition() != 'attachment' and not filename:
+                continue
+
+            # Encoded size is about 4/3 of the decoded size
+            size = len(part.get_payload(decode=False) or '') * 3 // 4
+            if not self.attachment_extractor.supports(part.get_content_type(), filename, size):
+                continue
+
+            ref = f"{message_id}/{index}"
+            text = self.attachment_extractor.cached_text(ref)
+            if text is None:
+                text = self.attachment_extractor.extract(part.get_payload(decode=True) or b'',
+                                                         part.get_content_type(), filename, ref=ref)
+            if text:
+                texts.append(f"[Attachment: {filename}]\n{text}")
+
+        return '\n\n'.join(texts)
+
+    def _is_likely_recruiter(self, email_data: Dict) -> bool:
+        """Screen an email by sender and subject"""
+        if self.recruiter_classifier is not None:
+            return self.recruiter_classifier.is_recruiter(email_data)
+
+        return is_recruiter_heuristic(email_data)
+
+    def get_thread_messages(self, thread_id: str) -> List[Dict]:
+        """All messages in the mailbox that belong to a thread (by Message-ID / References)"""
+        ref = f"<{thread_id}>"
+        try:
+            uids = self._run(lambda conn: self._search(
+                conn, 'OR', 'HEADER', 'Message-ID', f'"{ref}"', 'HEADER', 'References', f'"{ref}"'))
+            messages = self._run(lambda conn: self._fetch(conn, uids, '(UID FLAGS BODY.PEEK[])'))
+        except (imaplib.IMAP4.error, OSError) as error:
+            print(f"Error getting thread: {error}")
+            return []
+
+        return [self._parse_message(uid, raw, flags) for uid, (flags, raw) in sorted(messages.items())]
+
+    # --- IDLE ---
+
+    def wait_for_mail(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block in IMAP IDLE until new mail arrives or timeout expires
+
+        Returns:
+            True if the server reported new mail
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+
+        while True:
+            remaining = self.IDLE_RENEW_SECONDS
+            if deadline is not None:
+                remaining = min(remaining, deadline - time.monotonic())
+                if remaining <= 0:
+                    return False
+
+            try:
+                if self._idle_conn is None:
+                    self._idle_conn = self._connect()
+                if self._idle(self._idle_conn, remaining):
+                    return True
+            except (imaplib.IMAP4.error, OSError) as error:
+                print(f"IMAP IDLE connection lost: {error}")
+                self._idle_conn = None
+                time.sleep(min(5.0, max(remaining, 0)))
+
+    def _idle(self, conn: imaplib.IMAP4, timeout: float) -> bool:
+        """One IDLE ... DONE exchange; True if EXISTS/RECENT was seen"""
+        self._idle_count += 1
+        tag = f"ARIA{self._idle_count}".encode()
+        conn.send(tag + b' IDLE\r\n')
+
+        line = conn.readline()
+        while not line.startswith(b'+'):
+            if not line or line.startswith(tag):
+                raise imaplib.IMAP4.error(f"IDLE not accepted: {line!r}")
+            line = conn.readline()
+
+        changed = False
+        sock = conn.socket()
+        deadline = time.monotonic() + timeout
+        while not changed:
+            remaining = deadline - time.monotonic()
+            # TLS may hold decrypted bytes the socket itself no longer reports
+            pending = getattr(sock, 'pending', lambda: 0)()
+            if remaining <= 0 or (not pending and not select.select([sock], [], [], remaining)[0]):
+                break
+            line = conn.readline()
+            if not line:
+                raise imaplib.IMAP4.abort("Connection closed during IDLE")
+            changed = bool(EXISTS_PATTERN.match(line))
+
+        conn.send(b'DONE\r\n')
+        while True:
+            line = conn.readline()
+            if not line:
+                raise imaplib.IMAP4.abort("Connection closed while ending IDLE")
+            if line.startswith(tag):
+                break
+            changed = changed or bool(EXISTS_PATTERN.match(line))
+
+        return changed
+
+    # --- Flags ---
+
+    def mark_as_read(self, msg_id: str):
+        """Mark an email as read"""
+        self._store(msg_id, '+FLAGS', ['\\Seen'])
+
+    def add_label(self, msg_id: str, label_name: str):
+        """Tag an email with a label (stored as an IMAP keyword)"""
+        self._store(msg_id, '+FLAGS', [label_keyword(label_name)])
+
+    def queue_label(self, msg_id: str, label_name: str):
+        """Add a label on the next flush_modifications()"""
+        self._queue_change(msg_id, add=label_keyword(label_name))
+
+    def queue_mark_as_read(self, msg_id: str):
+        """Mark as read on the next flush_modifications()"""
+        self._queue_change(msg_id, add='\\Seen')
+
+    def _queue_change(self, msg_id: str, add: str):
+        with self._modifications_lock:
+            change = self._pending_modifications.setdefault(msg_id, {'add': set(), 'remove': set()})
+            change['add'].add(add)
+
+    def flush_modifications(self) -> int:
+        """
+        Apply queued flag changes with one UID STORE per distinct change
+
+        Returns:
+            Number of STORE commands sent
+        """
+        with self._modifications_lock:
+            pending, self._pending_modifications = self._pending_modifications, {}
+
+        groups: Dict[tuple, List[int]] = {}
+        for msg_id, change in pending.items():
+            validity, _, uid = msg_id.partition('-')
+            if validity != self.uidvalidity:
+                continue  # Mailbox was rebuilt; the UID no longer points at this message
+            key = (frozenset(change['add']), frozenset(change['remove']))
+            groups.setdefault(key, []).append(int(uid))
+
+        calls = 0
+        for (add, remove), uids in groups.items():
+            for flags, op in ((add, '+FLAGS'), (remove, '-FLAGS')):
+                if flags:
+                    calls += self._store_uids(uids, op, sorted(flags))
+        return calls
+
+    def _store(self, msg_id: str, op: str, flags: List[str]):
+        validity, _, uid = msg_id.partition('-')
+        if validity == self.uidvalidity:
+            self._store_uids([int(uid)], op, flags)
+
+    def _store_uids(self, uids: List[int], op: str, flags: List[str]) -> int:
+        try:
+            self._run(lambda conn: self._uid(conn, 'STORE', uid_set(uids), op, f"({' '.join(flags)})"))
+            return 1
+        except (imaplib.IMAP4.error, OSError) as error:
+            print(f"Error updating flags on {len(uids)} email(s): {error}")
+            return 0
+
+    # --- Sending ---
+
+    def send_message(self, to: str, subject: str, body: str, thread_id: Optional[str] = None,
+                     in_reply_to: Optional[str] = None, references: Optional[str] = None) -> bool:
+        """
+        Send an email over SMTP
+
+        in_reply_to is the Message-ID being answered and references its
+        References header; without them the reply hangs off the thread root
+        (thread_id, itself a Message-ID).
+        """
+        message = self._build_message(to, subject, body, thread_id, in_reply_to, references)
+        try:
+            with self._smtp_session() as smtp:
+                smtp.send_message(message)
+
+            print(f"Email sent successfully. Message ID: {message['Message-ID']}")
+            return True
+
+        except (smtplib.SMTPException, OSError) as error:
+            print(f"Error sending email: {error}")
+            return False
+
+    def send_replies(self, replies: List[Dict]) -> List[bool]:
+        """
+        Send several reply emails over one SMTP session
+
+        Each reply is a dict with the send_reply arguments (thread_id, to,
+        subject, body and optionally in_reply_to/references).
+
+        Returns:
+            One success flag per reply, in order
+        """
+        sent = [False] * len(replies)
+        if not replies:
+            return sent
+
+        try:
+            with self._smtp_session() as smtp:
+                for index, reply in enumerate(replies):
+                    subject = reply['subject']
+                    if not subject.lower().startswith('re:'):
+                        subject = f"Re: {subject}"
+                    message = self._build_message(reply['to'], subject, reply['body'] + REPLY_SIGNATURE,
+                                                  reply.get('thread_id'), reply.get('in_reply_to'),
+                                                  reply.get('references'))
+                    try:
+                        smtp.send_message(message)
+                    except (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError) as error:
+                        # Rejected message; the session is still usable for the rest
+                        print(f"Error sending email: {error}")
+                        continue
+                    sent[index] = True
+                    print(f"Email sent successfully. Message ID: {message['Message-ID']}")
+
+        except (smtplib.SMTPException, OSError) as error:
+            print(f"Error sending email: {error}")
+
+        return sent
+
+    def _build_message(self, to: str, subject: str, body: str, thread_id: Optional[str] = None,
+                       in_reply_to: Optional[str] = None, references: Optional[str] = None) -> EmailMessage:
+        """Plain-text email threaded under in_reply_to (or the thread root)"""
+        message = EmailMessage()
+        message['From'] = self.from_address
+        message['To'] = to
+        message['Subject'] = subject
+        message['Message-ID'] = make_msgid()
+        parent = in_reply_to or (f"<{thread_id}>" if thread_id else None)
+        if parent:
+            chain = (references or '').split() or ([f"<{thread_id}>"] if thread_id else [])
+            if parent not in chain:
+                chain.append(parent)
+            message['In-Reply-To'] = parent
+            message['References'] = ' '.join(chain)
+        message.set_content(body)
+        return message
+
+    @contextmanager
+    def _smtp_session(self):
+        """Connected (and logged-in, if a password is set) SMTP client"""
+        smtp_class = smtplib.SMTP_SSL if self.smtp_ssl else smtplib.SMTP
+        with smtp_class(self.smtp_host, self.smtp_port, timeout=30) as smtp:
+            smtp.ehlo()
+            if not self.smtp_ssl and smtp.has_extn('starttls'):
+                smtp.starttls(context=ssl.create_default_context())
+                smtp.ehlo()
+            if self.password and smtp.has_extn('auth'):
+                smtp.login(self.username, self.password)
+            yield smtp
+
+    def send_reply(self, thread_id: str, to: str, subject: str, body: str,
+                   in_reply_to: Optional[str] = None, references: Optional[str] = None) -> bool:
+        """Send a reply email (same contract as EmailAgent.send_reply)"""
+        if not subject.lower().startswith('re:'):
+            subject = f"Re: {subject}"
+
+        return self.send_message(to, subject, body + REPLY_SIGNATURE, thread_id=thread_id,
+                                 in_reply_to=in_reply_to, references=references)
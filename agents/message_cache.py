@@ -0,0 +1,155 @@
+"""
+On-disk cache of parsed Gmail messages
+
+Gmail message content never changes once delivered, so parsed headers and
+bodies can be cached by message ID forever; only the size bound (LRU
+eviction) removes entries. Labels are mutable and are not cached. Parsed
+bodies do depend on the parser and its options (body size cap, quote
+stripping, attachment text), so entries are keyed on both via bind_parser().
+"""
+
+import os
+import json
+import hashlib
+import time
+import zlib
+import sqlite3
+import threading
+from typing import Dict, Iterable, Optional
+
+
+class MessageCache:
+    """zlib-compressed, size-bounded LRU cache of parsed messages in SQLite"""
+
+    # Fields that can change after delivery and must come from a fresh API call
+    MUTABLE_FIELDS = ('labels',)
+
+    # IDs per IN (...) query, below SQLite's bound-parameter limit
+    QUERY_CHUNK = 500
+
+    def __init__(self, db_path: str = "data/message_cache.db", max_bytes: int = 50 * 1024 * 1024,
+                 version: int = 1):
+        """
+        Args:
+            db_path: SQLite file to store the cache in
+            max_bytes: Upper bound on total compressed size
+            version: Parser version; entries written by another version are ignored
+                     (agents replace it through bind_parser())
+        """
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS cached_messages (
+                msg_id TEXT PRIMARY KEY,
+                version TEXT NOT NULL,
+                data BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_cached_messages_access ON cached_messages(last_access)")
+        conn.commit()
+        self._total_bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cached_messages").fetchone()[0]
+        conn.close()
+
+    def bind_parser(self, version: int, options: Dict):
+        """
+        Key entries on the parser version and the options it runs with
+
+        Changing either makes earlier entries misses (they age out through LRU).
+        """
+        digest = hashlib.sha1(json.dumps(options, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+        self.version = f"{version}-{digest}"
+
+    def get(self, msg_id: str) -> Optional[Dict]:
+        """Parsed message without mutable fields, or None"""
+        return self.get_many([msg_id]).get(msg_id)
+
+    def get_many(self, msg_ids: Iterable[str]) -> Dict[str, Dict]:
+        """Cached entries for the given IDs (missing IDs are left out)"""
+        msg_ids = list(dict.fromkeys(msg_ids))
+        if not msg_ids:
+            return {}
+
+        found = {}
+        with self._lock:
+            conn = sqlite3.connect(self.db_path)
+            # SQLite limits bound parameters per statement, so query in chunks
+            for start in range(0, len(msg_ids), self.QUERY_CHUNK):
+                chunk = msg_ids[start:start + self.QUERY_CHUNK]
+                rows = conn.execute(
+                    f"SELECT msg_id, data FROM cached_messages WHERE version = ? "
+                    f"AND msg_id IN ({','.join('?' * len(chunk))})",
+                    [self.version] + chunk
+                ).fetchall()
+                for msg_id, data in rows:
+                    found[msg_id] = json.loads(zlib.decompress(data))
+
+            if found:
+                now = time.time()
+                conn.executemany("UPDATE cached_messages SET last_access = ? WHERE msg_id = ?",
+                                 [(now, msg_id) for msg_id in found])
+                conn.commit()
+            conn.close()
+
+            self.hits += len(found)
+            self.misses += len(msg_ids) - len(found)
+
+        return found
+
+    def put(self, msg_id: str, email_data: Dict):
+        """Store a parsed message"""
+        self.put_many({msg_id: email_data})
+
+    def put_many(self, entries: Dict[str, Dict]):
+        """Store several parsed messages, evicting least recently used entries if needed"""
+        if not entries:
+            return
+
+        now = time.time()
+        rows = []
+        for msg_id, email_data in entries.items():
+            stored = {k: v for k, v in email_data.items() if k not in self.MUTABLE_FIELDS}
+            data = zlib.compress(json.dumps(stored).encode('utf-8'), 6)
+            rows.append((msg_id, self.version, data, len(data), now))
+
+        with self._lock:
+            conn = sqlite3.connect(self.db_path)
+            conn.executemany("""
+                INSERT OR REPLACE INTO cached_messages (msg_id, version, data, size, last_access)
+                VALUES (?, ?, ?, ?, ?)
+            """, rows)
+
+            # Measured, not tracked: other processes may write to the same file
+            self._total_bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cached_messages").fetchone()[0]
+            if self._total_bytes > self.max_bytes:
+                self._evict(conn)
+
+            conn.commit()
+            conn.close()
+
+    def _evict(self, conn: sqlite3.Connection):
+        """Drop least recently used entries until the cache is 90% full"""
+        target = int(self.max_bytes * 0.9)
+        cursor = conn.execute("SELECT msg_id, size FROM cached_messages ORDER BY last_access ASC")
+
+        evicted = []
+        for msg_id, size in cursor:
+            if self._total_bytes <= target:
+                break
+            evicted.append((msg_id,))
+            self._total_bytes -= size
+
+        conn.executemany("DELETE FROM cached_messages WHERE msg_id = ?", evicted)
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
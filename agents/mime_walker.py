@@ -0,0 +1,270 @@
+"""
+Bounded MIME body extraction
+
+Walks a message's MIME tree iteratively (no recursion limit on deeply nested
+forwards) and returns the text the LLM should read: the first text/plain
+part, else the first text/html part converted to text. Attachments and
+attached messages are skipped without being decoded, at most `max_bytes` of
+a part is ever decoded, and quoted reply history is cut off so the prompt
+only carries the new content.
+
+Works on both Gmail API payload dicts and email.message.Message objects.
+"""
+
+import re
+import html
+import base64
+import binascii
+import quopri
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_BODY_MAX_BYTES = 20000
+
+# HTML carries markup overhead, so decode more of it to end up with max_bytes of text
+HTML_DECODE_FACTOR = 4
+
+_HTML_DROP_BLOCKS = re.compile(r'<(script|style|head|title)\b.*?</\1\s*>|<!--.*?-->', re.I | re.S)
+_HTML_BREAKS = re.compile(r'<br\s*/?>|</(?:p|div|tr|table|h[1-6]|ul|ol|blockquote)\s*>', re.I)
+_HTML_LIST_ITEM = re.compile(r'<li\b[^>]*>', re.I)
+_HTML_TAG = re.compile(r'<[^>]+>')
+
+# Where quoted history starts in HTML replies (Gmail, Outlook, Apple Mail / generic)
+_HTML_QUOTE_START = re.compile(
+    r'<div[^>]+class="[^"]*gmail_quote|<div[^>]+id="(?:divRplyFwdMsg|appendonsend)"|<blockquote',
+    re.I
+)
+
+# Where quoted history starts in plain-text replies
+_QUOTE_MARKERS = re.compile(
+    r'^[ \t]*On\b[^\n]{0,200}(?:\n[^\n]{0,200})?\bwrote:[ \t]*$'
+    r'|^[ \t]*-{2,}[ \t]*Original Message[ \t]*-{2,}'
+    r'|^[ \t]*From:[^\n]+\n[ \t]*(?:Sent|Date):',
+    re.I | re.M
+)
+_QUOTED_LINE = re.compile(r'^[ \t]*>.*(?:\n|$)', re.M)
+
+_CHARSET = re.compile(r'charset="?([\w.:-]+)', re.I)
+
+
+def html_to_text(markup: str) -> str:
+    """Fast tag-stripping HTML to text that keeps paragraph and list breaks"""
+    text = _HTML_DROP_BLOCKS.sub('', markup)
+    text = _HTML_BREAKS.sub('\n', text)
+    text = _HTML_LIST_ITEM.sub('\n- ', text)
+    text = html.unescape(_HTML_TAG.sub('', text))
+
+    lines = (' '.join(line.split()) for line in text.splitlines())
+    return re.sub(r'\n{3,}', '\n\n', '\n'.join(lines)).strip()
+
+
+def strip_quoted_reply(text: str) -> str:
+    """Drop quoted reply history ("On ... wrote:", "> " lines, Outlook headers)"""
+    match = _QUOTE_MARKERS.search(text)
+    new_content = text[:match.start()] if match else text
+    new_content = _QUOTED_LINE.sub('', new_content).strip()
+
+    # A message that is nothing but a quote (e.g. a bare forward) keeps its text
+    return new_content or text.strip()
+
+
+def _decode(data, encoding: str, limit: int) -> Tuple[bytes, bool]:
+    """
+    Decode at most `limit` bytes of a transfer-encoded payload
+
+    Returns:
+        (decoded bytes, whether the payload was truncated)
+    """
+    if isinstance(data, bytes):
+        data = data.decode('ascii', 'replace')
+
+    if encoding in ('base64', 'base64url'):
+        data = ''.join(data.split())
+        chunk = data[:(limit + 2) // 3 * 4]
+        truncated = len(chunk) < len(data)
+        chunk += '=' * (-len(chunk) % 4)
+        try:
+            if encoding == 'base64url':
+                decoded = base64.urlsafe_b64decode(chunk)
+            else:
+                decoded = base64.b64decode(chunk)
+        except (binascii.Error, ValueError):
+            return b'', False
+        return decoded[:limit], truncated or len(decoded) > limit
+
+    if encoding == 'quoted-printable':
+        # Each decoded byte takes up to 3 encoded characters
+        chunk = data[:limit * 3]
+        decoded = quopri.decodestring(chunk.encode('ascii', 'replace'))
+        return decoded[:limit], len(chunk) < len(data) or len(decoded) > limit
+
+    raw = data.encode('utf-8', 'surrogateescape')
+    return raw[:limit], len(raw) > limit
+
+
+def _to_text(raw: bytes, charset: Optional[str], truncated: bool) -> str:
+    try:
+        # A cut can land inside a multi-byte character; drop the partial tail
+        return raw.decode(charset or 'utf-8', 'ignore' if truncated else 'replace')
+    except LookupError:
+        return raw.decode('utf-8', 'replace')
+
+
+def _finish(text: str, is_html: bool, max_bytes: int, strip_quotes: bool) -> str:
+    if is_html:
+        if strip_quotes:
+            match = _HTML_QUOTE_START.search(text)
+            if match and match.start() > 0:
+                text = text[:match.start()]
+        text = html_to_text(text)
+    if strip_quotes:
+        text = strip_quoted_reply(text)
+    return text[:max_bytes]
+
+
+# Gmail API payloads
+
+def _header(part: Dict, name: str) -> str:
+    for header in part.get('headers') or []:
+        if header.get('name', '').lower() == name:
+            return header.get('value', '')
+    return ''
+
+
+def _is_gmail_attachment(part: Dict) -> bool:
+    body = part.get('body') or {}
+    disposition = _header(part, 'content-disposition').lower()
+    return bool(part.get('filename') or body.get('attachmentId') or disposition.startswith('attachment'))
+
+
+def _gmail_text_parts(payload: Dict):
+    """Yield (mime_type, part) for inline text leaves, in document order"""
+    stack = [payload]
+    while stack:
+        part = stack.pop()
+        mime_type = (part.get('mimeType') or '').lower()
+
+        if part.get('parts'):
+            # Attached messages are attachments, not the body
+            if mime_type != 'message/rfc822':
+                stack.extend(reversed(part['parts']))
+            continue
+
+        if mime_type in ('text/plain', 'text/html') and not _is_gmail_attachment(part):
+            if (part.get('body') or {}).get('data'):
+                yield mime_type, part
+
+
+def extract_body(payload: Dict, max_bytes: int = DEFAULT_BODY_MAX_BYTES, strip_quotes: bool = True) -> str:
+    """
+    Readable body of a Gmail API message payload
+
+    Args:
+        payload: message['payload'] from messages.get(format='full')
+        max_bytes: Cap on bytes decoded from the chosen part and on the result
+        strip_quotes: Cut quoted reply history
+    """
+    html_part = None
+    chosen = None
+    for mime_type, part in _gmail_text_parts(payload):
+        if mime_type == 'text/plain':
+            chosen = part
+            break
+        if html_part is None:
+            html_part = part
+
+    is_html = chosen is None
+    chosen = chosen or html_part
+    if chosen is None:
+        return ''
+
+    limit = max_bytes * HTML_DECODE_FACTOR if is_html else max_bytes
+    raw, truncated = _decode(chosen['body']['data'], 'base64url', limit)
+    charset = _CHARSET.search(_header(chosen, 'content-type'))
+    text = _to_text(raw, charset.group(1) if charset else None, truncated)
+    return _finish(text, is_html, max_bytes, strip_quotes)
+
+
+def list_attachments(payload: Dict) -> List[Dict]:
+    """Attachment metadata (nothing is downloaded or decoded)"""
+    attachments = []
+    stack = [payload]
+    while stack:
+        part = stack.pop()
+        if part.get('parts') and (part.get('mimeType') or '').lower() != 'message/rfc822':
+            stack.extend(reversed(part['parts']))
+            continue
+        if _is_gmail_attachment(part):
+            body = part.get('body') or {}
+            attachments.append({
+                'part_id': part.get('partId'),
+                'filename': part.get('filename', ''),
+                'mime_type': part.get('mimeType', ''),
+                'size': body.get('size', 0),
+                'attachment_id': body.get('attachmentId'),
+                'data': body.get('data')
+            })
+    return attachments
+
+
+# email.message.Message (IMAP / raw RFC 822)
+
+def _is_message_attachment(part) -> bool:
+    return part.get_content_disposition() == 'attachment' or bool(part.get_filename())
+
+
+def extract_message_body(message, max_bytes: int = DEFAULT_BODY_MAX_BYTES, strip_quotes: bool = True) -> str:
+    """Readable body of an email.message.Message (same rules as extract_body)"""
+    html_part = None
+    chosen = None
+    stack = [message]
+    while stack:
+        part = stack.pop()
+        if part.is_multipart():
+            if part.get_content_type() != 'message/rfc822':
+                stack.extend(reversed(part.get_payload()))
+            continue
+        if _is_message_attachment(part):
+            continue
+        if part.get_content_type() == 'text/plain':
+            chosen = part
+            break
+        if part.get_content_type() == 'text/html' and html_part is None:
+            html_part = part
+
+    is_html = chosen is None
+    chosen = chosen or html_part
+    if chosen is None:
+        return ''
+
+    limit = max_bytes * HTML_DECODE_FACTOR if is_html else max_bytes
+    encoding = str(chosen.get('Content-Transfer-Encoding', '')).strip().lower()
+    raw, truncated = _decode(chosen.get_payload(decode=False), encoding, limit)
+    text = _to_text(raw, chosen.get_content_charset(), truncated)
+    return _finish(text, is_html, max_bytes, strip_quotes)
+
+
+if __name__ == "__main__":
+    # An HTML-only reply with quoted history and a large attachment
+    def encode(text):
+        return base64.urlsafe_b64encode(text.encode()).decode()
+
+    payload = {
+        'mimeType': 'multipart/mixed',
+        'parts': [
+            {'mimeType': 'multipart/alternative', 'parts': [
+                {'mimeType': 'text/html', 'headers': [{'name': 'Content-Type', 'value': 'text/html; charset=utf-8'}],
+                 'body': {'data': encode(
+                     '<html><head><style>p {color: red}</style></head><body>'
+                     '<p>Hi Elena,</p><p>The role pays $150k&ndash;$170k and is fully remote.</p>'
+                     '<div class="gmail_quote">On Mon, Jan 6 Elena wrote:<blockquote>'
+                     'What is the rate?</blockquote></div></body></html>')}}
+            ]},
+            {'mimeType': 'application/pdf', 'filename': 'JD.pdf',
+             'body': {'attachmentId': 'ANGjdJ8', 'size': 5_000_000}}
+        ]
+    }
+    print(repr(extract_body(payload)))
+    print(list_attachments(payload))
+
+    newsletter = {'mimeType': 'text/plain', 'body': {'data': encode('x' * 1_000_000)}}
+    print(f"1 MB body capped to {len(extract_body(newsletter, max_bytes=2000))} chars")
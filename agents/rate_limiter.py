@@ -0,0 +1,254 @@
+"""
+Client-side Gmail quota limiter
+
+Gmail charges each API method a number of quota units and caps every user at
+250 units per second (plus an undocumented limit on concurrent requests).
+GmailRateLimiter spends units from a token bucket before each call and
+adjusts how many calls may be in flight from 429 / rateLimitExceeded
+feedback (additive increase, multiplicative decrease), so sustained
+throughput sits just under the quota instead of bursting into it.
+"""
+
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+from utils.metrics import metrics
+
+
+# Quota units per method (https://developers.google.com/gmail/api/reference/quota)
+QUOTA_UNITS = {
+    'messages.list': 5,
+    'messages.get': 5,
+    'messages.send': 100,
+    'messages.modify': 5,
+    'messages.batchModify': 50,
+    'messages.attachments.get': 5,
+    'labels.list': 1,
+    'labels.create': 5,
+    'history.list': 2,
+    'threads.get': 10,
+    'getProfile': 1,
+    'watch': 100,
+    'stop': 50,
+}
+
+DEFAULT_UNITS = 5
+
+RATE_LIMIT_REASONS = ('ratelimitexceeded', 'userratelimitexceeded')
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """True for HttpErrors that mean 'slow down' (429, or 403 rateLimitExceeded)"""
+    status = getattr(getattr(error, 'resp', None), 'status', None)
+    if status == 429:
+        return True
+    if status == 403:
+        content = getattr(error, 'content', b'') or b''
+        if isinstance(content, bytes):
+            content = content.decode('utf-8', 'replace')
+        return any(reason in content.lower() for reason in RATE_LIMIT_REASONS)
+    return False
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Delay requested by a Retry-After header (seconds or HTTP date), if any"""
+    resp = getattr(error, 'resp', None)
+    value = resp.get('retry-after') if hasattr(resp, 'get') else None
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class GmailRateLimiter:
+    """Token bucket over Gmail quota units with AIMD concurrency control"""
+
+    def __init__(self, units_per_second: float = 250, burst: Optional[float] = None,
+                 max_concurrency: int = 10, min_concurrency: int = 1,
+                 max_retries: int = 5, max_backoff: float = 32.0):
+        """
+        Args:
+            units_per_second: Sustained quota spend (Gmail allows 250 per user)
+            burst: Bucket capacity in units (defaults to one second's worth)
+            max_concurrency: Upper bound on calls in flight
+            min_concurrency: Lower bound the limit backs off to
+            max_retries: Attempts after a rate-limit error before giving up
+            max_backoff: Cap on exponential backoff when no Retry-After is sent
+        """
+        self.units_per_second = units_per_second
+        self.capacity = burst or units_per_second
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.max_retries = max_retries
+        self.max_backoff = max_backoff
+
+        self.concurrency_limit = float(max_concurrency)
+        self.throttled = 0
+
+        self._tokens = self.capacity
+        self._last_refill = time.monotonic()
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._in_flight = 0
+        self._cond = threading.Condition()
+
+    def cost(self, method: str, count: int = 1) -> int:
+        return QUOTA_UNITS.get(method, DEFAULT_UNITS) * count
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.units_per_second)
+        self._last_refill = now
+
+    def acquire(self, units: float) -> float:
+        """
+        Block until a concurrency slot and the quota units are available
+
+        Costs above the bucket capacity (large batches) are allowed once the
+        bucket is full and leave it in debt, which later callers wait out.
+
+        Returns:
+            Start time to pass back to release()
+        """
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+
+                wait = self._paused_until - now
+                if wait <= 0 and self._in_flight >= int(self.concurrency_limit):
+                    # Woken by release()
+                    self._cond.wait()
+                    continue
+
+                if wait <= 0:
+                    needed = min(units, self.capacity)
+                    if self._tokens >= needed:
+                        self._tokens -= units
+                        self._in_flight += 1
+                        return now
+                    wait = (needed - self._tokens) / self.units_per_second
+
+                self._cond.wait(wait)
+
+    def release(self, started: float, throttled: bool = False, retry_after: Optional[float] = None):
+        """Give back a concurrency slot and feed the call's outcome into the limit"""
+        with self._cond:
+            self._in_flight -= 1
+
+            if throttled:
+                self._on_throttled(started, retry_after)
+            else:
+                self.concurrency_limit = min(self.max_concurrency,
+                                             self.concurrency_limit + 1 / self.concurrency_limit)
+
+            metrics.gauge('gmail.concurrency_limit', self.concurrency_limit)
+            self._cond.notify_all()
+
+    def _on_throttled(self, started: float, retry_after: Optional[float]):
+        """Back off after a rate-limit error (caller holds the lock)"""
+        self.throttled += 1
+        metrics.increment('gmail.throttled')
+        now = time.monotonic()
+
+        # One decrease per congestion event: calls already in flight when the
+        # limit was last cut don't cut it again
+        if started >= self._last_decrease:
+            self.concurrency_limit = max(self.min_concurrency, self.concurrency_limit / 2)
+            self._last_decrease = now
+        if retry_after:
+            self._paused_until = max(self._paused_until, now + retry_after)
+        # Quota is exhausted server-side; stop spending the local bucket too
+        self._tokens = min(self._tokens, 0)
+
+    def _backoff_delay(self, attempt: int, retry_after: Optional[float]) -> float:
+        if retry_after is not None:
+            return retry_after
+        return min(self.max_backoff, 2 ** attempt) + random.random()
+
+    def execute(self, request, method: str, count: int = 1):
+        """
+        Run request.execute() within the quota, retrying rate-limit errors
+
+        Args:
+            request: Any object with execute() (API request or batch)
+            method: Gmail method name used to look up the unit cost
+            count: Number of calls the request stands for (batch size)
+        """
+        units = self.cost(method, count)
+
+        for attempt in range(self.max_retries + 1):
+            started = self.acquire(units)
+            metrics.increment('gmail.quota_units', units)
+            try:
+                result = request.execute()
+            except Exception as error:
+                if not is_rate_limit_error(error) or attempt == self.max_retries:
+                    self.release(started)
+                    raise
+
+                retry_after = retry_after_seconds(error)
+                self.release(started, throttled=True, retry_after=retry_after)
+                time.sleep(self._backoff_delay(attempt, retry_after))
+                continue
+
+            self.release(started)
+            return result
+
+    def backoff(self, attempt: int, error: Optional[Exception] = None):
+        """Record rate-limited items inside a batch and wait before retrying them"""
+        retry_after = retry_after_seconds(error) if error is not None else None
+        with self._cond:
+            self._on_throttled(self._last_decrease, retry_after)
+        time.sleep(self._backoff_delay(attempt, retry_after))
+
+
+if __name__ == "__main__":
+    # Drive the limiter against a fake server that allows 4 concurrent calls
+    from concurrent.futures import ThreadPoolExecutor
+
+    class Response(dict):
+        status = 429
+
+    class Throttled(Exception):
+        def __init__(self):
+            super().__init__('429 Too Many Requests')
+            self.resp = Response({'retry-after': '0.05'})
+            self.content = b''
+
+    server_lock = threading.Lock()
+    server_in_flight = [0]
+
+    class Request:
+        def execute(self):
+            with server_lock:
+                server_in_flight[0] += 1
+                overloaded = server_in_flight[0] > 4
+            try:
+                if overloaded:
+                    raise Throttled()
+                time.sleep(0.01)
+                return {}
+            finally:
+                with server_lock:
+                    server_in_flight[0] -= 1
+
+    limiter = GmailRateLimiter(units_per_second=2000, max_concurrency=16, max_retries=20)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        list(pool.map(lambda _: limiter.execute(Request(), 'messages.get'), range(400)))
+    elapsed = time.perf_counter() - start
+
+    print(f"400 calls in {elapsed:.2f}s ({400 / elapsed:.0f}/s, "
+          f"{400 * QUOTA_UNITS['messages.get'] / elapsed:.0f} units/s)")
+    print(f"Throttled: {limiter.throttled}  final concurrency limit: {limiter.concurrency_limit:.1f}")
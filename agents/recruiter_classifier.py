@@ -0,0 +1,151 @@
+"""
+Recruiter email detection: keyword heuristics and a trainable classifier
+
+Both work from sender and subject only, so they can screen metadata-only
+fetches before any message body is downloaded. Train a model with
+train_recruiter_classifier.py.
+"""
+
+import os
+from typing import Dict, Iterable, Optional, Tuple
+
+from utils.text_classifier import NaiveBayesTextClassifier
+
+
+# Known non-recruiter domains (financial, marketing, etc.)
+EXCLUDED_DOMAINS = (
+    'robinhood', 'lenscrafters', 'amazon', 'walmart', 'target',
+    'bestbuy', 'ebay', 'paypal', 'venmo', 'chase', 'bankofamerica',
+    'wellsfargo', 'citibank', 'capitalone', 'discover', 'americanexpress',
+    'netflix', 'spotify', 'hulu', 'disney', 'apple', 'google.com',
+    'facebook', 'instagram', 'twitter', 'tiktok', 'snapchat',
+    'uber', 'lyft', 'doordash', 'grubhub', 'instacart'
+)
+
+# Job board and recruiter domains (usually legitimate)
+RECRUITER_DOMAINS = (
+    'indeed', 'linkedin', 'dice', 'glassdoor', 'ziprecruiter',
+    'monster', 'careerbuilder', 'simplyhired', 'hired', 'angellist',
+    'greenhouse', 'lever', 'workday', 'taleo', 'icims',
+    'recruiting', 'talent', 'staffing', 'search', 'placement'
+)
+
+# Subject fragments that show a specific job rather than a generic alert
+COMPANY_MARKERS = (
+    ' at ', ' with ', ' - ', 'company', 'corporation', 'group',
+    'systems', 'solutions', 'technologies', 'services', 'inc'
+)
+
+GENERIC_ALERTS = (
+    'job alert for:', 'saved search:', 'your daily job',
+    'jobs you might like', 'based on your resume'
+)
+
+# Keywords that strongly suggest recruiter email
+STRONG_RECRUITER_KEYWORDS = (
+    'recruiter', 'recruiting', 'talent acquisition', 'talent partner',
+    'hr specialist', 'hiring manager', 'staffing', 'placement'
+)
+
+# Job-specific keywords in subject (not just body)
+JOB_KEYWORDS = (
+    'position with', 'role with', 'opportunity with',
+    'interview', 'job description', 'job opening',
+    'we have an opening', 'reaching out to you for',
+    'job title:', 'location:', 'pay:', 'salary:'
+)
+
+
+def is_recruiter_heuristic(email_data: Dict) -> bool:
+    """Hand-written rules to identify recruiter emails"""
+    sender = email_data.get('from', '').lower()
+    from_name = email_data.get('from_name', '').lower()
+    subject = email_data.get('subject', '').lower()
+
+    # If from excluded domain, not a recruiter
+    if any(domain in sender for domain in EXCLUDED_DOMAINS):
+        return False
+
+    # If from known recruiter domain, likely a recruiter
+    if any(domain in sender or domain in from_name for domain in RECRUITER_DOMAINS):
+        # If subject has a company/role mentioned, it's specific enough
+        if any(marker in subject for marker in COMPANY_MARKERS):
+            return True
+
+        # Filter truly generic alerts
+        if any(alert in subject for alert in GENERIC_ALERTS):
+            return False  # Too generic
+
+        return True  # From recruiter domain, specific enough
+
+    # If sender identifies as recruiter, it's a recruiter
+    combined_text = f"{subject} {from_name}"
+    if any(keyword in combined_text for keyword in STRONG_RECRUITER_KEYWORDS):
+        return True
+
+    # Need at least 2 job keywords in subject
+    subject_matches = sum(1 for keyword in JOB_KEYWORDS if keyword in subject)
+    return subject_matches >= 2
+
+
+def email_features(email_data: Dict) -> str:
+    """
+    Text fed to the classifier
+
+    Sender domain parts and display-name words are prefixed so they hash to
+    different features than the same words in the subject.
+    """
+    sender = email_data.get('from', '').lower()
+    domain = sender.rsplit('@', 1)[-1]
+    domain_parts = [part for part in domain.split('.') if part]
+    name_words = email_data.get('from_name', '').lower().split()
+
+    return ' '.join(
+        [f"from-{part}" for part in domain_parts]
+        + [f"name-{word}" for word in name_words]
+        + [email_data.get('subject', '')]
+    )
+
+
+class RecruiterClassifier:
+    """Naive Bayes recruiter / other classifier over hashed header features"""
+
+    RECRUITER = 'recruiter'
+    OTHER = 'other'
+
+    def __init__(self, model: NaiveBayesTextClassifier = None, threshold: float = 0.5):
+        self.model = model or NaiveBayesTextClassifier(n_features=2 ** 16)
+        self.threshold = threshold
+
+    def train(self, samples: Iterable[Tuple[Dict, bool]]) -> 'RecruiterClassifier':
+        """Train from (email_data, is_recruiter) pairs"""
+        self.model.fit(
+            (email_features(email), self.RECRUITER if is_recruiter else self.OTHER)
+            for email, is_recruiter in samples
+        )
+        return self
+
+    def probability(self, email_data: Dict) -> float:
+        """Probability that an email is from a recruiter"""
+        return self.model.predict_proba(email_features(email_data)).get(self.RECRUITER, 0.0)
+
+    def is_recruiter(self, email_data: Dict) -> bool:
+        return self.probability(email_data) >= self.threshold
+
+    def save(self, path: str):
+        self.model.save(path)
+
+    @classmethod
+    def load(cls, path: str, threshold: float = 0.5) -> 'RecruiterClassifier':
+        return cls(NaiveBayesTextClassifier.load(path), threshold=threshold)
+
+    @classmethod
+    def load_if_valid(cls, path: Optional[str]) -> Optional['RecruiterClassifier']:
+        """Model at path, or None (keyword heuristic) if it is missing, corrupt or an old format"""
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            return cls.load(path)
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            print(f"Could not load recruiter model from {path} ({e}) - using keyword rules")
+            return None
@@ -0,0 +1,136 @@
+"""
+Per-thread Gmail service objects sharing one set of credentials
+
+googleapiclient services sit on an httplib2 connection that must not be used
+by two threads at once, so each thread gets its own service. All of them
+authorize with the same credentials, and token refresh is serialized so an
+expired token is refreshed once rather than once per thread.
+"""
+
+import threading
+from typing import Callable, Optional
+
+from google.auth import credentials as google_credentials
+from googleapiclient.discovery import build
+from googleapiclient.http import build_http
+
+try:
+    import google_auth_httplib2
+except ImportError:
+    google_auth_httplib2 = None
+
+
+class SharedCredentials(google_credentials.Credentials):
+    """
+    Wraps google-auth credentials so concurrent refreshes happen once
+
+    A real Credentials subclass, so googleapiclient (batch requests included)
+    and google-auth-httplib2 treat it as google-auth credentials. Token and
+    expiry live on the wrapped object; the base __init__ is skipped because
+    it would reset them.
+    """
+
+    def __init__(self, credentials):
+        # pylint: disable=super-init-not-called
+        self._credentials = credentials
+        self._refresh_lock = threading.Lock()
+
+    @property
+    def token(self):
+        return self._credentials.token
+
+    @token.setter
+    def token(self, value):
+        self._credentials.token = value
+
+    @property
+    def expiry(self):
+        return self._credentials.expiry
+
+    @expiry.setter
+    def expiry(self, value):
+        self._credentials.expiry = value
+
+    @property
+    def valid(self):
+        return self._credentials.valid
+
+    @property
+    def expired(self):
+        return self._credentials.expired
+
+    @property
+    def quota_project_id(self):
+        return self._credentials.quota_project_id
+
+    def apply(self, headers, token=None):
+        self._credentials.apply(headers, token=token)
+
+    def before_request(self, request, method, url, headers):
+        if not self.valid:
+            self.refresh(request)
+        self.apply(headers)
+
+    def refresh(self, request):
+        seen_token = self._credentials.token
+        with self._refresh_lock:
+            # Another thread refreshed while we waited for the lock
+            if self._credentials.token != seen_token and self._credentials.valid:
+                return
+            self._credentials.refresh(request)
+
+    def __getattr__(self, name):
+        return getattr(self._credentials, name)
+
+
+class GmailServicePool:
+    """Lazily builds one Gmail service per thread"""
+
+    def __init__(self, credentials=None, factory: Optional[Callable] = None,
+                 http_factory: Callable = build_http):
+        """
+        Args:
+            credentials: Authorized google-auth credentials
+            factory: Optional zero-argument callable returning a new service
+                     (defaults to building Gmail v1 with the shared credentials)
+            http_factory: Transport for each built service (httplib2.Http by default)
+        """
+        self.credentials = SharedCredentials(credentials) if credentials is not None else None
+        self._factory = factory or self._build_service
+        self._http_factory = http_factory
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.size = 0
+
+    def _build_service(self):
+        if google_auth_httplib2 is None:
+            raise ImportError("google-auth-httplib2 is required for the Gmail service pool")
+        http = google_auth_httplib2.AuthorizedHttp(self.credentials, http=self._http_factory())
+        return build('gmail', 'v1', http=http, cache_discovery=False)
+
+    def get(self):
+        """Service for the calling thread"""
+        service = getattr(self._local, 'service', None)
+        if service is None:
+            service = self._factory()
+            self._local.service = service
+            with self._lock:
+                self.size += 1
+        return service
+
+
+if __name__ == "__main__":
+    # Each worker thread gets (and keeps) its own service object
+    from concurrent.futures import ThreadPoolExecutor
+
+    pool = GmailServicePool(factory=object)
+
+    def worker(_):
+        service = pool.get()
+        assert pool.get() is service
+        return id(service)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        ids = set(executor.map(worker, range(100)))
+
+    print(f"Threads: 4  distinct services: {len(ids)}  built: {pool.size}")
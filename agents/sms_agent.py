@@ -79,22 +79,9 @@ class SMSAgent:
         
         # Send via email
         # Note: No subject and thread_id for SMS
-        from email.mime.text import MIMEText
-        import base64
-        
         try:
-            mime_message = MIMEText(message)
-            mime_message['to'] = sms_email
-            mime_message['subject'] = ''  # No subject for SMS
-            
-            raw_message = base64.urlsafe_b64encode(mime_message.as_bytes()).decode('utf-8')
-            
-            send_message = {'raw': raw_message}
-            
-            result = self.email_agent.service.users().messages().send(
-                userId='me',
-                body=send_message
-            ).execute()
+            if not self.email_agent.send_message(sms_email, '', message):
+                return False
             
             print(f"SMS sent to {phone_number} via {gateway}")
             return True
@@ -0,0 +1,78 @@
+"""
+Compare LLM throughput: one request per message vs batched backlog mode
+
+Usage:
+    python benchmark_llm_batch.py [message_count]
+
+Uses the LLM provider configured in .env (LLM_PROVIDER / OLLAMA_MODEL).
+"""
+
+import os
+import sys
+import time
+from dotenv import load_dotenv
+
+from core.llm_processor import LLMProcessor
+
+load_dotenv()
+
+SAMPLE_MESSAGES = [
+    "Hi Elena, I'm reaching out about a Senior QA Automation Engineer position with a fintech client. Is this a good time to talk?",
+    "Do you have experience with Playwright and GitHub Actions? The team is migrating away from Selenium Grid.",
+    "Are you available for a 30 minute call on Thursday or Friday afternoon?",
+    "We have an opening for a Test Automation Architect, fully remote, 12 month contract. Interested?",
+    "Can you tell me about your experience leading automation teams?",
+    "The client wants someone onsite in Atlanta three days a week. Would hybrid work for you?",
+]
+
+count = int(sys.argv[1]) if len(sys.argv) > 1 else 12
+items = [
+    {
+        'message': SAMPLE_MESSAGES[i % len(SAMPLE_MESSAGES)],
+        'channel': 'email',
+        'conversation_state': {'stage': 'initial_contact'},
+        'context': None
+    }
+    for i in range(count)
+]
+
+processor = LLMProcessor(
+    provider=os.getenv('LLM_PROVIDER', 'ollama'),
+    model=os.getenv('OLLAMA_MODEL', 'llama2')
+)
+
+# Count underlying LLM requests for both paths
+calls = {'count': 0}
+original_call_llm = processor._call_llm
+
+
+def counting_call_llm(*args, **kwargs):
+    calls['count'] += 1
+    return original_call_llm(*args, **kwargs)
+
+
+processor._call_llm = counting_call_llm
+
+print("=" * 80)
+print(f"LLM BATCH BENCHMARK - {count} messages, provider={processor.provider}, model={processor.model}")
+print("=" * 80)
+
+start = time.perf_counter()
+single_results = [processor.generate_response(**item) for item in items]
+single_elapsed = time.perf_counter() - start
+single_calls = calls['count']
+
+calls['count'] = 0
+start = time.perf_counter()
+batch_results = processor.generate_responses_batch(items)
+batch_elapsed = time.perf_counter() - start
+batch_calls = calls['count']
+
+print(f"{'Mode':<12} {'Seconds':>10} {'Msgs/sec':>10} {'LLM calls':>10}")
+print("-" * 80)
+print(f"{'single':<12} {single_elapsed:>10.2f} {count / single_elapsed:>10.2f} {single_calls:>10}")
+print(f"{'batched':<12} {batch_elapsed:>10.2f} {count / batch_elapsed:>10.2f} {batch_calls:>10}")
+print("-" * 80)
+print(f"Speedup: {single_elapsed / batch_elapsed:.2f}x")
+print(f"Batched responses returned: {sum(1 for r in batch_results if r and r.get('response'))}/{count}")
+print("=" * 80)
@@ -0,0 +1,209 @@
+"""
+asyncio front end for the orchestrator
+
+AsyncJobApplicationOrchestrator drives the same components as
+JobApplicationOrchestrator from one event loop. Mail, LLM and state calls are
+awaitable through AsyncAdapter, which runs the underlying blocking client on
+its own thread pool, so hundreds of messages can be in flight at once while
+the loop itself stays on one core. Messages from the same conversation are
+still handled one at a time and in arrival order.
+"""
+
+import os
+import asyncio
+import functools
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Optional
+
+from core.orchestrator import JobApplicationOrchestrator, oldest_first
+
+
+class AsyncAdapter:
+    """Awaitable proxy for a blocking component; its calls run on a dedicated thread pool"""
+
+    def __init__(self, target, workers: int, name: str):
+        self.target = target
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f'async-{name}')
+
+    async def run(self, func, *args, **kwargs):
+        """Await any blocking callable on this adapter's pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    def __getattr__(self, name):
+        attribute = getattr(self.target, name)
+        if not callable(attribute):
+            return attribute
+
+        async def call(*args, **kwargs):
+            return await self.run(attribute, *args, **kwargs)
+        return call
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+
+class AsyncJobApplicationOrchestrator:
+    """Event-loop driven message processing on top of JobApplicationOrchestrator's components"""
+
+    def __init__(self, orchestrator: Optional[JobApplicationOrchestrator] = None,
+                 max_in_flight: Optional[int] = None):
+        """
+        Args:
+            orchestrator: Supplies the agents, LLM processor, state and outbox
+            max_in_flight: Messages processed concurrently (default ASYNC_MAX_IN_FLIGHT)
+        """
+        self.orchestrator = orchestrator or JobApplicationOrchestrator()
+        self.max_in_flight = max_in_flight or int(os.getenv('ASYNC_MAX_IN_FLIGHT', '100'))
+
+        self.mail = AsyncAdapter(self.orchestrator.email_agent, workers=4, name='mail')
+        self.llm = AsyncAdapter(self.orchestrator.llm_processor, workers=self.max_in_flight, name='llm')
+        # SQLite serializes writers anyway; one thread avoids lock contention
+        self.state = AsyncAdapter(self.orchestrator.state_manager, workers=1, name='state')
+
+        self._conversation_locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+        self._background_sender: Optional[asyncio.Task] = None
+        self._cycle_errors = 0
+
+    async def process_new_messages(self) -> int:
+        """
+        Fetch unread mail once and process messages concurrently
+
+        Returns:
+            Number of messages processed
+        """
+        o = self.orchestrator
+        slots = asyncio.Semaphore(self.max_in_flight)
+        tasks = []
+        self._cycle_errors = 0
+
+        async def process(message):
+            try:
+                return await self._process_message(message)
+            finally:
+                slots.release()
+
+        try:
+            # Tasks take their conversation's lock in creation order, so create
+            # them oldest first (mailboxes list newest first)
+            messages = await self.mail.run(lambda: oldest_first(o.email_agent.iter_unread_recruiter_emails(
+                page_size=o.email_page_size,
+                max_messages=o.email_max_per_cycle or None,
+                prefetch=o.email_prefetch
+            )))
+            try:
+                for message in messages:
+                    # Start no more than max_in_flight messages at a time
+                    await slots.acquire()
+                    tasks.append(asyncio.create_task(process(message)))
+            finally:
+                # Finish what was started even if starting more failed
+                processed = sum(await asyncio.gather(*tasks))
+        finally:
+            await self.mail.flush_modifications()
+            if self._background_sender is None:
+                await self.mail.run(o.outbox.send_pending)
+            self._conversation_locks.clear()
+
+        # Incremental sync only moves past this cycle's mail once all of it was handled
+        if self._cycle_errors:
+            print(f"{self._cycle_errors} message(s) failed - they will be fetched again next cycle")
+        else:
+            await self.mail.commit_sync_checkpoint()
+        return processed
+
+    async def _process_message(self, message: Dict) -> int:
+        """Route one message to its channel's state, generate and dispatch steps"""
+        o = self.orchestrator
+        channel = o._route_message(message)
+        if channel == 'sms' and o._is_sms_unsubscribe(message):
+            return 0
+
+        stages = o.channel_stages[channel]
+        conversation = o._conversation_key(message, channel)
+        try:
+            async with self._conversation_locks[conversation]:
+                state = await self.state.run(stages['state'], message)
+                response_data = await self.llm.run(stages['generate'], message, state)
+                acknowledge = await self.state.run(stages['dispatch'], message, state, response_data)
+
+            if acknowledge:
+                o.email_agent.queue_mark_as_read(message.get('id'))
+            return 1
+
+        except Exception as e:
+            print(f"Error processing {channel} message {message.get('id')}: {e}")
+            self._cycle_errors += 1
+            return 0
+
+    async def _send_outbox_forever(self, interval: float):
+        while True:
+            try:
+                await self.mail.run(self.orchestrator.outbox.send_pending)
+            except Exception as e:
+                print(f"Outbox sender error: {e}")
+            await asyncio.sleep(interval)
+
+    async def run_forever(self, interval: float = 300):
+        """Daemon loop: a cycle every `interval` seconds, replies sent by a background task"""
+        self._background_sender = asyncio.create_task(self._send_outbox_forever(
+            float(os.getenv('OUTBOX_SEND_INTERVAL_SECONDS', '5'))
+        ))
+        try:
+            while True:
+                print(f"AI Recruiter Agent (async) - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+                try:
+                    count = await self.process_new_messages()
+                    print(f"Processed {count} message(s)" if count else "No new messages")
+                except Exception as e:
+                    print(f"Error in processing: {e}")
+
+                await asyncio.sleep(interval)
+        finally:
+            self._background_sender.cancel()
+            self._background_sender = None
+
+    def close(self):
+        for adapter in (self.mail, self.llm, self.state):
+            adapter.close()
+
+
+if __name__ == "__main__":
+    # ~200 recruiter emails with 0.2s of simulated LLM time each, 100 in flight (no Gmail quota)
+    import sys
+    import time
+    import tempfile
+
+    from agents.email_agent import EmailAgent
+    from agents.fake_gmail import FakeGmailService
+    from agents.rate_limiter import GmailRateLimiter
+    from core.state_manager import StateManager
+    from load_test import SimulatedLLMProcessor
+
+    gmail = FakeGmailService(latency=0.01, seed=7)
+    recruiters = gmail.populate(400)
+    state_manager = StateManager(db_path=os.path.join(tempfile.mkdtemp(), 'async_demo.db'))
+    orchestrator = JobApplicationOrchestrator(
+        state_manager=state_manager,
+        llm_processor=SimulatedLLMProcessor(latency=0.2),
+        email_agent=EmailAgent(state_manager=state_manager, service=gmail,
+                               rate_limiter=GmailRateLimiter(units_per_second=1e9))
+    )
+    orchestrator.auto_reply_enabled = True
+    orchestrator.require_approval = False
+    orchestrator.best_of_n = 1
+
+    async_orchestrator = AsyncJobApplicationOrchestrator(orchestrator, max_in_flight=100)
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            count = asyncio.run(async_orchestrator.process_new_messages())
+        finally:
+            sys.stdout = stdout
+    async_orchestrator.close()
+
+    print(f"Processed {count}/{recruiters} recruiter emails in {time.perf_counter() - start:.1f}s "
+          f"(sequential LLM time alone: {recruiters * 0.2:.0f}s); replies sent: {len(gmail.sent)}")
@@ -3,8 +3,12 @@ LLM Processor for generating responses using local or cloud LLMs
 """
 
 import os
+import re
 import json
+import time
 import yaml
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from typing import Dict, List, Optional
 from datetime import datetime
 
@@ -27,6 +31,10 @@ try:
 except ImportError:
     ANTHROPIC_AVAILABLE = False
 
+from core.stage_classifier import StageClassifier
+from core.token_budget import PromptBudget, estimate_tokens
+from utils.metrics import metrics
+
 
 class LLMProcessor:
     """Processes messages and generates responses using LLMs"""
@@ -37,6 +45,38 @@ class LLMProcessor:
         self.profile = self._load_profile()
         self.prompts = self._load_prompts()
         
+        # Optional local stage prediction before generation
+        self.stage_classifier = None
+        self.fast_negotiation_escalation = os.getenv('STAGE_FAST_ESCALATION', 'true').lower() == 'true'
+        if os.getenv('STAGE_CLASSIFIER_ENABLED', 'false').lower() == 'true':
+            self.stage_classifier = StageClassifier.from_prompts(
+                self.prompts,
+                model_path=os.getenv('STAGE_MODEL_PATH', 'data/stage_model.json'),
+                model_threshold=float(os.getenv('STAGE_MODEL_THRESHOLD', '0.6')),
+                decisive_margin=int(os.getenv('STAGE_DECISIVE_MARGIN', '2'))
+            )
+        
+        # Past replies retrieved as few-shot examples (set reply_index to enable)
+        self.reply_index = None
+        self.few_shot_examples = int(os.getenv('FEW_SHOT_EXAMPLES', '0'))
+        
+        # Batched (backlog) generation limits
+        self.context_tokens = int(os.getenv('LLM_CONTEXT_TOKENS', '4096'))
+        self.batch_max_size = int(os.getenv('LLM_BATCH_MAX_SIZE', '8'))
+        self.batch_item_max_tokens = int(os.getenv('LLM_BATCH_ITEM_MAX_TOKENS', '600'))
+        self.batch_output_tokens_per_item = int(os.getenv('LLM_BATCH_OUTPUT_TOKENS', '300'))
+        
+        # Prompt size limit for single-message requests (leaves room for the reply)
+        self.prompt_budget = PromptBudget(
+            int(os.getenv('PROMPT_TOKEN_BUDGET', str(self.context_tokens - 500)))
+        )
+        self.min_message_tokens = int(os.getenv('PROMPT_MIN_MESSAGE_TOKENS', '200'))
+        
+        # Best-of-N candidates share one bounded pool across all calls
+        self.best_of_n_workers = int(os.getenv('BEST_OF_N_MAX_WORKERS', '8'))
+        self._candidate_executor: Optional[ThreadPoolExecutor] = None
+        self._candidate_executor_lock = threading.Lock()
+        
         # Initialize provider
         if provider == "ollama":
             if not OLLAMA_AVAILABLE:
@@ -88,28 +128,400 @@ class LLMProcessor:
                 - escalation_reason: Optional reason for escalation
         """
         
+        plan = self._plan_generation(message, channel, conversation_state, context)
+        if 'result' in plan:
+            return plan['result']
+        
+        # Generate response
+        llm_output = self._call_llm(plan['system_prompt'], plan['user_prompt'])
+        
+        # Parse and structure response
+        return self._finish_generation(llm_output, message, plan)
+    
+    def generate_best_of_n(self,
+                           message: str,
+                           channel: str,
+                           conversation_state: Dict,
+                           context: Optional[Dict] = None,
+                           n: int = 3,
+                           budget_seconds: float = 30.0) -> Dict:
+        """
+        Generate N candidate responses in parallel and return the best scoring one
+        
+        Candidates still running when the budget expires are abandoned (their
+        results are discarded), so latency is bounded by budget_seconds.
+        
+        Returns:
+            Same structure as generate_response(), plus candidate_score
+        
+        Raises:
+            RuntimeError: If no candidate finished within the budget
+        """
+        plan = self._plan_generation(message, channel, conversation_state, context)
+        if 'result' in plan:
+            return plan['result']
+        
+        deadline = time.monotonic() + budget_seconds
+        executor = self._get_candidate_executor()
+        pending = {
+            executor.submit(self._generate_candidate, deadline, plan['system_prompt'], plan['user_prompt'])
+            for _ in range(n)
+        }
+        
+        best, best_score, errors = None, None, []
+        try:
+            while pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                
+                done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        llm_output = future.result()
+                    except RuntimeError as e:
+                        errors.append(str(e))
+                        continue
+                    
+                    result = self._finish_generation(llm_output, message, plan)
+                    score = self.score_candidate(llm_output, result, channel)
+                    if best_score is None or score > best_score:
+                        best, best_score = result, score
+        finally:
+            # Candidates still queued never start; running ones finish on the pool
+            for future in pending:
+                future.cancel()
+        
+        if best is None:
+            reason = errors[0] if errors else f"no candidate finished within {budget_seconds}s"
+            raise RuntimeError(f"Best-of-{n} generation failed: {reason}")
+        
+        best['candidate_score'] = best_score
+        return best
+    
+    def _get_candidate_executor(self) -> ThreadPoolExecutor:
+        with self._candidate_executor_lock:
+            if self._candidate_executor is None:
+                self._candidate_executor = ThreadPoolExecutor(max_workers=self.best_of_n_workers,
+                                                              thread_name_prefix='best-of-n')
+            return self._candidate_executor
+    
+    def _generate_candidate(self, deadline: float, system_prompt: str, user_prompt: str) -> str:
+        """One best-of-N candidate; skipped if a pool worker only frees up after the deadline"""
+        if time.monotonic() >= deadline:
+            raise RuntimeError("candidate not started within the budget")
+        return self._call_llm(system_prompt, user_prompt)
+    
+    def score_candidate(self, llm_output: str, result: Dict, channel: str) -> float:
+        """
+        Score a candidate response locally (higher is better)
+        
+        Checks JSON validity, length limits for the channel, sign-off and ARIA
+        disclosure, then breaks ties on the model's own confidence.
+        """
+        score = 0.0
+        response = (result.get('response') or '').strip()
+        
+        if self._extract_json(llm_output) is not None:
+            score += 3.0
+        
+        max_length = 160 if channel == 'sms' else 2000
+        min_length = 20 if channel == 'sms' else 80
+        if min_length <= len(response) <= max_length:
+            score += 2.0
+        elif len(response) > max_length:
+            score -= 2.0
+        
+        if re.search(r'\bElena\b', response[-200:]):
+            score += 1.0
+        if re.search(r'\bARIA\b', response):
+            score += 1.0
+        
+        try:
+            score += min(max(float(result.get('confidence', 0)), 0.0), 1.0)
+        except (TypeError, ValueError):
+            pass
+        
+        return score
+    
+    def _plan_generation(self, message: str, channel: str, conversation_state: Dict,
+                         context: Optional[Dict]) -> Dict:
+        """
+        Work out the prompts for a single message
+        
+        Returns a dict with either 'result' (answered locally, no LLM call
+        needed) or 'system_prompt', 'user_prompt', 'prompt_stage' and
+        'predicted_stage'.
+        """
         # Determine conversation stage
         current_stage = conversation_state.get('stage', 'initial_contact')
+        predicted_stage = self.predict_stage(message, current_stage)
         
-        # Build context for LLM
-        system_prompt = self._build_system_prompt(current_stage, channel)
-        user_prompt = self._build_user_prompt(message, conversation_state, context)
+        # Negotiation always goes to Elena, so there is nothing for the LLM to decide
+        if predicted_stage == 'negotiation' and self.fast_negotiation_escalation:
+            return {'result': self._negotiation_escalation(message)}
         
-        # Generate response
-        llm_output = self._call_llm(system_prompt, user_prompt)
+        prompt_stage = predicted_stage or current_stage
         
-        # Parse and structure response
-        result = self._parse_llm_output(llm_output, message, current_stage)
+        # Build context for LLM
+        system_prompt = self._build_system_prompt(prompt_stage, channel)
+        return {
+            'system_prompt': system_prompt,
+            'user_prompt': self._build_user_prompt(message, conversation_state, context,
+                                                   stage_known=predicted_stage is not None,
+                                                   system_tokens=estimate_tokens(system_prompt)),
+            'prompt_stage': prompt_stage,
+            'predicted_stage': predicted_stage
+        }
+    
+    def _finish_generation(self, llm_output: str, message: str, plan: Dict) -> Dict:
+        """Parse LLM output for a planned generation"""
+        result = self._parse_llm_output(llm_output, message, plan['prompt_stage'])
+        
+        if plan['predicted_stage']:
+            result['next_stage'] = self._next_stage_after(plan['predicted_stage'])
         
         return result
     
+    def generate_responses_batch(self, items: List[Dict]) -> List[Optional[Dict]]:
+        """
+        Generate responses for several independent messages in as few LLM calls as possible
+        
+        Short messages are packed into shared requests sized to the context
+        window; long messages, and any batch whose output can't be parsed,
+        fall back to generate_response().
+        
+        Args:
+            items: Dicts holding generate_response() keyword arguments
+                   (message, channel, conversation_state, context)
+        
+        Returns:
+            One result dict per item, in the same order (None where a
+            single-call fallback failed, so one bad item can't sink the rest)
+        """
+        results: List[Optional[Dict]] = [None] * len(items)
+        pending = []
+        
+        for index, item in enumerate(items):
+            message = item.get('message') or ''
+            current_stage = (item.get('conversation_state') or {}).get('stage', 'initial_contact')
+            predicted_stage = self.predict_stage(message, current_stage)
+            
+            if predicted_stage == 'negotiation' and self.fast_negotiation_escalation:
+                results[index] = self._negotiation_escalation(message)
+            elif estimate_tokens(message) > self.batch_item_max_tokens:
+                results[index] = self._generate_single(item)
+            else:
+                pending.append((index, item, predicted_stage))
+        
+        for batch in self._plan_batches(pending):
+            outputs = {}
+            if len(batch) > 1:
+                try:
+                    outputs = self._generate_batch(batch)
+                except RuntimeError as e:
+                    print(f"Batch generation failed, falling back to single calls: {e}")
+            
+            for position, (index, item, _) in enumerate(batch, 1):
+                results[index] = outputs.get(position) or self._generate_single(item)
+        
+        return results
+    
+    def _generate_single(self, item: Dict) -> Optional[Dict]:
+        """generate_response() for one batch item; None if it fails"""
+        try:
+            return self.generate_response(**item)
+        except Exception as e:
+            print(f"Error generating response for batch item: {e}")
+            return None
+    
+    def _plan_batches(self, pending: List[tuple]) -> List[List[tuple]]:
+        """Greedily pack items into batches that fit the context window"""
+        batches = []
+        batch, stages, used = [], set(), 0
+        base_tokens = estimate_tokens(self._build_batch_system_prompt([]))
+        
+        for entry in pending:
+            _, item, predicted_stage = entry
+            stage = self._batch_item_stage(item, predicted_stage)
+            cost = (estimate_tokens(self._format_batch_item(1, item, stage))
+                    + self.batch_output_tokens_per_item)
+            guidance = estimate_tokens(self.prompts.get('stage_prompts', {}).get(stage, ''))
+            
+            extra = cost + (guidance if stage not in stages else 0)
+            if batch and (len(batch) >= self.batch_max_size
+                          or base_tokens + used + extra > self.context_tokens):
+                batches.append(batch)
+                batch, stages, used = [], set(), 0
+                extra = cost + guidance
+            
+            batch.append(entry)
+            stages.add(stage)
+            used += extra
+        
+        if batch:
+            batches.append(batch)
+        return batches
+    
+    def _batch_item_stage(self, item: Dict, predicted_stage: Optional[str]) -> str:
+        return predicted_stage or (item.get('conversation_state') or {}).get('stage', 'initial_contact')
+    
+    def _generate_batch(self, batch: List[tuple]) -> Dict[int, Dict]:
+        """Run one packed request and return results keyed by 1-based batch position"""
+        stages = [self._batch_item_stage(item, predicted) for _, item, predicted in batch]
+        system_prompt = self._build_batch_system_prompt(sorted(set(stages)))
+        user_prompt = self._build_batch_user_prompt(
+            [(item, stage) for (_, item, _), stage in zip(batch, stages)]
+        )
+        
+        llm_output = self._call_llm(
+            system_prompt, user_prompt,
+            max_tokens=self.batch_output_tokens_per_item * len(batch)
+        )
+        
+        results = {}
+        for entry in self._parse_batch_output(llm_output):
+            position = entry.get('id')
+            if not isinstance(position, int) or not 1 <= position <= len(batch):
+                continue
+            if not isinstance(entry.get('response'), str) or not entry['response'].strip():
+                continue
+            
+            _, item, predicted_stage = batch[position - 1]
+            message = item.get('message') or ''
+            entry.setdefault('extracted_info', self._extract_info_fallback(message))
+            entry.setdefault('next_stage', stages[position - 1])
+            entry.setdefault('requires_escalation', self._check_escalation_keywords(message))
+            entry.setdefault('escalation_reason', None)
+            entry.setdefault('confidence', 0.5)
+            if predicted_stage:
+                entry['next_stage'] = self._next_stage_after(predicted_stage)
+            entry.pop('id', None)
+            results[position] = entry
+        
+        return results
+    
+    def _build_batch_system_prompt(self, stages: List[str]) -> str:
+        """System prompt shared by every message in a batch"""
+        stage_prompts = self.prompts.get('stage_prompts', {})
+        guidance = "\n".join(
+            f"[{stage}]\n{stage_prompts.get(stage) or stage_prompts.get({'declined': 'decline'}.get(stage, ''), '')}"
+            for stage in stages
+        )
+        
+        return self.prompts.get('system_prompt', '') + self._profile_info() + f"""
+You will receive several independent recruiter messages. Treat each one on its own;
+never mix details between them. For SMS messages keep the response to 1-2 sentences.
+
+Stage-specific guidance:
+{guidance}
+"""
+    
+    def _format_batch_item(self, position: int, item: Dict, stage: str) -> str:
+        state = item.get('conversation_state') or {}
+        return f"""
+### Message {position}
+Channel: {item.get('channel', 'email')}
+Stage: {stage}
+Known: company={state.get('company') or 'Unknown'}; position={state.get('position') or 'Unknown'}; recruiter={state.get('recruiter_name') or 'Unknown'}; work arrangement={state.get('work_arrangement') or 'Not specified'}; salary={state.get('salary_range') or 'Not specified'}
+Message:
+{item.get('message') or ''}
+"""
+    
+    def _build_batch_user_prompt(self, items: List[tuple]) -> str:
+        """User prompt packing several messages into one request"""
+        blocks = "".join(
+            self._format_batch_item(position, item, stage)
+            for position, (item, stage) in enumerate(items, 1)
+        )
+        
+        return f"""{blocks}
+For each message above, write a professional response and extract any new
+information (company name, position title, salary, etc.).
+
+Respond with ONLY a JSON array containing one object per message, in order:
+[
+    {{
+        "id": 1,
+        "response": "your generated message here",
+        "extracted_info": {{
+            "company": "...",
+            "position": "...",
+            "recruiter_name": "...",
+            "salary_range": "...",
+            "work_arrangement": "...",
+            "tech_stack": ["..."]
+        }},
+        "next_stage": "information_gathering|screening|negotiation|scheduling|declined",
+        "requires_escalation": false,
+        "escalation_reason": "optional reason if escalation needed",
+        "confidence": 0.85
+    }}
+]
+"""
+    
+    def _parse_batch_output(self, llm_output: str) -> List[Dict]:
+        """Extract the JSON array from a batch response, or [] if it can't be parsed"""
+        start = llm_output.find('[')
+        end = llm_output.rfind(']')
+        if start == -1 or end <= start:
+            return []
+        
+        try:
+            parsed = json.loads(llm_output[start:end + 1])
+        except json.JSONDecodeError:
+            return []
+        
+        if not isinstance(parsed, list):
+            return []
+        return [entry for entry in parsed if isinstance(entry, dict)]
+    
+    def predict_stage(self, message: str, current_stage: str) -> Optional[str]:
+        """Predict the message stage locally, or None to let the LLM decide"""
+        if not self.stage_classifier:
+            return None
+        
+        stage, _ = self.stage_classifier.predict(message, current_stage)
+        return stage
+    
+    def _next_stage_after(self, stage: str) -> str:
+        """Stage the conversation moves to after replying to a message in `stage`"""
+        if stage == 'initial_contact':
+            return 'information_gathering'
+        return stage
+    
+    def _negotiation_escalation(self, message: str) -> Dict:
+        """Holding reply for negotiation messages, produced without inference"""
+        return {
+            'response': "Thank you for the details. I'd like to review this carefully "
+                        "and will respond within 24 hours.",
+            'extracted_info': self._extract_info_fallback(message),
+            'next_stage': 'negotiation',
+            'requires_escalation': True,
+            'escalation_reason': 'Negotiation detected by local stage classifier',
+            'confidence': 1.0
+        }
+    
     def _build_system_prompt(self, stage: str, channel: str) -> str:
         """Build system prompt based on stage and channel"""
         base_prompt = self.prompts.get('system_prompt', '')
-        stage_prompt = self.prompts.get('stage_prompts', {}).get(stage, '')
+        stage_prompts = self.prompts.get('stage_prompts', {})
+        # prompts.yaml names the declined stage prompt "decline"
+        stage_prompt = stage_prompts.get(stage) or stage_prompts.get({'declined': 'decline'}.get(stage, ''), '')
         
-        # Add profile information
-        profile_info = f"""
+        profile_info = self._profile_info() + f"""
+Current Stage: {stage}
+Channel: {channel} {'(keep response brief, 1-2 sentences)' if channel == 'sms' else ''}
+
+Stage-specific guidance:
+{stage_prompt}
+"""
+        
+        return base_prompt + profile_info
+    
+    def _profile_info(self) -> str:
+        """Profile summary included in every system prompt"""
+        return f"""
         
 Elena's Profile:
 - Name: {self.profile.get('personal', {}).get('name', 'Elena')}
@@ -119,17 +531,11 @@ Elena's Profile:
 - Salary Range: ${self.profile.get('preferences', {}).get('salary_range', {}).get('minimum', '')} - ${self.profile.get('preferences', {}).get('salary_range', {}).get('target', '')}
 - Work Preference: {self.profile.get('preferences', {}).get('work_arrangement', '')}
 
-Current Stage: {stage}
-Channel: {channel} {'(keep response brief, 1-2 sentences)' if channel == 'sms' else ''}
-
-Stage-specific guidance:
-{stage_prompt}
 """
-        
-        return base_prompt + profile_info
     
-    def _build_user_prompt(self, message: str, state: Dict, context: Optional[Dict]) -> str:
-        """Build user prompt with message and context"""
+    def _build_user_prompt(self, message: str, state: Dict, context: Optional[Dict],
+                           stage_known: bool = False, system_tokens: int = 0) -> str:
+        """Build user prompt with message and context, trimmed to the prompt budget"""
         
         history_summary = ""
         if state.get('conversation_history'):
@@ -148,11 +554,38 @@ Known information about this opportunity:
 - Salary: {state.get('salary_range', 'Not specified')}
 """
         
+        examples = self._build_few_shot_examples(message, state.get('thread_id'))
+        
+        # When the stage was predicted locally the LLM doesn't need to choose one
+        next_stage_field = "" if stage_known else \
+            '\n    "next_stage": "information_gathering|screening|negotiation|scheduling|declined",'
+        
+        # Trim least important sections first; known info is small and goes last
+        sections = [
+            {'name': 'examples', 'text': examples, 'priority': 0},
+            {'name': 'history_summary', 'text': history_summary, 'priority': 1},
+            {'name': 'message', 'text': message or '', 'priority': 2,
+             'min_tokens': self.min_message_tokens},
+            {'name': 'known_info', 'text': known_info, 'priority': 3},
+        ]
+        fixed_tokens = system_tokens + estimate_tokens(
+            self._render_user_prompt('', '', '', '', next_stage_field)
+        )
+        fitted = self.prompt_budget.fit(sections, fixed_tokens=fixed_tokens)
+        
+        if any(fitted[section['name']] != section['text'] for section in sections):
+            metrics.increment('llm.prompt_truncated')
+        
+        return self._render_user_prompt(fitted['known_info'], fitted['history_summary'],
+                                        fitted['examples'], fitted['message'], next_stage_field)
+    
+    def _render_user_prompt(self, known_info: str, history_summary: str, examples: str,
+                            message: str, next_stage_field: str) -> str:
         prompt = f"""
 {known_info}
 
 {history_summary}
-
+{examples}
 New message from recruiter:
 {message}
 
@@ -174,8 +607,7 @@ Respond in this JSON format:
         "salary_range": "...",
         "work_arrangement": "...",
         "tech_stack": ["..."]
-    }},
-    "next_stage": "information_gathering|screening|negotiation|scheduling|declined",
+    }},{next_stage_field}
     "requires_escalation": false,
     "escalation_reason": "optional reason if escalation needed",
     "confidence": 0.85
@@ -184,33 +616,53 @@ Respond in this JSON format:
         
         return prompt
     
-    def _call_llm(self, system_prompt: str, user_prompt: str) -> str:
+    def _build_few_shot_examples(self, message: str, thread_id: Optional[str]) -> str:
+        """Similar past exchanges, formatted compactly for the prompt"""
+        if not self.reply_index or self.few_shot_examples <= 0:
+            return ""
+        
+        matches = self.reply_index.search(message, k=self.few_shot_examples, exclude_thread=thread_id)
+        if not matches:
+            return ""
+        
+        return "\nExamples of Elena's past replies to similar messages:\n" + "\n".join(
+            f"Recruiter: {' '.join(match['prompt'].split())[:300]}\n"
+            f"Reply: {' '.join(match['reply'].split())[:400]}\n"
+            for match in matches
+        )
+    
+    def _call_llm(self, system_prompt: str, user_prompt: str, max_tokens: Optional[int] = None) -> str:
         """Call the configured LLM provider"""
         
+        metrics.increment('llm.requests')
+        metrics.observe('llm.prompt_tokens', estimate_tokens(system_prompt) + estimate_tokens(user_prompt))
+        
         if self.provider == "ollama":
-            return self._call_ollama(system_prompt, user_prompt)
+            return self._call_ollama(system_prompt, user_prompt, max_tokens)
         elif self.provider == "openai":
-            return self._call_openai(system_prompt, user_prompt)
+            return self._call_openai(system_prompt, user_prompt, max_tokens)
         elif self.provider == "anthropic":
-            return self._call_anthropic(system_prompt, user_prompt)
+            return self._call_anthropic(system_prompt, user_prompt, max_tokens)
         else:
             raise ValueError(f"Unknown provider: {self.provider}")
     
-    def _call_ollama(self, system_prompt: str, user_prompt: str) -> str:
+    def _call_ollama(self, system_prompt: str, user_prompt: str, max_tokens: Optional[int] = None) -> str:
         """Call local Ollama model"""
         try:
+            options = {'num_predict': max_tokens} if max_tokens else None
             response = ollama.chat(
                 model=self.model,
                 messages=[
                     {'role': 'system', 'content': system_prompt},
                     {'role': 'user', 'content': user_prompt}
-                ]
+                ],
+                options=options
             )
             return response['message']['content']
         except Exception as e:
             raise RuntimeError(f"Ollama error: {e}. Make sure Ollama is running: ollama serve")
     
-    def _call_openai(self, system_prompt: str, user_prompt: str) -> str:
+    def _call_openai(self, system_prompt: str, user_prompt: str, max_tokens: Optional[int] = None) -> str:
         """Call OpenAI API"""
         try:
             response = openai.chat.completions.create(
@@ -220,18 +672,18 @@ Respond in this JSON format:
                     {'role': 'user', 'content': user_prompt}
                 ],
                 temperature=0.7,
-                max_tokens=500
+                max_tokens=max_tokens or 500
             )
             return response.choices[0].message.content
         except Exception as e:
             raise RuntimeError(f"OpenAI error: {e}")
     
-    def _call_anthropic(self, system_prompt: str, user_prompt: str) -> str:
+    def _call_anthropic(self, system_prompt: str, user_prompt: str, max_tokens: Optional[int] = None) -> str:
         """Call Anthropic Claude API"""
         try:
             response = self.anthropic_client.messages.create(
                 model=self.model if self.model else "claude-3-sonnet-20240229",
-                max_tokens=500,
+                max_tokens=max_tokens or 500,
                 system=system_prompt,
                 messages=[
                     {'role': 'user', 'content': user_prompt}
@@ -245,33 +697,41 @@ Respond in this JSON format:
         """Parse LLM output and structure the result"""
         
         # Try to parse as JSON first
-        try:
-            # Extract JSON from potential markdown code blocks
-            if "```json" in llm_output:
-                json_str = llm_output.split("```json")[1].split("```")[0].strip()
-            elif "```" in llm_output:
-                json_str = llm_output.split("```")[1].split("```")[0].strip()
-            else:
-                json_str = llm_output
-            
-            result = json.loads(json_str)
-            
+        result = self._extract_json(llm_output)
+        
+        if result is not None:
             # Validate required fields
             if 'response' not in result:
                 result['response'] = llm_output
             
             return result
-            
+        
+        # If parsing fails, treat entire output as response
+        return {
+            'response': llm_output,
+            'extracted_info': self._extract_info_fallback(original_message),
+            'next_stage': current_stage,
+            'requires_escalation': self._check_escalation_keywords(original_message),
+            'escalation_reason': None,
+            'confidence': 0.5
+        }
+    
+    def _extract_json(self, llm_output: str) -> Optional[Dict]:
+        """Parse the JSON object from LLM output, or None if it isn't valid JSON"""
+        # Extract JSON from potential markdown code blocks
+        if "```json" in llm_output:
+            json_str = llm_output.split("```json")[1].split("```")[0].strip()
+        elif "```" in llm_output:
+            json_str = llm_output.split("```")[1].split("```")[0].strip()
+        else:
+            json_str = llm_output
+        
+        try:
+            result = json.loads(json_str)
         except json.JSONDecodeError:
-            # If parsing fails, treat entire output as response
-            return {
-                'response': llm_output,
-                'extracted_info': self._extract_info_fallback(original_message),
-                'next_stage': current_stage,
-                'requires_escalation': self._check_escalation_keywords(original_message),
-                'escalation_reason': None,
-                'confidence': 0.5
-            }
+            return None
+        
+        return result if isinstance(result, dict) else None
     
     def _extract_info_fallback(self, message: str) -> Dict:
         """Fallback method to extract basic info from message"""
@@ -3,14 +3,39 @@ Central Orchestrator - Coordinates all agents and manages conversation flow
 """
 
 import os
-from typing import Dict, List, Optional
+import time
+import threading
+from typing import Dict, Iterable, List, Optional
 from datetime import datetime
+from email.utils import parsedate_to_datetime
 from dotenv import load_dotenv
 
 from core.state_manager import StateManager, ConversationState
 from core.llm_processor import LLMProcessor
+from core.outbox import OutboxSender
+from core.pipeline import Pipeline, Stage, format_stats
+from core.scheduler import StagedScheduler
+from core.reply_index import ReplyIndex
+from agents.attachment_extractor import AttachmentExtractor
 from agents.email_agent import EmailAgent
+from agents.imap_agent import ImapAgent
+from agents.message_cache import MessageCache
+from agents.rate_limiter import GmailRateLimiter
 from agents.sms_agent import SMSAgent
+from utils.metrics import metrics
+
+
+def oldest_first(messages: Iterable[Dict]) -> List[Dict]:
+    """Messages sorted by arrival (received_at, else the Date header), oldest first"""
+    def arrival(message: Dict) -> float:
+        if message.get('received_at') is not None:
+            return message['received_at']
+        try:
+            return parsedate_to_datetime(message.get('date', '')).timestamp()
+        except (TypeError, ValueError):
+            return 0.0
+    
+    return sorted(messages, key=arrival)
 
 
 class JobApplicationOrchestrator:
@@ -25,33 +50,157 @@ class JobApplicationOrchestrator:
     - Escalate when necessary
     """
     
-    def __init__(self, config: Optional[Dict] = None):
+    def __init__(self, config: Optional[Dict] = None,
+                 state_manager: Optional[StateManager] = None,
+                 llm_processor: Optional[LLMProcessor] = None,
+                 email_agent: Optional[EmailAgent] = None,
+                 sms_agent: Optional[SMSAgent] = None):
+        """
+        Components are built from the environment unless passed in (e.g. an
+        EmailAgent on a FakeGmailService for load testing).
+        """
         load_dotenv()
         
         self.config = config or self._load_config()
         
         # Initialize components
-        self.state_manager = StateManager(
-            db_path=os.getenv('DATABASE_PATH', 'data/conversations.db')
+        self.state_manager = state_manager or StateManager(
+            db_path=os.getenv('DATABASE_PATH', 'data/conversations.db'),
+            busy_timeout=float(os.getenv('DATABASE_BUSY_TIMEOUT_SECONDS', '30'))
         )
         
-        self.llm_processor = LLMProcessor(
+        self.llm_processor = llm_processor or LLMProcessor(
             provider=os.getenv('LLM_PROVIDER', 'ollama'),
             model=os.getenv('OLLAMA_MODEL', 'llama2')
         )
         
-        self.email_agent = EmailAgent(
-            credentials_path=os.getenv('GMAIL_CREDENTIALS_PATH', 'credentials/gmail_credentials.json'),
-            token_path=os.getenv('GMAIL_TOKEN_PATH', 'credentials/gmail_token.json')
-        )
+        if self.llm_processor.few_shot_examples > 0 and self.llm_processor.reply_index is None:
+            self.llm_processor.reply_index = ReplyIndex(self.state_manager)
+        
+        self.email_agent = email_agent or self._create_email_agent()
         
-        self.sms_agent = SMSAgent(
+        self.sms_agent = sms_agent or SMSAgent(
             email_agent=self.email_agent,
             default_gateway=os.getenv('SMS_EMAIL_GATEWAY', '@txt.att.net')
         )
         
         self.auto_reply_enabled = os.getenv('AUTO_REPLY_ENABLED', 'true').lower() == 'true'
         self.require_approval = os.getenv('REQUIRE_APPROVAL', 'false').lower() == 'true'
+        
+        # Pack LLM requests together when draining a backlog
+        self.llm_batch_mode = os.getenv('LLM_BATCH_MODE', 'false').lower() == 'true'
+        self.llm_batch_min_backlog = int(os.getenv('LLM_BATCH_MIN_BACKLOG', '4'))
+        
+        # Best-of-N candidate generation for unattended auto-replies
+        self.best_of_n = int(os.getenv('BEST_OF_N', '1'))
+        self.best_of_n_budget = float(os.getenv('BEST_OF_N_BUDGET_SECONDS', '30'))
+        
+        # Unread mail is streamed page by page; 0 means no per-cycle cap
+        self.email_page_size = int(os.getenv('GMAIL_PAGE_SIZE', '100'))
+        self.email_max_per_cycle = int(os.getenv('EMAIL_MAX_PER_CYCLE', '0'))
+        self.email_prefetch = os.getenv('GMAIL_PREFETCH_PAGES', 'true').lower() == 'true'
+        
+        # Each fetched message goes to exactly one of these, keyed by _route_message()
+        self.channel_handlers = {
+            'email': self._handle_email,
+            'sms': self._process_sms_message,
+        }
+        self._email_batch: List[Dict] = []
+        self._cycle_errors = 0
+        
+        # Staged processing (classify -> converse -> ack). The converse stage
+        # runs state, generate and dispatch, each step with its own workers;
+        # messages in one thread go through all three strictly in order while
+        # different threads overlap (one generating while another dispatches)
+        self.pipeline_enabled = os.getenv('PIPELINE_ENABLED', 'true').lower() == 'true'
+        self.pipeline_step_workers = {
+            'state': int(os.getenv('PIPELINE_STATE_WORKERS', '2')),
+            'generate': int(os.getenv('PIPELINE_GENERATE_WORKERS', '4')),
+            'dispatch': int(os.getenv('PIPELINE_DISPATCH_WORKERS', '2')),
+        }
+        self.pipeline_queue_size = int(os.getenv('PIPELINE_QUEUE_SIZE', '16'))
+        self._step_stats: Dict[str, Dict] = {}
+        self._step_stats_lock = threading.Lock()
+        self.channel_stages = {
+            'email': {
+                'state': self._ingest_email,
+                'generate': self._generate_email_response,
+                'dispatch': self._complete_email,
+            },
+            'sms': {
+                'state': self._ingest_sms,
+                'generate': self._generate_sms_response,
+                'dispatch': self._complete_sms,
+            },
+        }
+        
+        # Replies are queued durably and sent outside the processing loop
+        self.outbox = OutboxSender(
+            state_manager=self.state_manager,
+            handlers={'email': self._deliver_email, 'sms': self._deliver_sms},
+            batch_handlers={'email': self._deliver_email_batch},
+            batch_size=int(os.getenv('OUTBOX_BATCH_SIZE', '20')),
+            max_attempts=int(os.getenv('OUTBOX_MAX_ATTEMPTS', '5')),
+            base_backoff=float(os.getenv('OUTBOX_RETRY_BASE_SECONDS', '30'))
+        )
+    
+    def _create_email_agent(self):
+        """Mail backend (MAIL_BACKEND=gmail or imap) configured from the environment"""
+        message_cache = None
+        if os.getenv('MESSAGE_CACHE_ENABLED', 'true').lower() == 'true':
+            message_cache = MessageCache(
+                db_path=os.getenv('MESSAGE_CACHE_PATH', 'data/message_cache.db'),
+                max_bytes=int(float(os.getenv('MESSAGE_CACHE_MAX_MB', '50')) * 1024 * 1024)
+            )
+        
+        # How much of each message body reaches the LLM
+        body_options = {
+            'body_max_bytes': int(os.getenv('EMAIL_BODY_MAX_BYTES', '20000')),
+            'strip_quoted_replies': os.getenv('EMAIL_STRIP_QUOTED_REPLIES', 'true').lower() == 'true'
+        }
+        
+        # Job descriptions sent as PDF/DOCX attachments (read only when the body is thin)
+        if os.getenv('ATTACHMENT_EXTRACTION_ENABLED', 'false').lower() == 'true':
+            body_options['attachment_extractor'] = AttachmentExtractor(
+                cache_path=os.getenv('ATTACHMENT_CACHE_PATH', 'data/attachment_cache.db'),
+                workers=int(os.getenv('ATTACHMENT_WORKERS', '2')),
+                max_file_bytes=int(float(os.getenv('ATTACHMENT_MAX_MB', '5')) * 1024 * 1024),
+                timeout=float(os.getenv('ATTACHMENT_TIMEOUT_SECONDS', '20'))
+            )
+            body_options['attachment_min_body_chars'] = int(os.getenv('ATTACHMENT_MIN_BODY_CHARS', '200'))
+        
+        if os.getenv('MAIL_BACKEND', 'gmail').lower() == 'imap':
+            return ImapAgent(
+                host=os.getenv('IMAP_HOST', 'imap.gmail.com'),
+                port=int(os.getenv('IMAP_PORT', '993')),
+                use_ssl=os.getenv('IMAP_SSL', 'true').lower() == 'true',
+                username=os.getenv('IMAP_USERNAME', ''),
+                password=os.getenv('IMAP_PASSWORD', ''),
+                mailbox=os.getenv('IMAP_MAILBOX', 'INBOX'),
+                smtp_host=os.getenv('SMTP_HOST'),
+                smtp_port=int(os.getenv('SMTP_PORT', '587')),
+                smtp_ssl=os.getenv('SMTP_SSL', 'false').lower() == 'true',
+                from_address=os.getenv('EMAIL_FROM_ADDRESS'),
+                state_manager=self.state_manager,
+                incremental_sync=os.getenv('IMAP_INCREMENTAL_SYNC', 'true').lower() == 'true',
+                recruiter_model_path=os.getenv('RECRUITER_MODEL_PATH', 'data/recruiter_model.json'),
+                message_cache=message_cache,
+                **body_options
+            )
+        
+        return EmailAgent(
+            credentials_path=os.getenv('GMAIL_CREDENTIALS_PATH', 'credentials/gmail_credentials.json'),
+            token_path=os.getenv('GMAIL_TOKEN_PATH', 'credentials/gmail_token.json'),
+            state_manager=self.state_manager,
+            incremental_sync=os.getenv('GMAIL_INCREMENTAL_SYNC', 'false').lower() == 'true',
+            recruiter_model_path=os.getenv('RECRUITER_MODEL_PATH', 'data/recruiter_model.json'),
+            message_cache=message_cache,
+            rate_limiter=GmailRateLimiter(
+                units_per_second=float(os.getenv('GMAIL_QUOTA_UNITS_PER_SECOND', '250')),
+                max_concurrency=int(os.getenv('GMAIL_MAX_CONCURRENCY', '10'))
+            ),
+            **body_options
+        )
     
     def _load_config(self) -> Dict:
         """Load configuration from environment"""
@@ -65,226 +214,487 @@ class JobApplicationOrchestrator:
         """
         Check all channels for new messages and process them
         
+        Unread mail is fetched once per cycle and each message is routed to
+        exactly one channel handler (SMS gateway mail or regular email).
+        
         Returns:
             Number of messages processed
         """
+        print("Checking for new messages...")
         processed_count = 0
         
-        # Process emails
-        processed_count += self._process_emails()
+        self._email_batch = []
+        self._cycle_errors = 0
         
-        # Process SMS (check for SMS emails)
-        processed_count += self._process_sms()
+        try:
+            # Mailboxes list newest first; each conversation must be answered in
+            # arrival order, so the whole cycle is fetched and sorted before any of it runs
+            messages = oldest_first(self.email_agent.iter_unread_recruiter_emails(
+                page_size=self.email_page_size,
+                max_messages=self.email_max_per_cycle or None,
+                prefetch=self.email_prefetch
+            ))
+            
+            # Batched generation needs whole groups of emails, so it runs sequentially
+            if self.pipeline_enabled and not self.llm_batch_mode:
+                self._step_stats = {}
+                start = time.perf_counter()
+                with StagedScheduler(self.pipeline_step_workers,
+                                     max_in_flight=self.pipeline_queue_size,
+                                     name='conversations') as scheduler:
+                    stats = self._build_pipeline(scheduler).run(messages)
+                print("Pipeline stages:\n" + format_stats(self._with_step_stats(stats, time.perf_counter() - start)))
+                processed_count = stats['ack']['processed']
+                self._cycle_errors += sum(stage['errors'] for stage in stats.values())
+            else:
+                for message in messages:
+                    processed_count += self.channel_handlers[self._route_message(message)](message)
+                
+                processed_count += self._flush_email_batch()
+        finally:
+            # Apply this cycle's label and read-state changes in one go
+            self.email_agent.flush_modifications()
+            
+            # Without a background sender, send this cycle's replies now
+            if self.outbox.running:
+                self.outbox.notify()
+            else:
+                self.outbox.send_pending()
+        
+        # Incremental sync only moves past this cycle's mail once all of it was handled
+        if self._cycle_errors:
+            print(f"{self._cycle_errors} message(s) failed - they will be fetched again next cycle")
+        else:
+            self.email_agent.commit_sync_checkpoint()
         
         return processed_count
     
-    def _process_emails(self) -> int:
-        """Process new recruiter emails"""
-        print("Checking for new emails...")
+    def start_background_sending(self, interval: float = None):
+        """Send queued replies from a background thread (daemon modes)"""
+        self.outbox.start(interval or float(os.getenv('OUTBOX_SEND_INTERVAL_SECONDS', '5')))
+    
+    def _build_pipeline(self, scheduler: StagedScheduler) -> Pipeline:
+        """Processing pipeline for one cycle; work items are dicts passed stage to stage"""
+        return Pipeline([
+            Stage('classify', self._stage_classify, queue_size=self.pipeline_queue_size),
+            Stage('converse', lambda item: self._stage_converse(item, scheduler),
+                  queue_size=self.pipeline_queue_size),
+            Stage('ack', self._stage_ack, queue_size=self.pipeline_queue_size),
+        ])
+    
+    def _stage_classify(self, message: Dict) -> Optional[Dict]:
+        channel = self._route_message(message)
+        if channel == 'sms' and self._is_sms_unsubscribe(message):
+            return None
+        return {'message': message, 'channel': channel}
+    
+    def _stage_converse(self, item: Dict, scheduler: StagedScheduler) -> Dict:
+        """Queue state, generate and dispatch behind the conversation's earlier messages (blocks while backed up)"""
+        stages = self.channel_stages[item['channel']]
+        message = item['message']
+        item['result'] = scheduler.submit(self._conversation_key(message, item['channel']), {
+            'state': lambda: self._run_step('state', stages['state'], message),
+            'generate': lambda state: (state, self._run_step('generate', stages['generate'], message, state)),
+            'dispatch': lambda step: self._run_step('dispatch', stages['dispatch'], message, *step),
+        })
+        return item
+    
+    def _converse(self, item: Dict) -> bool:
+        """State, generate and dispatch for one message; True if it can be marked read"""
+        stages = self.channel_stages[item['channel']]
+        message = item['message']
         
-        emails = self.email_agent.get_unread_recruiter_emails()
-        processed = 0
+        state = self._run_step('state', stages['state'], message)
+        response_data = self._run_step('generate', stages['generate'], message, state)
+        return self._run_step('dispatch', stages['dispatch'], message, state, response_data)
+    
+    def _run_step(self, name: str, func, *args):
+        """Run one converse step, recording it under pipeline.<step>.* like a pipeline stage"""
+        started = time.perf_counter()
+        error = True
+        try:
+            result = func(*args)
+            error = False
+            return result
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.observe(f'pipeline.{name}.seconds', elapsed)
+            metrics.increment(f'pipeline.{name}.errors' if error else f'pipeline.{name}.items')
+            with self._step_stats_lock:
+                step = self._step_stats.setdefault(
+                    name, {'processed': 0, 'errors': 0, 'dropped': 0, 'busy_seconds': 0.0}
+                )
+                step['busy_seconds'] += elapsed
+                step['errors' if error else 'processed'] += 1
+    
+    def _with_step_stats(self, stats: Dict[str, Dict], elapsed: float) -> Dict[str, Dict]:
+        """Pipeline stats with the state/generate/dispatch breakdown after 'converse'"""
+        combined = {}
+        for name, stage in stats.items():
+            combined[name] = stage
+            if name != 'converse':
+                continue
+            for step in ('state', 'generate', 'dispatch'):
+                if step in self._step_stats:
+                    step_stats = dict(self._step_stats[step])
+                    step_stats['items_per_second'] = step_stats['processed'] / elapsed if elapsed else 0.0
+                    combined[f'  {step}'] = step_stats
+        return combined
+    
+    def _stage_ack(self, item: Dict) -> Optional[Dict]:
+        try:
+            acknowledge = item['result'].result()
+        except Exception as e:
+            print(f"Error processing {item['channel']} message: {e}")
+            import traceback
+            traceback.print_exception(e)
+            self._cycle_errors += 1
+            return None
         
-        for email in emails:
-            email_id = email.get('id')
-            thread_id = email.get('thread_id')
+        if acknowledge:
+            self.email_agent.queue_mark_as_read(item['message'].get('id'))
+        return item
+    
+    def _conversation_key(self, message: Dict, channel: str) -> str:
+        """Conversation a message belongs to (the StateManager thread ID)"""
+        if channel == 'sms':
+            return f"sms_{self.sms_agent.parse_incoming_sms(message)['phone_number']}"
+        return message.get('thread_id')
+    
+    def _route_message(self, message: Dict) -> str:
+        """Channel whose handler should process a fetched message"""
+        if self.sms_agent.parse_incoming_sms(message):
+            return 'sms'
+        return 'email'
+    
+    def _handle_email(self, email: Dict) -> int:
+        """Email channel handler; with LLM batch mode, emails are collected into batches"""
+        if not self.llm_batch_mode:
+            return self._process_single_email(email)
+        
+        self._email_batch.append(email)
+        if len(self._email_batch) >= self.llm_processor.batch_max_size:
+            return self._flush_email_batch()
+        return 0
+    
+    def _flush_email_batch(self) -> int:
+        """Process collected emails, falling back to single replies for small groups"""
+        chunk, self._email_batch = self._email_batch, []
+        if len(chunk) >= self.llm_batch_min_backlog:
+            return self._process_email_backlog(chunk)
+        return sum(self._process_single_email(email) for email in chunk)
+    
+    def _process_single_email(self, email: Dict) -> int:
+        """Process one email; returns 1 on success, 0 on error"""
+        try:
+            state = self._ingest_email(email)
             
+            response_data = self._generate_email_response(email, state)
+            
+            if self._complete_email(email, state, response_data):
+                self.email_agent.queue_mark_as_read(email.get('id'))
+            return 1
+            
+        except Exception as e:
+            print(f"Error processing email: {e}")
+            import traceback
+            traceback.print_exc()
+            self._cycle_errors += 1
+            return 0
+    
+    def _process_email_backlog(self, emails: List[Dict]) -> int:
+        """Process a large batch of emails, packing LLM requests together"""
+        print(f"Backlog of {len(emails)} emails - using batched generation")
+        
+        ingested = []
+        for email in emails:
             try:
-                print(f"\nProcessing email from {email.get('from_name')}: {email.get('subject')}")
-                
-                # Label email immediately so we know ARIA analyzed it
-                self.email_agent.add_label(email_id, 'AI-Recruiter/Processed')
-                
-                # Get or create conversation state
-                state = self.state_manager.get_state(thread_id)
-                
-                if not state:
-                    # New conversation
-                    state = self.state_manager.create_conversation(
-                        thread_id=thread_id,
-                        channel='email',
-                        initial_message={
-                            'timestamp': datetime.now(),
-                            'channel': 'email',
-                            'direction': 'incoming',
-                            'content': email.get('body'),
-                            'metadata': {
-                                'from': email.get('from'),
-                                'from_name': email.get('from_name'),
-                                'subject': email.get('subject')
-                            }
-                        }
-                    )
-                else:
-                    # Existing conversation - add message
-                    self.state_manager.add_message(thread_id, {
-                        'timestamp': datetime.now(),
-                        'channel': 'email',
-                        'direction': 'incoming',
-                        'content': email.get('body'),
-                        'metadata': email
-                    })
-                
-                # Generate response
-                response_data = self.llm_processor.generate_response(
-                    message=email.get('body'),
-                    channel='email',
-                    conversation_state=state.__dict__ if hasattr(state, '__dict__') else {},
-                    context={'email_metadata': email}
-                )
-                
-                # Update state with extracted information
-                updates = {
-                    'stage': response_data.get('next_stage', state.stage)
-                }
-                
-                extracted_info = response_data.get('extracted_info', {})
-                if extracted_info.get('company'):
-                    updates['company'] = extracted_info['company']
-                if extracted_info.get('position'):
-                    updates['position'] = extracted_info['position']
-                if extracted_info.get('recruiter_name'):
-                    updates['recruiter_name'] = extracted_info['recruiter_name']
-                if extracted_info.get('salary_range'):
-                    updates['salary_range'] = extracted_info['salary_range']
-                if extracted_info.get('work_arrangement'):
-                    updates['work_arrangement'] = extracted_info['work_arrangement']
-                
-                self.state_manager.update_state(thread_id, updates)
-                
-                # Check if escalation needed
-                if response_data.get('requires_escalation'):
-                    self.state_manager.mark_for_escalation(
-                        thread_id,
-                        response_data.get('escalation_reason', 'Unknown reason')
-                    )
-                    self._notify_escalation(thread_id, response_data)
-                    processed += 1
-                    continue
-                
-                # Send response if auto-reply enabled
-                if self.auto_reply_enabled:
-                    if self.require_approval:
-                        self._request_approval(thread_id, response_data, email)
-                    else:
-                        self._send_email_response(thread_id, response_data, email)
-                
-                # Mark email as processed
-                self.email_agent.mark_as_read(email.get('id'))
-                self.email_agent.add_label(email.get('id'), 'AI-Recruiter/Processed')
-                
+                ingested.append((email, self._ingest_email(email)))
+            except Exception as e:
+                print(f"Error processing email: {e}")
+                self._cycle_errors += 1
+        
+        try:
+            responses = self.llm_processor.generate_responses_batch(
+                [self._email_generation_args(email, state) for email, state in ingested]
+            )
+        except Exception as e:
+            print(f"Error generating batched responses, replying one by one: {e}")
+            responses = [None] * len(ingested)
+        
+        processed = 0
+        for (email, state), response_data in zip(ingested, responses):
+            try:
+                # Already ingested, so only generation is retried for failed items
+                if response_data is None:
+                    response_data = self._generate_email_response(email, state)
+                if self._complete_email(email, state, response_data):
+                    self.email_agent.queue_mark_as_read(email.get('id'))
                 processed += 1
-                
             except Exception as e:
                 print(f"Error processing email: {e}")
                 import traceback
                 traceback.print_exc()
+                self._cycle_errors += 1
         
         return processed
     
-    def _process_sms(self) -> int:
-        """Process SMS messages (received as emails)"""
-        print("Checking for SMS messages...")
+    def _ingest_email(self, email: Dict) -> ConversationState:
+        """Label an email and record it in conversation state"""
+        email_id = email.get('id')
+        thread_id = email.get('thread_id')
         
-        # Get emails that might be SMS
-        all_emails = self.email_agent.get_unread_recruiter_emails(max_results=20)
+        print(f"\nProcessing email from {email.get('from_name')}: {email.get('subject')}")
         
-        processed = 0
-        for email in all_emails:
-            sms_data = self.sms_agent.parse_incoming_sms(email)
+        # Label email so we know ARIA analyzed it (applied at the end of the cycle)
+        self.email_agent.queue_label(email_id, 'AI-Recruiter/Processed')
+        
+        # Get or create conversation state
+        state = self.state_manager.get_state(thread_id)
+        
+        if not state:
+            # New conversation
+            state = self.state_manager.create_conversation(
+                thread_id=thread_id,
+                channel='email',
+                initial_message={
+                    'timestamp': datetime.now(),
+                    'channel': 'email',
+                    'direction': 'incoming',
+                    'content': email.get('body'),
+                    'metadata': {
+                        'from': email.get('from'),
+                        'from_name': email.get('from_name'),
+                        'subject': email.get('subject')
+                    }
+                }
+            )
+        else:
+            # Existing conversation - add message
+            self.state_manager.add_message(thread_id, {
+                'timestamp': datetime.now(),
+                'channel': 'email',
+                'direction': 'incoming',
+                'content': email.get('body'),
+                'metadata': email
+            })
+        
+        return state
+    
+    def _email_generation_args(self, email: Dict, state: ConversationState) -> Dict:
+        """Arguments for LLMProcessor.generate_response for an email"""
+        return {
+            'message': email.get('body'),
+            'channel': 'email',
+            'conversation_state': state.__dict__ if hasattr(state, '__dict__') else {},
+            'context': {'email_metadata': email}
+        }
+    
+    def _generate_email_response(self, email: Dict, state: ConversationState) -> Dict:
+        """Generate a reply, picking the best of N candidates when replies go out unreviewed"""
+        args = self._email_generation_args(email, state)
+        
+        if self.best_of_n > 1 and self.auto_reply_enabled and not self.require_approval:
+            return self.llm_processor.generate_best_of_n(
+                **args,
+                n=self.best_of_n,
+                budget_seconds=self.best_of_n_budget
+            )
+        
+        return self.llm_processor.generate_response(**args)
+    
+    def _complete_email(self, email: Dict, state: ConversationState, response_data: Dict) -> bool:
+        """
+        Apply a generated response: update state, then escalate or reply
+        
+        Returns:
+            True if the email is done and can be marked read (escalations stay unread)
+        """
+        thread_id = email.get('thread_id')
+        
+        # Update state with extracted information
+        updates = {
+            'stage': response_data.get('next_stage', state.stage)
+        }
+        
+        extracted_info = response_data.get('extracted_info', {})
+        if extracted_info.get('company'):
+            updates['company'] = extracted_info['company']
+        if extracted_info.get('position'):
+            updates['position'] = extracted_info['position']
+        if extracted_info.get('recruiter_name'):
+            updates['recruiter_name'] = extracted_info['recruiter_name']
+        if extracted_info.get('salary_range'):
+            updates['salary_range'] = extracted_info['salary_range']
+        if extracted_info.get('work_arrangement'):
+            updates['work_arrangement'] = extracted_info['work_arrangement']
+        
+        self.state_manager.update_state(thread_id, updates)
+        
+        # Check if escalation needed
+        if response_data.get('requires_escalation'):
+            self.state_manager.mark_for_escalation(
+                thread_id,
+                response_data.get('escalation_reason', 'Unknown reason')
+            )
+            self._notify_escalation(thread_id, response_data)
+            return False
+        
+        # Send response if auto-reply enabled
+        if self.auto_reply_enabled:
+            if self.require_approval:
+                self._request_approval(thread_id, response_data, email)
+            else:
+                self._send_email_response(thread_id, response_data, email)
+        
+        return True
+    
+    def _process_sms_message(self, email: Dict) -> int:
+        """SMS channel handler: an SMS received through an email gateway"""
+        try:
+            if self._is_sms_unsubscribe(email):
+                return 0
             
-            if not sms_data:
-                continue
+            state = self._ingest_sms(email)
+            response_data = self._generate_sms_response(email, state)
+            self._complete_sms(email, state, response_data)
             
-            try:
-                print(f"\nProcessing SMS from {sms_data['phone_number']}")
-                
-                # Check for special keywords
-                special_action = self.sms_agent.handle_special_keywords(sms_data['message'])
-                
-                if special_action == 'unsubscribe':
-                    print("STOP keyword detected - marking conversation as declined")
-                    # Handle unsubscribe
-                    continue
-                
-                # Use phone number as thread_id for SMS
-                thread_id = f"sms_{sms_data['phone_number']}"
-                state = self.state_manager.get_state(thread_id)
-                
-                if not state:
-                    state = self.state_manager.create_conversation(
-                        thread_id=thread_id,
-                        channel='sms',
-                        initial_message={
-                            'timestamp': datetime.now(),
-                            'channel': 'sms',
-                            'direction': 'incoming',
-                            'content': sms_data['message'],
-                            'metadata': {'phone': sms_data['phone_number']}
-                        }
-                    )
-                else:
-                    self.state_manager.add_message(thread_id, {
-                        'timestamp': datetime.now(),
-                        'channel': 'sms',
-                        'direction': 'incoming',
-                        'content': sms_data['message'],
-                        'metadata': sms_data
-                    })
-                
-                # Generate response
-                response_data = self.llm_processor.generate_response(
-                    message=sms_data['message'],
-                    channel='sms',
-                    conversation_state=state.__dict__ if hasattr(state, '__dict__') else {},
-                    context={'sms_data': sms_data}
-                )
-                
-                # Send SMS response if enabled
-                if self.auto_reply_enabled and not response_data.get('requires_escalation'):
-                    success = self.sms_agent.reply_to_sms(email, response_data['response'])
-                    
-                    if success:
-                        self.state_manager.add_message(thread_id, {
-                            'timestamp': datetime.now(),
-                            'channel': 'sms',
-                            'direction': 'outgoing',
-                            'content': response_data['response']
-                        })
-                
-                self.email_agent.mark_as_read(email.get('id'))
-                processed += 1
-                
-            except Exception as e:
-                print(f"Error processing SMS: {e}")
+            self.email_agent.queue_mark_as_read(email.get('id'))
+            return 1
+            
+        except Exception as e:
+            print(f"Error processing SMS: {e}")
+            self._cycle_errors += 1
+            return 0
+    
+    def _is_sms_unsubscribe(self, email: Dict) -> bool:
+        """True for a STOP text, which gets no reply"""
+        sms_data = self.sms_agent.parse_incoming_sms(email)
         
-        return processed
+        # Check for special keywords
+        special_action = self.sms_agent.handle_special_keywords(sms_data['message'])
+        
+        if special_action == 'unsubscribe':
+            print("STOP keyword detected - marking conversation as declined")
+            # Handle unsubscribe
+            return True
+        return False
+    
+    def _ingest_sms(self, email: Dict) -> ConversationState:
+        """Record an incoming SMS in conversation state"""
+        sms_data = self.sms_agent.parse_incoming_sms(email)
+        print(f"\nProcessing SMS from {sms_data['phone_number']}")
+        
+        # Use phone number as thread_id for SMS
+        thread_id = f"sms_{sms_data['phone_number']}"
+        state = self.state_manager.get_state(thread_id)
+        
+        if not state:
+            state = self.state_manager.create_conversation(
+                thread_id=thread_id,
+                channel='sms',
+                initial_message={
+                    'timestamp': datetime.now(),
+                    'channel': 'sms',
+                    'direction': 'incoming',
+                    'content': sms_data['message'],
+                    'metadata': {'phone': sms_data['phone_number']}
+                }
+            )
+        else:
+            self.state_manager.add_message(thread_id, {
+                'timestamp': datetime.now(),
+                'channel': 'sms',
+                'direction': 'incoming',
+                'content': sms_data['message'],
+                'metadata': sms_data
+            })
+        
+        return state
+    
+    def _generate_sms_response(self, email: Dict, state: ConversationState) -> Dict:
+        """Generate a reply to an SMS"""
+        sms_data = self.sms_agent.parse_incoming_sms(email)
+        return self.llm_processor.generate_response(
+            message=sms_data['message'],
+            channel='sms',
+            conversation_state=state.__dict__ if hasattr(state, '__dict__') else {},
+            context={'sms_data': sms_data}
+        )
+    
+    def _complete_sms(self, email: Dict, state: ConversationState, response_data: Dict) -> bool:
+        """Queue the SMS reply if enabled; the message is always marked read"""
+        sms_data = self.sms_agent.parse_incoming_sms(email)
+        thread_id = f"sms_{sms_data['phone_number']}"
+        
+        # Send SMS response if enabled
+        if self.auto_reply_enabled and not response_data.get('requires_escalation'):
+            self.outbox.enqueue(
+                idempotency_key=f"sms:{thread_id}:{email.get('id')}",
+                thread_id=thread_id,
+                channel='sms',
+                recipient=sms_data['phone_number'],
+                body=response_data['response'],
+                metadata={'carrier': self.sms_agent.detect_carrier_from_response(email)}
+            )
+        
+        return True
     
     def _send_email_response(self, thread_id: str, response_data: Dict, original_email: Dict):
-        """Send email response"""
+        """Queue email response in the outbox"""
         try:
-            response_text = response_data.get('response', '')
-            
-            success = self.email_agent.send_reply(
+            queued = self.outbox.enqueue(
+                idempotency_key=f"email:{thread_id}:{original_email.get('id')}",
                 thread_id=thread_id,
-                to=original_email.get('from'),
+                channel='email',
+                recipient=original_email.get('from'),
                 subject=original_email.get('subject'),
-                body=response_text
+                body=response_data.get('response', ''),
+                # RFC 5322 reply headers (Message-ID is only known for IMAP mail)
+                metadata={
+                    'in_reply_to': original_email.get('message_id'),
+                    'references': original_email.get('references'),
+                }
             )
             
-            if success:
-                # Log outgoing message
-                self.state_manager.add_message(thread_id, {
-                    'timestamp': datetime.now(),
-                    'channel': 'email',
-                    'direction': 'outgoing',
-                    'content': response_text
-                })
-                
-                print(f"✓ Response sent to {original_email.get('from_name')}")
+            if queued:
+                print(f"✓ Response queued for {original_email.get('from_name')}")
+            else:
+                print(f"Response to message {original_email.get('id')} already queued - skipping")
             
         except Exception as e:
-            print(f"Error sending response: {e}")
+            print(f"Error queueing response: {e}")
+    
+    def _deliver_email(self, entry: Dict) -> bool:
+        """Outbox handler for email replies"""
+        metadata = entry.get('metadata') or {}
+        return self.email_agent.send_reply(
+            thread_id=entry['thread_id'],
+            to=entry['recipient'],
+            subject=entry['subject'],
+            body=entry['body'],
+            in_reply_to=metadata.get('in_reply_to'),
+            references=metadata.get('references')
+        )
+    
+    def _deliver_email_batch(self, entries: List[Dict]) -> List[bool]:
+        """Outbox batch handler: a claimed batch of email replies in one request"""
+        return self.email_agent.send_replies([{
+            'thread_id': entry['thread_id'],
+            'to': entry['recipient'],
+            'subject': entry['subject'],
+            'body': entry['body'],
+            'in_reply_to': (entry.get('metadata') or {}).get('in_reply_to'),
+            'references': (entry.get('metadata') or {}).get('references')
+        } for entry in entries])
+    
+    def _deliver_sms(self, entry: Dict) -> bool:
+        """Outbox handler for SMS replies"""
+        return self.sms_agent.send_sms(
+            phone_number=entry['recipient'],
+            message=entry['body'],
+            carrier=entry['metadata'].get('carrier')
+        )
     
     def _request_approval(self, thread_id: str, response_data: Dict, original_email: Dict):
         """Request human approval before sending"""
@@ -333,7 +743,9 @@ class JobApplicationOrchestrator:
             'total_conversations': len(active_conversations),
             'by_stage': {},
             'requiring_escalation': [],
-            'by_channel': {'email': 0, 'sms': 0, 'voice': 0}
+            'by_channel': {'email': 0, 'sms': 0, 'voice': 0},
+            'outbox': self.state_manager.get_outbox_counts(),
+            'work_queue': self.state_manager.get_work_counts()
         }
         
         for conv in active_conversations:
@@ -378,5 +790,15 @@ class JobApplicationOrchestrator:
             for item in status['requiring_escalation']:
                 print(f"  - {item['company']} - {item['position']}: {item['reason']}")
         
+        outbox = status['outbox']
+        if outbox.get('pending') or outbox.get('sending') or outbox.get('failed'):
+            print(f"\nOutbox: {outbox.get('pending', 0) + outbox.get('sending', 0)} waiting, "
+                  f"{outbox.get('failed', 0)} failed")
+        
+        work_queue = status['work_queue']
+        if work_queue.get('pending') or work_queue.get('leased') or work_queue.get('failed'):
+            print(f"Work queue: {work_queue.get('pending', 0) + work_queue.get('leased', 0)} waiting, "
+                  f"{work_queue.get('failed', 0)} failed")
+        
         print("="*60 + "\n")
 
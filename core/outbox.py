@@ -0,0 +1,209 @@
+"""
+Outbox sender - delivers queued replies off the processing path
+
+Replies are written to the StateManager outbox table while a message is
+processed and sent later, in batches, by OutboxSender. Channels with a batch
+handler get each claimed batch in one call (one Gmail batch request or SMTP
+session for email); the rest are sent entry by entry. Each entry carries an
+idempotency key (channel, thread and incoming message), so reprocessing a
+message never queues a second reply. Delivery is at-least-once: an entry
+leased by a sender that dies mid-send becomes due again when its lease
+expires.
+"""
+
+import time
+import random
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from core.state_manager import StateManager
+from utils.metrics import metrics
+
+
+class OutboxSender:
+    """Claims due outbox entries and hands them to per-channel send handlers"""
+
+    def __init__(self, state_manager: StateManager, handlers: Dict[str, Callable[[Dict], bool]],
+                 batch_size: int = 20, max_attempts: int = 5, base_backoff: float = 30.0,
+                 max_backoff: float = 3600.0, lease_seconds: float = 300.0,
+                 batch_handlers: Optional[Dict[str, Callable[[List[Dict]], List[bool]]]] = None):
+        """
+        Args:
+            state_manager: Holds the outbox table
+            handlers: Channel name -> callable(entry) returning True once sent
+            batch_size: Entries claimed per round
+            max_attempts: Failed sends before an entry is given up on
+            base_backoff: Delay before the first retry (doubles per attempt)
+            max_backoff: Cap on the retry delay
+            lease_seconds: How long a claimed entry is reserved for this sender
+            batch_handlers: Channel name -> callable(entries) returning one
+                success flag per entry; used instead of handlers when present
+        """
+        self.state_manager = state_manager
+        self.handlers = handlers
+        self.batch_handlers = batch_handlers or {}
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.lease_seconds = lease_seconds
+
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def enqueue(self, idempotency_key: str, thread_id: str, channel: str, recipient: str,
+                body: str, subject: Optional[str] = None, metadata: Optional[Dict] = None) -> bool:
+        """Queue a reply and wake the background sender; False if already queued"""
+        queued = self.state_manager.enqueue_outgoing(
+            idempotency_key, thread_id, channel, recipient, body,
+            subject=subject, metadata=metadata
+        )
+        if queued:
+            self._wake.set()
+        return queued
+
+    def send_pending(self) -> int:
+        """
+        Send everything currently due, one claimed batch at a time
+
+        Returns:
+            Number of entries sent
+        """
+        sent = 0
+        while True:
+            batch = self.state_manager.claim_outgoing(self.batch_size, self.lease_seconds)
+            by_channel: Dict[str, List[Dict]] = {}
+            for entry in batch:
+                by_channel.setdefault(entry['channel'], []).append(entry)
+            for channel, entries in by_channel.items():
+                if channel in self.batch_handlers:
+                    sent += self._send_batch(channel, entries)
+                else:
+                    for entry in entries:
+                        sent += self._send(entry)
+            if len(batch) < self.batch_size or self._stop.is_set():
+                break
+
+        counts = self.state_manager.get_outbox_counts()
+        metrics.gauge('outbox.pending', counts.get('pending', 0) + counts.get('sending', 0))
+        return sent
+
+    def _send(self, entry: Dict) -> int:
+        handler = self.handlers.get(entry['channel'])
+        try:
+            if handler is None:
+                raise ValueError(f"no handler for channel {entry['channel']!r}")
+            if not handler(entry):
+                raise RuntimeError("send handler reported failure")
+        except Exception as e:
+            self._record_failure(entry, str(e))
+            return 0
+
+        self._record_sent(entry)
+        return 1
+
+    def _send_batch(self, channel: str, entries: List[Dict]) -> int:
+        try:
+            results = list(self.batch_handlers[channel](entries))
+            if len(results) != len(entries):
+                raise RuntimeError(f"batch handler returned {len(results)} results for {len(entries)} entries")
+        except Exception as e:
+            for entry in entries:
+                self._record_failure(entry, str(e))
+            return 0
+
+        metrics.increment('outbox.batches')
+        for entry, ok in zip(entries, results):
+            if ok:
+                self._record_sent(entry)
+            else:
+                self._record_failure(entry, "send handler reported failure")
+        return sum(1 for ok in results if ok)
+
+    def _record_sent(self, entry: Dict):
+        self.state_manager.mark_outgoing_sent(entry['id'])
+        self.state_manager.add_message(entry['thread_id'], {
+            'timestamp': datetime.now(),
+            'channel': entry['channel'],
+            'direction': 'outgoing',
+            'content': entry['body']
+        })
+        metrics.increment('outbox.sent')
+
+    def _record_failure(self, entry: Dict, error: str):
+        attempts = entry['attempts'] + 1
+        if attempts >= self.max_attempts:
+            print(f"Giving up on outbox entry {entry['idempotency_key']} after {attempts} attempts: {error}")
+            self.state_manager.mark_outgoing_failed(entry['id'], error)
+            metrics.increment('outbox.failed')
+            return
+
+        delay = min(self.max_backoff, self.base_backoff * 2 ** (attempts - 1))
+        delay += random.uniform(0, delay / 2)
+        print(f"Send failed for {entry['idempotency_key']} (attempt {attempts}), retrying in {delay:.0f}s: {error}")
+        self.state_manager.mark_outgoing_failed(entry['id'], error, retry_at=time.time() + delay)
+        metrics.increment('outbox.retried')
+
+    def notify(self):
+        """Wake the background sender early"""
+        self._wake.set()
+
+    def start(self, interval: float = 5.0):
+        """Send in a background thread, every `interval` seconds or when notified"""
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,),
+                                        name='outbox-sender', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """Stop the background sender after its current batch"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self, interval: float):
+        while not self._stop.is_set():
+            self._wake.wait(interval)
+            self._wake.clear()
+            try:
+                self.send_pending()
+            except Exception as e:
+                print(f"Outbox sender error: {e}")
+
+
+if __name__ == "__main__":
+    # Queue replies (one of them twice) and send them through a flaky handler
+    import os
+    import tempfile
+
+    state_manager = StateManager(db_path=os.path.join(tempfile.mkdtemp(), 'outbox_demo.db'))
+    attempts = {}
+
+    def flaky_send(entry):
+        attempts[entry['id']] = attempts.get(entry['id'], 0) + 1
+        return attempts[entry['id']] > 1 or entry['id'] % 2 == 0
+
+    def flaky_send_batch(entries):
+        print(f"  one request for {len(entries)} replies")
+        return [flaky_send(entry) for entry in entries]
+
+    sender = OutboxSender(state_manager, {'email': flaky_send}, batch_size=2, base_backoff=0.05,
+                          batch_handlers={'email': flaky_send_batch})
+    for i in range(5):
+        sender.enqueue(f"email:thread{i}:msg{i}", f"thread{i}", 'email', 'recruiter@example.com', 'Thanks!')
+    print(f"Duplicate enqueue accepted: {sender.enqueue('email:thread0:msg0', 'thread0', 'email', 'x', 'y')}")
+
+    print(f"First pass sent: {sender.send_pending()}")
+    time.sleep(0.2)
+    print(f"Retry pass sent: {sender.send_pending()}")
+    print(f"Outbox: {state_manager.get_outbox_counts()}")
@@ -0,0 +1,108 @@
+"""
+BM25 index over past recruiter messages and the replies sent to them
+
+Used to pull a few similar past exchanges into the prompt as few-shot
+examples. The index is built from the StateManager messages table and
+updated incrementally as new replies are logged.
+"""
+
+import math
+import threading
+from typing import Dict, List, Optional
+
+from utils.text_classifier import tokenize
+
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'but', 'by', 'for', 'from', 'have',
+    'hi', 'i', 'if', 'in', 'is', 'it', 'me', 'my', 'of', 'on', 'or', 'our', 'so',
+    'that', 'the', 'this', 'to', 'we', 'with', 'you', 'your', 'thanks', 'regards'
+}
+
+
+class ReplyIndex:
+    """Incrementally updated BM25 inverted index of (recruiter message, reply) pairs"""
+
+    def __init__(self, state_manager, k1: float = 1.5, b: float = 0.75):
+        self.state_manager = state_manager
+        self.k1 = k1
+        self.b = b
+
+        self.documents: List[Dict] = []
+        self.postings: Dict[str, Dict[int, int]] = {}  # term -> {doc_id: term frequency}
+        self.doc_lengths: List[int] = []
+        self.total_length = 0
+
+        self._last_message_id = 0
+        self._last_incoming: Dict[str, str] = {}  # thread_id -> latest recruiter message
+        self._lock = threading.Lock()
+
+    def refresh(self) -> int:
+        """Index messages logged since the last refresh; returns new documents added"""
+        with self._lock:
+            added = 0
+            for message in self.state_manager.get_messages_since(self._last_message_id):
+                self._last_message_id = message['id']
+                thread_id = message['thread_id']
+
+                if message['direction'] == 'incoming':
+                    self._last_incoming[thread_id] = message['content']
+                elif message['direction'] == 'outgoing' and thread_id in self._last_incoming:
+                    self._add_document(thread_id, self._last_incoming[thread_id], message['content'])
+                    added += 1
+
+            return added
+
+    def _add_document(self, thread_id: str, prompt: str, reply: str):
+        doc_id = len(self.documents)
+        terms = [t for t in tokenize(f"{prompt} {reply}") if t not in STOPWORDS]
+
+        self.documents.append({'thread_id': thread_id, 'prompt': prompt, 'reply': reply})
+        self.doc_lengths.append(len(terms))
+        self.total_length += len(terms)
+
+        for term in terms:
+            postings = self.postings.setdefault(term, {})
+            postings[doc_id] = postings.get(doc_id, 0) + 1
+
+    def search(self, query: str, k: int = 3, exclude_thread: Optional[str] = None) -> List[Dict]:
+        """
+        Top-k past exchanges most similar to query
+
+        Returns:
+            List of dicts with thread_id, prompt, reply and score, best first
+        """
+        self.refresh()
+
+        with self._lock:
+            if not self.documents:
+                return []
+
+            doc_count = len(self.documents)
+            avg_length = self.total_length / doc_count or 1.0
+            scores: Dict[int, float] = {}
+
+            for term in set(t for t in tokenize(query) if t not in STOPWORDS):
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+
+                idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+            results, seen_replies = [], set()
+            for doc_id in sorted(scores, key=scores.get, reverse=True):
+                document = self.documents[doc_id]
+                if exclude_thread and document['thread_id'] == exclude_thread:
+                    continue
+                # Identical replies (e.g. templates) make redundant examples
+                if document['reply'] in seen_replies:
+                    continue
+                seen_replies.add(document['reply'])
+                results.append(dict(document, score=scores[doc_id]))
+                if len(results) >= k:
+                    break
+
+            return results
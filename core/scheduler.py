@@ -0,0 +1,245 @@
+"""
+Keyed work scheduler: serial per conversation, parallel across conversations
+
+Two messages from the same thread must not be processed at the same time:
+both would read the same ConversationState, both would reply, and one
+update would overwrite the other. ShardedScheduler hashes each task's key
+(the thread ID) onto one of N single-threaded workers, so tasks with the
+same key run strictly one after another in submission order while tasks
+with different keys run in parallel.
+
+StagedScheduler splits each task into steps (state, generate, dispatch),
+each with its own sharded workers: a key's tasks still run one at a time
+through all steps, while different keys overlap across steps.
+"""
+
+import zlib
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, List
+
+from utils.metrics import metrics
+
+
+def shard_index(key: str, shards: int) -> int:
+    """Stable shard for a key (same answer in every process, unlike hash())"""
+    return zlib.crc32(str(key).encode('utf-8')) % shards
+
+
+class ShardedScheduler:
+    """N workers, each draining its own bounded queue; a key always maps to the same worker"""
+
+    def __init__(self, workers: int = 4, queue_size: int = 64, name: str = 'scheduler'):
+        """
+        Args:
+            workers: Number of shards (worker threads)
+            queue_size: Pending tasks per shard before submit() blocks
+            name: Thread name and metrics prefix
+        """
+        self.workers = max(1, workers)
+        self.name = name
+        self._queues: List[queue.Queue] = [queue.Queue(maxsize=queue_size) for _ in range(self.workers)]
+        self._threads = []
+        self._shutdown = False
+
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._work, args=(index,), name=f'{name}-{index}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, key: str, func: Callable, *args, **kwargs) -> Future:
+        """
+        Queue func(*args, **kwargs) on the worker that owns `key`
+
+        Blocks while that worker's queue is full.
+        """
+        if self._shutdown:
+            raise RuntimeError("scheduler is shut down")
+
+        future = Future()
+        shard = self._queues[shard_index(key, self.workers)]
+        shard.put((future, func, args, kwargs))
+        metrics.gauge(f'{self.name}.queued', sum(q.qsize() for q in self._queues))
+        return future
+
+    def _work(self, index: int):
+        tasks = self._queues[index]
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+
+            future, func, args, kwargs = task
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(func(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+            metrics.increment(f'{self.name}.tasks')
+
+    def shutdown(self, wait: bool = True):
+        """Stop accepting work; queued tasks still run"""
+        if self._shutdown:
+            return
+        self._shutdown = True
+        for tasks in self._queues:
+            tasks.put(None)
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+
+
+class StagedScheduler:
+    """Keyed tasks run through a chain of steps, each step on its own ShardedScheduler"""
+
+    def __init__(self, steps: Dict[str, int], max_in_flight: int = 64, name: str = 'stages'):
+        """
+        Args:
+            steps: Step name -> worker count, in the order tasks run through them
+            max_in_flight: Unfinished tasks before submit() blocks
+            name: Thread name and metrics prefix (steps report as <name>.<step>)
+        """
+        self.steps = list(steps)
+        self.max_in_flight = max(1, max_in_flight)
+        # Steps hand tasks to each other from worker threads, so their queues
+        # must never block; max_in_flight bounds them instead
+        self._schedulers = {step: ShardedScheduler(workers, queue_size=0, name=f'{name}.{step}')
+                            for step, workers in steps.items()}
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+        self._tails: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._shutdown = False
+
+    def submit(self, key: str, funcs: Dict[str, Callable]) -> Future:
+        """
+        Queue a task: funcs[step] for every step, each given the previous step's result
+
+        The first step is called with no arguments. The task starts once the
+        previous task with the same key has finished (or failed), and stops at
+        the first step that raises. Blocks while max_in_flight tasks are unfinished.
+
+        Returns:
+            Future for the last step's result
+        """
+        if self._shutdown:
+            raise RuntimeError("scheduler is shut down")
+
+        self._slots.acquire()
+        done = Future()
+        with self._lock:
+            previous = self._tails.get(key)
+            self._tails[key] = done
+
+        def finish(future: Future):
+            with self._lock:
+                if self._tails.get(key) is done:
+                    del self._tails[key]
+            self._slots.release()
+            error = future.exception()
+            if error is not None:
+                done.set_exception(error)
+            else:
+                done.set_result(future.result())
+
+        def run(index: int, *args):
+            step = self.steps[index]
+            future = self._schedulers[step].submit(key, funcs[step], *args)
+            future.add_done_callback(lambda f: advance(index, f))
+
+        def advance(index: int, future: Future):
+            if future.exception() is not None or index + 1 == len(self.steps):
+                finish(future)
+            else:
+                run(index + 1, future.result())
+
+        if previous is None:
+            run(0)
+        else:
+            previous.add_done_callback(lambda _: run(0))
+        return done
+
+    def shutdown(self, wait: bool = True):
+        """Stop accepting work; with wait, let every submitted task finish first"""
+        if self._shutdown:
+            return
+        self._shutdown = True
+        if wait:
+            for _ in range(self.max_in_flight):
+                self._slots.acquire()
+        for scheduler in self._schedulers.values():
+            scheduler.shutdown(wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+
+
+if __name__ == "__main__":
+    # Concurrency check: 8 threads x 50 messages each, every message doing a
+    # read-modify-write of its conversation's state. Unkeyed parallelism loses
+    # updates; the sharded scheduler must not lose any.
+    import os
+    import time
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+
+    from core.state_manager import StateManager
+
+    THREADS, MESSAGES, WORKERS = 8, 50, 8
+
+    def handle_message(state_manager: StateManager, thread_id: str):
+        state = state_manager.get_state(thread_id)
+        count = state.metadata.get('handled', 0)
+        time.sleep(0.001)  # LLM call between read and write
+        state_manager.update_state(thread_id, {'metadata': dict(state.metadata, handled=count + 1)})
+
+    def run(label: str, submit):
+        state_manager = StateManager(db_path=os.path.join(tempfile.mkdtemp(), 'scheduler_demo.db'))
+        thread_ids = [f'thread-{n}' for n in range(THREADS)]
+        for thread_id in thread_ids:
+            state_manager.create_conversation(thread_id, 'email', {'content': ''})
+
+        start = time.perf_counter()
+        futures = [submit(thread_id, handle_message, state_manager, thread_id)
+                   for _ in range(MESSAGES) for thread_id in thread_ids]
+        for future in futures:
+            future.result()
+        elapsed = time.perf_counter() - start
+
+        counts = [state_manager.get_state(t).metadata.get('handled', 0) for t in thread_ids]
+        lost = THREADS * MESSAGES - sum(counts)
+        print(f"{label:<22} {elapsed:5.2f}s  updates kept {sum(counts)}/{THREADS * MESSAGES}  lost {lost}")
+        return lost
+
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        run("Unkeyed thread pool", lambda key, func, *args: pool.submit(func, *args))
+
+    with ShardedScheduler(workers=WORKERS) as scheduler:
+        lost = run("Sharded by thread_id", scheduler.submit)
+
+    assert lost == 0, "sharded scheduler lost updates"
+
+    # The same read / LLM / write split into steps with their own workers
+    def staged_submit(scheduler, thread_id, func, state_manager, _):
+        return scheduler.submit(thread_id, {
+            'state': lambda: state_manager.get_state(thread_id).metadata,
+            'generate': lambda metadata: (time.sleep(0.001), metadata)[1],
+            'dispatch': lambda metadata: state_manager.update_state(
+                thread_id, {'metadata': dict(metadata, handled=metadata.get('handled', 0) + 1)}),
+        })
+
+    with StagedScheduler({'state': 2, 'generate': WORKERS, 'dispatch': 2}) as scheduler:
+        lost = run("Staged by thread_id", lambda *args: staged_submit(scheduler, *args))
+
+    assert lost == 0, "staged scheduler lost updates"
+    print("OK: no lost updates with per-thread sharding")
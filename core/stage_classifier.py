@@ -0,0 +1,163 @@
+"""
+Local conversation stage classifier
+
+Predicts the conversation stage of an incoming recruiter message before any
+LLM call, using the response_analysis keyword lists from config/prompts.yaml
+and, optionally, a small naive Bayes model trained on past messages.
+"""
+
+import os
+import re
+import json
+import sys
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from utils.text_classifier import NaiveBayesTextClassifier
+
+
+# response_analysis list name -> conversation stage
+KEYWORD_LISTS = {
+    'initial_keywords': 'initial_contact',
+    'screening_keywords': 'screening',
+    'scheduling_keywords': 'scheduling',
+    'negotiation_keywords': 'negotiation',
+    'decline_indicators': 'declined',
+}
+
+# Conversation order; on equal keyword scores the current stage wins, then the earliest
+STAGE_ORDER = ['initial_contact', 'information_gathering', 'screening', 'scheduling', 'negotiation', 'declined']
+
+# Stages that end the automated conversation (escalation, no reply). Recruiter
+# boilerplate ("salary", "if you're not interested") hits these lists, so they
+# need a clear keyword lead and are never predicted for a first message.
+DECISIVE_STAGES = ('negotiation', 'declined')
+
+
+class StageClassifier:
+    """Fast keyword (and optional model) based stage predictor"""
+
+    def __init__(self, keywords: Dict[str, List[str]],
+                 model: Optional[NaiveBayesTextClassifier] = None,
+                 model_threshold: float = 0.6, decisive_margin: int = 2):
+        """
+        Args:
+            keywords: Mapping of stage -> keyword phrases
+            model: Optional trained model consulted before the keywords
+            model_threshold: Minimum model probability to trust its prediction
+            decisive_margin: Keyword hits negotiation/declined must lead every other stage by
+        """
+        self.model = model
+        self.model_threshold = model_threshold
+        self.decisive_margin = decisive_margin
+        self.patterns = {
+            stage: re.compile(
+                r'\b(?:' + '|'.join(re.escape(phrase.lower()) for phrase in phrases) + r')\b'
+            )
+            for stage, phrases in keywords.items() if phrases
+        }
+
+    @classmethod
+    def from_prompts(cls, prompts: Dict, model_path: Optional[str] = None,
+                     model_threshold: float = 0.6, decisive_margin: int = 2) -> 'StageClassifier':
+        """Build from the response_analysis section of prompts.yaml"""
+        analysis = prompts.get('response_analysis', {}) or {}
+        keywords = {
+            stage: analysis.get(list_name, []) or []
+            for list_name, stage in KEYWORD_LISTS.items()
+        }
+
+        model = None
+        if model_path and os.path.exists(model_path):
+            try:
+                model = NaiveBayesTextClassifier.load(model_path)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Could not load stage model from {model_path}: {e}")
+
+        return cls(keywords, model=model, model_threshold=model_threshold, decisive_margin=decisive_margin)
+
+    def keyword_scores(self, message: str) -> Dict[str, int]:
+        """Number of keyword hits per stage"""
+        text = (message or '').lower()
+        return {stage: len(pattern.findall(text)) for stage, pattern in self.patterns.items()}
+
+    def predict(self, message: str, current_stage: str = 'initial_contact') -> Tuple[Optional[str], float]:
+        """
+        Predict the stage a message belongs to
+
+        Returns:
+            (stage, confidence). stage is None when nothing matched, in which
+            case the caller should let the LLM decide.
+        """
+        allow_decisive = current_stage != 'initial_contact'
+        stage, confidence = None, 0.0
+
+        if self.model is not None:
+            stage, confidence = self.model.predict(message)
+            if confidence < self.model_threshold or (stage in DECISIVE_STAGES and not allow_decisive):
+                stage, confidence = None, 0.0
+
+        if stage is None:
+            stage, confidence = self._keyword_stage(message, current_stage, allow_decisive)
+            if stage is None:
+                return None, 0.0
+
+        # "Opportunity"/"position" in a follow-up means we are still gathering details
+        if stage == 'initial_contact' and current_stage != 'initial_contact':
+            stage = 'information_gathering'
+
+        return stage, confidence
+
+    def _keyword_stage(self, message: str, current_stage: str, allow_decisive: bool) -> Tuple[Optional[str], float]:
+        """Best keyword stage, skipping negotiation/declined unless allowed and clearly ahead"""
+        scores = self.keyword_scores(message)
+        total = sum(scores.values())
+        if total == 0:
+            return None, 0.0
+
+        def order(stage: str) -> int:
+            return STAGE_ORDER.index(stage) if stage in STAGE_ORDER else len(STAGE_ORDER)
+
+        ranked = sorted((s for s in scores if scores[s]),
+                        key=lambda s: (-scores[s], s != current_stage, order(s)))
+        for stage in ranked:
+            if stage in DECISIVE_STAGES:
+                runner_up = max((scores[s] for s in scores if s != stage), default=0)
+                if not allow_decisive or scores[stage] - runner_up < self.decisive_margin:
+                    continue
+            return stage, scores[stage] / total
+        return None, 0.0
+
+    def train(self, samples: Iterable[Tuple[str, str]], model_path: Optional[str] = None) -> NaiveBayesTextClassifier:
+        """Train (and optionally save) the backing model from (text, stage) pairs"""
+        self.model = NaiveBayesTextClassifier().fit(samples)
+        if model_path:
+            self.model.save(model_path)
+        return self.model
+
+
+if __name__ == "__main__":
+    # Train a stage model from a JSONL file of {"text": ..., "stage": ...}
+    import yaml
+
+    if len(sys.argv) < 2:
+        print("Usage: python -m core.stage_classifier <samples.jsonl> [model_path]")
+        sys.exit(1)
+
+    samples_path = sys.argv[1]
+    model_path = sys.argv[2] if len(sys.argv) > 2 else os.getenv('STAGE_MODEL_PATH', 'data/stage_model.json')
+
+    with open('config/prompts.yaml', 'r') as f:
+        prompts = yaml.safe_load(f)
+
+    with open(samples_path, 'r') as f:
+        samples = [(row['text'], row['stage']) for row in map(json.loads, f) if row.get('text')]
+
+    classifier = StageClassifier.from_prompts(prompts)
+    keyword_correct = sum(1 for text, stage in samples if classifier.predict(text)[0] == stage)
+
+    model = classifier.train(samples, model_path)
+    model_correct = sum(1 for text, stage in samples if model.predict(text)[0] == stage)
+
+    print(f"Trained on {len(samples)} samples -> {model_path}")
+    print(f"Keyword accuracy (train): {keyword_correct / len(samples):.1%}")
+    print(f"Model accuracy (train):   {model_correct / len(samples):.1%}")
@@ -1,9 +1,15 @@
 """
 State Manager for tracking conversation context across channels
+
+Safe to share between processes: the database runs in WAL mode (readers
+never block the writer), connections wait out locks instead of failing, and
+read-modify-write updates take the write lock up front (BEGIN IMMEDIATE).
 """
 
 import json
+import time
 import sqlite3
+from contextlib import contextmanager
 from datetime import datetime
 from typing import Dict, List, Optional
 from dataclasses import dataclass, asdict
@@ -34,17 +40,51 @@ class ConversationState:
 class StateManager:
     """Manages conversation state using SQLite"""
     
-    def __init__(self, db_path: str = "data/conversations.db"):
+    def __init__(self, db_path: str = "data/conversations.db", busy_timeout: float = 30.0):
+        """
+        Args:
+            db_path: SQLite database file
+            busy_timeout: Seconds a connection waits for another process's write lock
+        """
         self.db_path = db_path
+        self.busy_timeout = busy_timeout
         self._ensure_db_exists()
     
+    def _connect(self, **kwargs) -> sqlite3.Connection:
+        """Connection that waits up to busy_timeout for locks held by other processes"""
+        return sqlite3.connect(self.db_path, timeout=self.busy_timeout, **kwargs)
+    
+    @contextmanager
+    def _transaction(self):
+        """
+        Connection holding the database write lock until the block ends
+        
+        BEGIN IMMEDIATE takes the lock before the first read, so a
+        read-modify-write cannot interleave with another process's.
+        """
+        conn = self._connect(isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            # A failed BEGIN (e.g. database locked) leaves nothing to roll back
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+    
     def _ensure_db_exists(self):
         """Create database and tables if they don't exist"""
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
         
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
+        # WAL lets worker processes read while one of them writes (persists in the file)
+        cursor.execute("PRAGMA journal_mode=WAL")
+        
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS conversations (
                 thread_id TEXT PRIMARY KEY,
@@ -79,6 +119,60 @@ class StateManager:
             )
         """)
         
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS sync_state (
+                key TEXT PRIMARY KEY,
+                value TEXT,
+                updated_at TIMESTAMP
+            )
+        """)
+        
+        # Replies waiting to be sent; idempotency_key makes enqueueing the
+        # same reply twice (e.g. after a crash) a no-op
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                idempotency_key TEXT UNIQUE NOT NULL,
+                thread_id TEXT NOT NULL,
+                channel TEXT NOT NULL,
+                recipient TEXT NOT NULL,
+                subject TEXT,
+                body TEXT NOT NULL,
+                metadata TEXT,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                last_error TEXT,
+                created_at TIMESTAMP,
+                sent_at TIMESTAMP
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox(status, next_attempt_at)")
+        
+        # Incoming messages shared between worker processes (main.py --workers).
+        # A worker leases one message at a time; only the oldest unfinished
+        # message of a conversation can be leased, so each conversation is
+        # handled in order by one process at a time
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS work_queue (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                message_id TEXT UNIQUE NOT NULL,
+                conversation_key TEXT NOT NULL,
+                channel TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                leased_by TEXT,
+                lease_expires_at REAL,
+                attempts INTEGER DEFAULT 0,
+                result TEXT,
+                last_error TEXT,
+                created_at TIMESTAMP,
+                finished_at TIMESTAMP
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_work_status ON work_queue(status, id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_work_conversation ON work_queue(conversation_key, id)")
+        
         conn.commit()
         conn.close()
     
@@ -109,22 +203,23 @@ class StateManager:
             escalation_reason=None
         )
         
-        self._save_state(state)
-        self._save_message(thread_id, initial_message)
+        with self._transaction() as conn:
+            self._save_state(state, conn)
+            self._save_message(thread_id, initial_message, conn)
         
         return state
     
-    def get_state(self, thread_id: str) -> Optional[ConversationState]:
+    def get_state(self, thread_id: str, conn: Optional[sqlite3.Connection] = None) -> Optional[ConversationState]:
         """Retrieve conversation state by thread ID"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor = (conn or self._connect()).cursor()
         
         cursor.execute("""
             SELECT * FROM conversations WHERE thread_id = ?
         """, (thread_id,))
         
         row = cursor.fetchone()
-        conn.close()
+        if conn is None:
+            cursor.connection.close()
         
         if not row:
             return None
@@ -133,19 +228,20 @@ class StateManager:
     
     def update_state(self, thread_id: str, updates: Dict) -> ConversationState:
         """Update conversation state"""
-        state = self.get_state(thread_id)
-        
-        if not state:
-            raise ValueError(f"Conversation {thread_id} not found")
-        
-        # Update fields
-        for key, value in updates.items():
-            if hasattr(state, key):
-                setattr(state, key, value)
-        
-        state.updated_at = datetime.now()
-        
-        self._save_state(state)
+        with self._transaction() as conn:
+            state = self.get_state(thread_id, conn)
+            
+            if not state:
+                raise ValueError(f"Conversation {thread_id} not found")
+            
+            # Update fields
+            for key, value in updates.items():
+                if hasattr(state, key):
+                    setattr(state, key, value)
+            
+            state.updated_at = datetime.now()
+            
+            self._save_state(state, conn)
         return state
     
     def add_message(self, thread_id: str, message: Dict):
@@ -154,18 +250,19 @@ class StateManager:
         if 'timestamp' in message and isinstance(message['timestamp'], datetime):
             message['timestamp'] = message['timestamp'].isoformat()
         
-        state = self.get_state(thread_id)
-        
-        if state:
-            state.conversation_history.append(message)
-            state.updated_at = datetime.now()
-            self._save_state(state)
-        
-        self._save_message(thread_id, message)
+        with self._transaction() as conn:
+            state = self.get_state(thread_id, conn)
+            
+            if state:
+                state.conversation_history.append(message)
+                state.updated_at = datetime.now()
+                self._save_state(state, conn)
+            
+            self._save_message(thread_id, message, conn)
     
     def get_conversation_history(self, thread_id: str) -> List[Dict]:
         """Get all messages for a conversation"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -188,9 +285,39 @@ class StateManager:
         conn.close()
         return messages
     
+    def get_messages_since(self, last_id: int = 0, limit: Optional[int] = None) -> List[Dict]:
+        """Get messages with a row id greater than last_id, oldest first"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        
+        query = """
+            SELECT id, thread_id, timestamp, channel, direction, content
+            FROM messages
+            WHERE id > ?
+            ORDER BY id ASC
+        """
+        params = (last_id,)
+        if limit:
+            query += " LIMIT ?"
+            params = (last_id, limit)
+        
+        cursor.execute(query, params)
+        
+        messages = [{
+            'id': row[0],
+            'thread_id': row[1],
+            'timestamp': row[2],
+            'channel': row[3],
+            'direction': row[4],
+            'content': row[5] or ''
+        } for row in cursor.fetchall()]
+        
+        conn.close()
+        return messages
+    
     def get_active_conversations(self) -> List[ConversationState]:
         """Get all active (non-declined) conversations"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -211,9 +338,267 @@ class StateManager:
             'escalation_reason': reason
         })
     
-    def _save_state(self, state: ConversationState):
-        """Save conversation state to database"""
-        conn = sqlite3.connect(self.db_path)
+    def get_sync_value(self, key: str) -> Optional[str]:
+        """Get a mailbox sync checkpoint (e.g. the last Gmail historyId)"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        
+        cursor.execute("SELECT value FROM sync_state WHERE key = ?", (key,))
+        row = cursor.fetchone()
+        
+        conn.close()
+        return row[0] if row else None
+    
+    def set_sync_value(self, key: str, value: Optional[str]):
+        """Store a mailbox sync checkpoint"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            INSERT OR REPLACE INTO sync_state (key, value, updated_at)
+            VALUES (?, ?, ?)
+        """, (key, value, datetime.now().isoformat()))
+        
+        conn.commit()
+        conn.close()
+    
+    def enqueue_outgoing(self, idempotency_key: str, thread_id: str, channel: str, recipient: str,
+                         body: str, subject: Optional[str] = None, metadata: Optional[Dict] = None) -> bool:
+        """
+        Queue a reply for the outbox sender
+        
+        Returns:
+            False if a reply with this idempotency key was already queued
+        """
+        conn = self._connect()
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            INSERT OR IGNORE INTO outbox (
+                idempotency_key, thread_id, channel, recipient, subject, body,
+                metadata, next_attempt_at, created_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            idempotency_key, thread_id, channel, recipient, subject, body,
+            json.dumps(metadata or {}), time.time(), datetime.now().isoformat()
+        ))
+        queued = cursor.rowcount == 1
+        
+        conn.commit()
+        conn.close()
+        return queued
+    
+    def claim_outgoing(self, limit: int, lease_seconds: float) -> List[Dict]:
+        """
+        Lease up to `limit` due outbox entries for sending
+        
+        Entries stay leased ('sending') for lease_seconds; if the sender dies
+        before recording the outcome they become due again.
+        """
+        now = time.time()
+        
+        # Claim atomically so two senders never lease the same entry
+        with self._transaction() as conn:
+            rows = conn.execute("""
+                SELECT id, idempotency_key, thread_id, channel, recipient, subject, body, metadata, attempts
+                FROM outbox
+                WHERE status IN ('pending', 'sending') AND next_attempt_at <= ?
+                ORDER BY next_attempt_at ASC
+                LIMIT ?
+            """, (now, limit)).fetchall()
+            
+            conn.executemany(
+                "UPDATE outbox SET status = 'sending', next_attempt_at = ? WHERE id = ?",
+                [(now + lease_seconds, row[0]) for row in rows]
+            )
+        
+        return [{
+            'id': row[0],
+            'idempotency_key': row[1],
+            'thread_id': row[2],
+            'channel': row[3],
+            'recipient': row[4],
+            'subject': row[5],
+            'body': row[6],
+            'metadata': json.loads(row[7]) if row[7] else {},
+            'attempts': row[8]
+        } for row in rows]
+    
+    def mark_outgoing_sent(self, outbox_id: int):
+        """Record a successful send"""
+        conn = self._connect()
+        conn.execute(
+            "UPDATE outbox SET status = 'sent', sent_at = ?, last_error = NULL WHERE id = ?",
+            (datetime.now().isoformat(), outbox_id)
+        )
+        conn.commit()
+        conn.close()
+    
+    def mark_outgoing_failed(self, outbox_id: int, error: str, retry_at: Optional[float] = None):
+        """Record a failed attempt; retry_at=None gives up on the entry"""
+        conn = self._connect()
+        conn.execute("""
+            UPDATE outbox
+            SET status = ?, attempts = attempts + 1, next_attempt_at = ?, last_error = ?
+            WHERE id = ?
+        """, ('pending' if retry_at is not None else 'failed', retry_at or time.time(), error, outbox_id))
+        conn.commit()
+        conn.close()
+    
+    def get_outbox_counts(self) -> Dict[str, int]:
+        """Number of outbox entries per status"""
+        conn = self._connect()
+        rows = conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall()
+        conn.close()
+        return dict(rows)
+    
+    def enqueue_work(self, message_id: str, conversation_key: str, channel: str, payload: Dict) -> bool:
+        """
+        Queue an incoming message for the worker processes
+        
+        Returns:
+            False if the message was already queued (e.g. fetched again while still unread)
+        """
+        conn = self._connect()
+        cursor = conn.execute("""
+            INSERT OR IGNORE INTO work_queue (message_id, conversation_key, channel, payload, created_at)
+            VALUES (?, ?, ?, ?, ?)
+        """, (message_id, conversation_key, channel, json.dumps(payload), datetime.now().isoformat()))
+        queued = cursor.rowcount == 1
+        conn.commit()
+        conn.close()
+        return queued
+    
+    def claim_work(self, worker_id: str, lease_seconds: float, max_attempts: int = 3) -> Optional[Dict]:
+        """
+        Lease the next message whose conversation has nothing earlier unfinished
+        
+        The lease lasts lease_seconds; a message whose worker hangs or dies
+        becomes claimable again when it expires (or sooner via release_work).
+        A message that has used up max_attempts leases is marked failed.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute("""
+                UPDATE work_queue SET status = 'failed', last_error = 'lease expired', finished_at = ?
+                WHERE status = 'leased' AND lease_expires_at <= ? AND attempts >= ?
+            """, (datetime.now().isoformat(), now, max_attempts))
+            
+            row = conn.execute("""
+                SELECT id, message_id, conversation_key, channel, payload, attempts
+                FROM work_queue w
+                WHERE (status = 'pending' OR (status = 'leased' AND lease_expires_at <= ?))
+                  AND NOT EXISTS (
+                      SELECT 1 FROM work_queue earlier
+                      WHERE earlier.conversation_key = w.conversation_key
+                        AND earlier.id < w.id
+                        AND earlier.status IN ('pending', 'leased')
+                  )
+                ORDER BY id ASC
+                LIMIT 1
+            """, (now,)).fetchone()
+            
+            if row is None:
+                return None
+            
+            conn.execute("""
+                UPDATE work_queue
+                SET status = 'leased', leased_by = ?, lease_expires_at = ?, attempts = attempts + 1
+                WHERE id = ?
+            """, (worker_id, now + lease_seconds, row[0]))
+        
+        return {
+            'id': row[0],
+            'message_id': row[1],
+            'conversation_key': row[2],
+            'channel': row[3],
+            'payload': json.loads(row[4]),
+            'attempts': row[5] + 1
+        }
+    
+    def complete_work(self, work_id: int, worker_id: str, result: Dict) -> bool:
+        """
+        Record a processed message; result is picked up by collect_completed_work()
+        
+        Returns:
+            False if worker_id no longer holds the lease (it expired and was reclaimed)
+        """
+        conn = self._connect()
+        cursor = conn.execute("""
+            UPDATE work_queue SET status = 'done', result = ?, last_error = NULL, finished_at = ?
+            WHERE id = ? AND leased_by = ? AND status = 'leased'
+        """, (json.dumps(result), datetime.now().isoformat(), work_id, worker_id))
+        updated = cursor.rowcount == 1
+        conn.commit()
+        conn.close()
+        return updated
+    
+    def fail_work(self, work_id: int, worker_id: str, error: str, max_attempts: int = 3) -> bool:
+        """
+        Return a message to the queue after an error, or give up after max_attempts
+        
+        Returns:
+            False if worker_id no longer holds the lease (it expired and was reclaimed)
+        """
+        conn = self._connect()
+        cursor = conn.execute("""
+            UPDATE work_queue
+            SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                finished_at = CASE WHEN attempts >= ? THEN ? ELSE finished_at END,
+                leased_by = NULL, last_error = ?
+            WHERE id = ? AND leased_by = ? AND status = 'leased'
+        """, (max_attempts, max_attempts, datetime.now().isoformat(), error, work_id, worker_id))
+        updated = cursor.rowcount == 1
+        conn.commit()
+        conn.close()
+        return updated
+    
+    def release_work(self, worker_id: str, error: str, max_attempts: int = 3) -> int:
+        """
+        Reclaim the leases of a worker that died
+        
+        Returns:
+            Number of messages put back in the queue or marked failed
+        """
+        conn = self._connect()
+        cursor = conn.execute("""
+            UPDATE work_queue
+            SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                finished_at = CASE WHEN attempts >= ? THEN ? ELSE finished_at END,
+                leased_by = NULL, last_error = ?
+            WHERE status = 'leased' AND leased_by = ?
+        """, (max_attempts, max_attempts, datetime.now().isoformat(), error, worker_id))
+        released = cursor.rowcount
+        conn.commit()
+        conn.close()
+        return released
+    
+    def collect_completed_work(self, limit: int = 1000) -> List[Dict]:
+        """Take processed messages and their results (each is returned once)"""
+        with self._transaction() as conn:
+            rows = conn.execute("""
+                SELECT id, message_id, channel, result FROM work_queue
+                WHERE status = 'done' ORDER BY id ASC LIMIT ?
+            """, (limit,)).fetchall()
+            conn.executemany("UPDATE work_queue SET status = 'closed' WHERE id = ?",
+                             [(row[0],) for row in rows])
+        
+        return [{
+            'id': row[0],
+            'message_id': row[1],
+            'channel': row[2],
+            'result': json.loads(row[3]) if row[3] else {}
+        } for row in rows]
+    
+    def get_work_counts(self) -> Dict[str, int]:
+        """Number of work queue entries per status"""
+        conn = self._connect()
+        rows = conn.execute("SELECT status, COUNT(*) FROM work_queue GROUP BY status").fetchall()
+        conn.close()
+        return dict(rows)
+    
+    def _save_state(self, state: ConversationState, conn: sqlite3.Connection):
+        """Save conversation state within a transaction"""
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -241,13 +626,9 @@ class StateManager:
             1 if state.requires_escalation else 0,
             state.escalation_reason
         ))
-        
-        conn.commit()
-        conn.close()
     
-    def _save_message(self, thread_id: str, message: Dict):
-        """Save individual message to database"""
-        conn = sqlite3.connect(self.db_path)
+    def _save_message(self, thread_id: str, message: Dict, conn: sqlite3.Connection):
+        """Save individual message within a transaction"""
         cursor = conn.cursor()
         
         # Get timestamp and ensure it's a string
@@ -266,9 +647,6 @@ class StateManager:
             message.get('content', ''),
             json.dumps(message.get('metadata', {}))
         ))
-        
-        conn.commit()
-        conn.close()
     
     def _row_to_state(self, row) -> ConversationState:
         """Convert database row to ConversationState object"""
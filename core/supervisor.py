@@ -0,0 +1,292 @@
+"""
+Multi-process worker mode (main.py --workers N)
+
+With a local CPU model one process can't keep every core busy. The
+supervisor fetches unread mail and queues each message in the work_queue
+table of the conversations database; N worker processes lease messages from
+there, run state, generate and dispatch, and hand back the label/read
+changes to apply. All mail API calls (fetch, label, send via the outbox)
+stay in the supervisor, so one rate limiter spends the Gmail quota. Workers
+don't even authenticate: their orchestrators get a WorkerMailAgent, which
+only records the changes.
+
+Each cycle's mail is queued oldest first and a conversation's messages are
+leased one at a time in queue order, so in arrival order. A worker that dies
+is restarted and its leased message goes back in the queue.
+"""
+
+import os
+import time
+import threading
+import multiprocessing
+from typing import Callable, Dict, List
+
+from core.orchestrator import JobApplicationOrchestrator, oldest_first
+from utils.metrics import metrics
+
+
+class WorkerMailAgent:
+    """
+    Mail agent for worker processes: records label/read changes, talks to no mail server
+
+    The supervisor replays the recorded changes on its own agent, so they
+    work with either backend (IMAP turns labels into keywords when queued).
+    """
+
+    def __init__(self):
+        self._pending: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def queue_label(self, msg_id: str, label_name: str):
+        with self._lock:
+            self._pending.setdefault(msg_id, {'labels': [], 'read': False})['labels'].append(label_name)
+
+    def queue_mark_as_read(self, msg_id: str):
+        with self._lock:
+            self._pending.setdefault(msg_id, {'labels': [], 'read': False})['read'] = True
+
+    def take_modifications(self) -> Dict[str, Dict]:
+        """Remove and return the recorded changes ({msg_id: {'labels': [...], 'read': bool}})"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return pending
+
+    def flush_modifications(self) -> int:
+        return 0
+
+    def send_reply(self, *args, **kwargs):
+        raise RuntimeError("worker processes don't send mail - replies go through the supervisor's outbox")
+
+    send_message = send_replies = send_reply
+
+
+def build_worker_orchestrator() -> JobApplicationOrchestrator:
+    """Default worker factory: orchestrator from the environment with a mail-less agent"""
+    return JobApplicationOrchestrator(email_agent=WorkerMailAgent())
+
+
+def _worker_main(name: str, factory: Callable, lease_seconds: float, poll_interval: float,
+                 max_attempts: int, stop_event):
+    """Worker process: lease a message, process it, record the outcome"""
+    worker_id = f"{name}-{os.getpid()}"
+    orchestrator = factory()
+    state_manager = orchestrator.state_manager
+    email_agent = orchestrator.email_agent
+
+    try:
+        while not stop_event.is_set():
+            work = state_manager.claim_work(worker_id, lease_seconds, max_attempts)
+            if work is None:
+                stop_event.wait(poll_interval)
+                continue
+
+            message = work['payload']
+            try:
+                acknowledge = orchestrator._converse({'message': message, 'channel': work['channel']})
+            except Exception as e:
+                print(f"[{worker_id}] Error processing {work['channel']} message {work['message_id']}: {e}")
+                email_agent.take_modifications()
+                if not state_manager.fail_work(work['id'], worker_id, str(e), max_attempts):
+                    print(f"[{worker_id}] Lease on message {work['message_id']} was lost - leaving it to its new owner")
+                continue
+
+            if acknowledge:
+                email_agent.queue_mark_as_read(message.get('id'))
+            # Label/read changes are applied by the supervisor's mail agent
+            if not state_manager.complete_work(work['id'], worker_id,
+                                               {'modifications': email_agent.take_modifications()}):
+                print(f"[{worker_id}] Lease on message {work['message_id']} expired before it finished - "
+                      f"result discarded")
+    except KeyboardInterrupt:
+        # Ctrl+C reaches the whole process group; the supervisor reclaims the lease
+        pass
+
+
+class WorkerSupervisor:
+    """Feeds the work queue and keeps N worker processes running"""
+
+    def __init__(self, orchestrator: JobApplicationOrchestrator, workers: int,
+                 factory: Callable = build_worker_orchestrator, poll_interval: float = 1.0):
+        """
+        Args:
+            orchestrator: Supervisor-side components (mail agent, state, outbox)
+            workers: Worker processes to run
+            factory: Picklable callable building each worker's orchestrator
+                     (its email_agent should be a WorkerMailAgent)
+            poll_interval: Seconds an idle worker waits before looking for work again
+        """
+        self.orchestrator = orchestrator
+        self.state_manager = orchestrator.state_manager
+        self.workers = max(1, workers)
+        self.factory = factory
+        self.poll_interval = poll_interval
+        self.lease_seconds = float(os.getenv('WORKER_LEASE_SECONDS', '600'))
+        self.max_attempts = int(os.getenv('WORKER_MAX_ATTEMPTS', '3'))
+        self.restarts = 0
+
+        # Workers build their own clients; spawn avoids inheriting sockets and locks
+        self._context = multiprocessing.get_context('spawn')
+        self._stop_event = self._context.Event()
+        self._processes: List = [None] * self.workers
+
+    def start(self):
+        """Launch the worker processes"""
+        self._stop_event.clear()
+        for slot in range(self.workers):
+            self._spawn(slot)
+
+    def _spawn(self, slot: int):
+        process = self._context.Process(
+            target=_worker_main,
+            args=(f"worker-{slot}", self.factory, self.lease_seconds, self.poll_interval,
+                  self.max_attempts, self._stop_event),
+            name=f"aria-worker-{slot}",
+            daemon=True
+        )
+        process.start()
+        self._processes[slot] = process
+
+    def _release(self, slot: int, reason: str) -> int:
+        process = self._processes[slot]
+        return self.state_manager.release_work(f"worker-{slot}-{process.pid}", reason, self.max_attempts)
+
+    def check_workers(self) -> int:
+        """
+        Restart workers that have exited and reclaim their leased messages
+
+        Returns:
+            Number of workers restarted
+        """
+        restarted = 0
+        for slot, process in enumerate(self._processes):
+            if process is None or process.is_alive():
+                continue
+
+            released = self._release(slot, f"worker exited with code {process.exitcode}")
+            print(f"Worker {slot} (pid {process.pid}) exited with code {process.exitcode} - "
+                  f"requeued {released} message(s), restarting")
+            metrics.increment('workers.restarts')
+            self.restarts += 1
+            restarted += 1
+            self._spawn(slot)
+        return restarted
+
+    def enqueue_new_messages(self) -> int:
+        """
+        Fetch unread mail once and queue each message for the workers
+
+        Returns:
+            Number of newly queued messages (still-unread ones already queued are skipped)
+        """
+        o = self.orchestrator
+        # Queue order is lease order within a conversation, and mailboxes list newest first
+        messages = oldest_first(o.email_agent.iter_unread_recruiter_emails(
+            page_size=o.email_page_size,
+            max_messages=o.email_max_per_cycle or None,
+            prefetch=o.email_prefetch
+        ))
+
+        queued = 0
+        for message in messages:
+            channel = o._route_message(message)
+            if channel == 'sms' and o._is_sms_unsubscribe(message):
+                continue
+            if self.state_manager.enqueue_work(message.get('id'), o._conversation_key(message, channel),
+                                               channel, message):
+                queued += 1
+
+        # Everything fetched is now durable in the work queue
+        o.email_agent.commit_sync_checkpoint()
+        metrics.increment('workers.queued', queued)
+        return queued
+
+    def apply_completed_work(self) -> int:
+        """
+        Apply workers' label/read changes for finished messages and kick the outbox
+
+        Returns:
+            Number of messages finished since the last call
+        """
+        email_agent = self.orchestrator.email_agent
+        completed = self.state_manager.collect_completed_work()
+        for work in completed:
+            for msg_id, change in work['result'].get('modifications', {}).items():
+                for label_name in change.get('labels', []):
+                    email_agent.queue_label(msg_id, label_name)
+                if change.get('read'):
+                    email_agent.queue_mark_as_read(msg_id)
+
+        if completed:
+            email_agent.flush_modifications()
+            metrics.increment('workers.completed', len(completed))
+
+            outbox = self.orchestrator.outbox
+            if outbox.running:
+                outbox.notify()
+            else:
+                outbox.send_pending()
+        return len(completed)
+
+    def supervise(self) -> int:
+        """One supervision tick: restart dead workers, then apply finished work"""
+        self.check_workers()
+        return self.apply_completed_work()
+
+    def stop(self, timeout: float = 10):
+        """Stop the workers (finishing their current message if they can) and requeue leftovers"""
+        self._stop_event.set()
+        deadline = time.time() + timeout
+        for process in self._processes:
+            if process is not None:
+                process.join(max(0.0, deadline - time.time()))
+
+        for slot, process in enumerate(self._processes):
+            if process is None:
+                continue
+            if process.is_alive():
+                process.terminate()
+                process.join()
+            self._release(slot, "worker stopped")
+        self.apply_completed_work()
+
+
+if __name__ == "__main__":
+    # Multi-process run against a fake mailbox, killing a worker part-way through
+    import sys
+    import tempfile
+
+    from load_test import build_simulated_orchestrator, simulated_worker_factory
+
+    WORKERS = 4
+    workdir = tempfile.mkdtemp(prefix='aria-workers-')
+    orchestrator, gmail, recruiters = build_simulated_orchestrator(workdir, emails=200)
+    supervisor = WorkerSupervisor(orchestrator, WORKERS,
+                                  factory=simulated_worker_factory(workdir, llm_cpu_seconds=0.05),
+                                  poll_interval=0.1)
+
+    start = time.perf_counter()
+    supervisor.start()
+    queued = supervisor.enqueue_new_messages()
+    killed = False
+    stdout = sys.stdout
+    with open(os.devnull, 'w') as devnull:
+        sys.stdout = devnull
+        try:
+            while True:
+                counts = orchestrator.state_manager.get_work_counts()
+                if not killed and counts.get('done', 0) + counts.get('closed', 0) >= queued // 3:
+                    supervisor._processes[0].kill()
+                    killed = True
+                supervisor.supervise()
+                if not counts.get('pending') and not counts.get('leased') and not counts.get('done'):
+                    break
+                time.sleep(0.1)
+            supervisor.stop()
+            orchestrator.outbox.send_pending()
+        finally:
+            sys.stdout = stdout
+
+    print(f"{WORKERS} workers: {queued} messages queued, "
+          f"{orchestrator.state_manager.get_work_counts()} in {time.perf_counter() - start:.1f}s")
+    print(f"Worker restarts: {supervisor.restarts}; replies sent: {len(gmail.sent)} to "
+          f"{len(set(m['threadId'] for m in gmail.sent))} threads")
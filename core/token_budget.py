@@ -0,0 +1,91 @@
+"""
+Approximate token counting and prompt budget enforcement
+
+The estimator is a fast local approximation of BPE tokenizers (roughly one
+token per short word or punctuation mark, more for long words), good enough
+to keep prompts inside the model's context window without loading a
+tokenizer.
+"""
+
+import re
+from typing import Dict, List, Optional
+
+
+TOKEN_PIECES = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """Approximate number of tokens in text"""
+    if not text:
+        return 0
+    return sum(1 + len(piece) // 6 for piece in TOKEN_PIECES.findall(text))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, tail_fraction: float = 0.2) -> str:
+    """
+    Shorten text to about max_tokens, keeping the start and a little of the end
+
+    Recruiter emails put the ask up front and contact details / questions at
+    the bottom, so both ends are worth more than the middle.
+    """
+    if max_tokens <= 0:
+        return ""
+
+    tokens = estimate_tokens(text)
+    if tokens <= max_tokens:
+        return text
+
+    marker = "\n[... trimmed ...]\n"
+    # Characters per token for this particular text, then a little headroom
+    keep_chars = int(len(text) * (max_tokens - estimate_tokens(marker)) / tokens * 0.95)
+    if keep_chars <= 0:
+        return ""
+
+    tail_chars = int(keep_chars * tail_fraction)
+    head_chars = keep_chars - tail_chars
+    head = text[:head_chars].rstrip()
+    tail = text[len(text) - tail_chars:].lstrip() if tail_chars else ""
+    return head + marker + tail
+
+
+class PromptBudget:
+    """
+    Fits named prompt sections into a token budget
+
+    Sections are shrunk in priority order (lowest first) down to their floor
+    until the whole prompt fits.
+    """
+
+    def __init__(self, max_tokens: int):
+        self.max_tokens = max_tokens
+
+    def fit(self, sections: List[Dict], fixed_tokens: int = 0) -> Dict[str, str]:
+        """
+        Args:
+            sections: Dicts with name, text, priority (higher is kept longer)
+                      and optional min_tokens floor
+            fixed_tokens: Tokens already committed (system prompt, instructions)
+
+        Returns:
+            Mapping of section name -> (possibly truncated) text
+        """
+        texts = {section['name']: section.get('text') or '' for section in sections}
+        sizes = {name: estimate_tokens(text) for name, text in texts.items()}
+        overflow = fixed_tokens + sum(sizes.values()) - self.max_tokens
+
+        for section in sorted(sections, key=lambda s: s.get('priority', 0)):
+            if overflow <= 0:
+                break
+
+            name = section['name']
+            floor = section.get('min_tokens', 0)
+            target = max(floor, sizes[name] - overflow)
+            if target >= sizes[name]:
+                continue
+
+            texts[name] = truncate_to_tokens(texts[name], target)
+            new_size = estimate_tokens(texts[name])
+            overflow -= sizes[name] - new_size
+            sizes[name] = new_size
+
+        return texts
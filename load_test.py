@@ -0,0 +1,234 @@
+"""
+Offline load / soak test: drive the full pipeline against a fake Gmail
+
+Usage:
+    python load_test.py [--emails 10000] [--latency 0.02] [--error-rate 0.01]
+
+    # Real Gmail per-user quota (250 units/s; a send costs 100 units)
+    python load_test.py --emails 1000 --quota-units 250
+
+    # CPU-bound "local model" across 4 worker processes (main.py --workers)
+    python load_test.py --emails 1000 --llm-cpu 0.05 --workers 4
+
+Builds JobApplicationOrchestrator on a FakeGmailService mailbox filled with
+synthetic recruiter and non-recruiter mail and a simulated LLM, then runs
+processing cycles until nothing is left. No Google account or LLM needed;
+all state goes to a temporary directory.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import argparse
+import functools
+
+from agents.email_agent import EmailAgent
+from agents.fake_gmail import FakeGmailService
+from agents.message_cache import MessageCache
+from agents.rate_limiter import GmailRateLimiter
+from core.llm_processor import LLMProcessor
+from core.orchestrator import JobApplicationOrchestrator
+from core.state_manager import StateManager
+from core.supervisor import WorkerMailAgent, WorkerSupervisor
+from utils.metrics import metrics
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+class SimulatedLLMProcessor(LLMProcessor):
+    """LLMProcessor whose model call sleeps (remote API) or spins (local CPU model) and returns a canned reply"""
+
+    def __init__(self, latency: float = 0.0, cpu_seconds: float = 0.0):
+        super().__init__(provider='simulated', model='simulated')
+        self.latency = latency
+        self.cpu_seconds = cpu_seconds
+
+    def _call_llm(self, system_prompt: str, user_prompt: str, max_tokens=None) -> str:
+        metrics.increment('llm.requests')
+        if self.latency:
+            time.sleep(self.latency)
+        if self.cpu_seconds:
+            deadline = time.thread_time() + self.cpu_seconds
+            while time.thread_time() < deadline:
+                pass
+        return json.dumps({
+            'response': "Hi, thanks for reaching out! I'm Elena's assistant ARIA. "
+                        "Could you share the rate range and whether the role is remote?\n\nBest,\nElena",
+            'extracted_info': {},
+            'next_stage': 'information_gathering',
+            'requires_escalation': False,
+            'escalation_reason': None,
+            'confidence': 0.9
+        })
+
+
+def _configure(orchestrator: JobApplicationOrchestrator) -> JobApplicationOrchestrator:
+    orchestrator.auto_reply_enabled = True
+    orchestrator.require_approval = False
+    orchestrator.best_of_n = 1
+    return orchestrator
+
+
+def build_simulated_orchestrator(workdir: str, emails: int, recruiter_ratio: float = 0.5,
+                                 llm_latency: float = 0.0, llm_cpu_seconds: float = 0.0,
+                                 quota_units: float = 0, **gmail_options):
+    """
+    Orchestrator on a freshly populated FakeGmailService, with state in workdir
+
+    Returns:
+        (orchestrator, fake Gmail service, number of recruiter emails)
+    """
+    gmail = FakeGmailService(**gmail_options)
+    recruiters = gmail.populate(emails, recruiter_ratio)
+
+    state_manager = StateManager(db_path=os.path.join(workdir, 'conversations.db'))
+    email_agent = EmailAgent(
+        state_manager=state_manager,
+        message_cache=MessageCache(db_path=os.path.join(workdir, 'message_cache.db')),
+        rate_limiter=GmailRateLimiter(units_per_second=quota_units or 1e9),
+        service=gmail
+    )
+    orchestrator = _configure(JobApplicationOrchestrator(
+        state_manager=state_manager,
+        llm_processor=SimulatedLLMProcessor(llm_latency, llm_cpu_seconds),
+        email_agent=email_agent
+    ))
+    return orchestrator, gmail, recruiters
+
+
+def _simulated_worker(workdir: str, llm_latency: float, llm_cpu_seconds: float) -> JobApplicationOrchestrator:
+    return _configure(JobApplicationOrchestrator(
+        state_manager=StateManager(db_path=os.path.join(workdir, 'conversations.db')),
+        llm_processor=SimulatedLLMProcessor(llm_latency, llm_cpu_seconds),
+        email_agent=WorkerMailAgent()
+    ))
+
+
+def simulated_worker_factory(workdir: str, llm_latency: float = 0.0, llm_cpu_seconds: float = 0.0):
+    """Picklable WorkerSupervisor factory for worker processes sharing workdir's database"""
+    return functools.partial(_simulated_worker, workdir, llm_latency, llm_cpu_seconds)
+
+
+def run_workers(orchestrator: JobApplicationOrchestrator, supervisor: WorkerSupervisor) -> int:
+    """Queue the whole inbox for the worker processes and wait for them to finish it"""
+    supervisor.start()
+    try:
+        processed = 0
+        queued = supervisor.enqueue_new_messages()
+        print(f"Queued {queued} messages for {supervisor.workers} worker processes")
+        while True:
+            processed += supervisor.supervise()
+            counts = orchestrator.state_manager.get_work_counts()
+            if not counts.get('pending') and not counts.get('leased') and not counts.get('done'):
+                return processed
+            time.sleep(0.1)
+    finally:
+        supervisor.stop()
+        orchestrator.outbox.send_pending()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline load test against a fake Gmail backend')
+    parser.add_argument('--emails', type=int, default=10000, help='Synthetic emails in the inbox')
+    parser.add_argument('--recruiter-ratio', type=float, default=0.5, help='Fraction that are recruiter mail')
+    parser.add_argument('--latency', type=float, default=0.0, help='Gmail round-trip latency (seconds)')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Extra random Gmail latency (seconds)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of Gmail calls that fail')
+    parser.add_argument('--error-status', type=int, default=429, help='HTTP status of injected errors')
+    parser.add_argument('--llm-latency', type=float, default=0.0, help='Simulated LLM call time (seconds)')
+    parser.add_argument('--llm-cpu', type=float, default=0.0,
+                        help='Simulated CPU time per LLM call (seconds, local model)')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='Process the inbox with this many worker processes (0 = in-process pipeline)')
+    parser.add_argument('--pipeline-workers', type=int, default=4,
+                        help='Worker threads for the pipeline generate (LLM) step')
+    parser.add_argument('--quota-units', type=float, default=0,
+                        help='Client-side Gmail quota in units/s (0 = unlimited)')
+    parser.add_argument('--max-cycles', type=int, default=50, help='Stop after this many cycles')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='aria-load-')
+    try:
+        orchestrator, gmail, recruiters = build_simulated_orchestrator(
+            workdir, args.emails, args.recruiter_ratio,
+            llm_latency=args.llm_latency, llm_cpu_seconds=args.llm_cpu, quota_units=args.quota_units,
+            latency=args.latency, latency_jitter=args.jitter,
+            error_rate=args.error_rate, error_status=args.error_status, seed=args.seed
+        )
+        state_manager = orchestrator.state_manager
+        email_agent = orchestrator.email_agent
+        orchestrator.pipeline_step_workers['generate'] = args.pipeline_workers
+
+        print("=" * 80)
+        print(f"LOAD TEST - {args.emails} emails ({recruiters} recruiter), "
+              f"latency={args.latency}s, error_rate={args.error_rate}")
+        print("=" * 80)
+
+        # Pipeline chatter would drown the report
+        stdout = sys.stdout
+        processed, cycles = 0, 0
+        start = time.perf_counter()
+        with open(os.devnull, 'w') as devnull:
+            if args.workers:
+                sys.stdout = devnull
+                try:
+                    processed = run_workers(orchestrator, WorkerSupervisor(
+                        orchestrator, args.workers, poll_interval=0.1,
+                        factory=simulated_worker_factory(workdir, args.llm_latency, args.llm_cpu)
+                    ))
+                finally:
+                    sys.stdout = stdout
+            while not args.workers and cycles < args.max_cycles:
+                sys.stdout = devnull
+                try:
+                    count = orchestrator.process_new_messages()
+                finally:
+                    sys.stdout = stdout
+                cycles += 1
+                processed += count
+                print(f"Cycle {cycles}: processed {count} (total {processed}, "
+                      f"{time.perf_counter() - start:.1f}s)")
+                if count == 0:
+                    break
+        elapsed = time.perf_counter() - start
+
+        snapshot = metrics.snapshot()
+        print("-" * 80)
+        print(f"Processed:       {processed}/{recruiters} recruiter emails in {elapsed:.1f}s "
+              f"({processed / elapsed:.1f}/s)")
+        print(f"Replies sent:    {len(gmail.sent)}")
+        print(f"Outbox:          {state_manager.get_outbox_counts()}")
+        if args.workers:
+            print(f"Work queue:      {state_manager.get_work_counts()}")
+        print(f"Still unread:    {gmail.count('is:unread label:ai-recruiter-processed')} processed-but-unread")
+        print(f"Gmail calls:     {sum(gmail.calls.values())} in {gmail.round_trips} round trips "
+              f"({gmail.injected_errors} injected errors, "
+              f"{email_agent.rate_limiter.throttled} throttled)")
+        for method, count in sorted(gmail.calls.items()):
+            print(f"  {method:<22} {count}")
+        print(f"Quota units:     {snapshot['counters'].get('gmail.quota_units', 0):.0f}")
+        print(f"LLM requests:    {snapshot['counters'].get('llm.requests', 0):.0f}")
+        stage_seconds = {name.split('.')[1]: summary for name, summary in snapshot['summaries'].items()
+                         if name.startswith('pipeline.') and name.endswith('.seconds')}
+        if stage_seconds:
+            print("Pipeline stages (busy seconds):")
+            for stage, summary in stage_seconds.items():
+                print(f"  {stage:<22} {summary['sum']:.1f}s over {summary['count']} items")
+        print(f"Message cache:   {email_agent.message_cache.hits} hits / {email_agent.message_cache.misses} misses")
+        if resource is not None:
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            print(f"Peak RSS:        {peak / (1024 if sys.platform != 'darwin' else 1024 * 1024):.0f} MB")
+        print("=" * 80)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,11 +5,15 @@ Main entry point for AI Recruiter Agent
 import os
 import sys
 import time
+import asyncio
 import argparse
 from datetime import datetime
 from dotenv import load_dotenv
 
 from core.orchestrator import JobApplicationOrchestrator
+from core.async_orchestrator import AsyncJobApplicationOrchestrator
+from core.supervisor import WorkerSupervisor
+from agents.push_receiver import PushNotificationReceiver
 from utils.logger import setup_logger
 
 # Load environment variables
@@ -49,6 +53,9 @@ def run_daemon(orchestrator: JobApplicationOrchestrator, interval: int = 300):
     logger.info(f"Check interval: {interval} seconds")
     logger.info("Press Ctrl+C to stop\n")
     
+    # Replies are sent from a background thread between checks
+    orchestrator.start_background_sending()
+    
     try:
         while True:
             run_once(orchestrator)
@@ -58,6 +65,168 @@ def run_daemon(orchestrator: JobApplicationOrchestrator, interval: int = 300):
             
     except KeyboardInterrupt:
         logger.info("\n\nStopping AI Recruiter Agent...")
+        orchestrator.outbox.stop(timeout=10)
+        sys.exit(0)
+
+
+def run_async_daemon(orchestrator: JobApplicationOrchestrator, interval: int = 300):
+    """
+    Run agent continuously on an asyncio event loop
+    
+    Messages in a cycle are processed concurrently (up to ASYNC_MAX_IN_FLIGHT)
+    with blocking mail, LLM and database calls running in thread pools.
+    """
+    async_orchestrator = AsyncJobApplicationOrchestrator(orchestrator)
+    
+    logger.info("Starting AI Recruiter Agent in async daemon mode")
+    logger.info(f"Check interval: {interval} seconds")
+    logger.info(f"Max messages in flight: {async_orchestrator.max_in_flight}")
+    logger.info("Press Ctrl+C to stop\n")
+    
+    try:
+        asyncio.run(async_orchestrator.run_forever(interval))
+    except KeyboardInterrupt:
+        logger.info("\n\nStopping AI Recruiter Agent...")
+        async_orchestrator.close()
+        sys.exit(0)
+
+
+def run_worker_daemon(orchestrator: JobApplicationOrchestrator, workers: int, interval: int = 300):
+    """
+    Run agent continuously with message processing spread over worker processes
+    
+    This process fetches mail, applies label/read changes and sends replies;
+    the workers share incoming messages through the database. Crashed
+    workers are restarted and their messages processed again.
+    """
+    supervisor = WorkerSupervisor(orchestrator, workers)
+    
+    logger.info(f"Starting AI Recruiter Agent with {supervisor.workers} worker processes")
+    logger.info(f"Check interval: {interval} seconds")
+    logger.info("Press Ctrl+C to stop\n")
+    
+    supervisor.start()
+    orchestrator.start_background_sending()
+    next_check = 0.0
+    
+    try:
+        while True:
+            if time.time() >= next_check:
+                logger.info(f"AI Recruiter Agent - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+                try:
+                    queued = supervisor.enqueue_new_messages()
+                    logger.info(f"Queued {queued} new message(s)" if queued else "No new messages")
+                except Exception as e:
+                    logger.error(f"Error fetching messages: {e}")
+                next_check = time.time() + interval
+            
+            count = supervisor.supervise()
+            if count:
+                logger.info(f"✓ Processed {count} message(s)")
+            time.sleep(1)
+            
+    except KeyboardInterrupt:
+        logger.info("\n\nStopping AI Recruiter Agent...")
+        supervisor.stop(timeout=10)
+        orchestrator.outbox.stop(timeout=10)
+        sys.exit(0)
+
+
+def run_push_daemon(orchestrator: JobApplicationOrchestrator, interval: int = 300):
+    """
+    Run agent driven by Gmail push notifications
+    
+    Each notification triggers an immediate incremental fetch; a regular
+    poll every `interval` seconds still runs as a safety net.
+    """
+    receiver = PushNotificationReceiver(
+        host=os.getenv('PUSH_HOST', '127.0.0.1'),
+        port=int(os.getenv('PUSH_PORT', '8080')),
+        path=os.getenv('PUSH_PATH', '/gmail/push'),
+        token=os.getenv('PUSH_VERIFICATION_TOKEN')
+    )
+    receiver.start()
+    
+    # Notifications only say "something changed", so fetch deltas, not the whole inbox
+    if orchestrator.email_agent.state_manager is not None:
+        orchestrator.email_agent.incremental_sync = True
+    
+    topic = os.getenv('GMAIL_PUBSUB_TOPIC')
+    watch_renew_at = 0.0
+    
+    logger.info("Starting AI Recruiter Agent in push mode")
+    logger.info(f"Listening for notifications on {receiver.url}")
+    logger.info(f"Safety-net poll interval: {interval} seconds")
+    if not topic:
+        logger.warning("GMAIL_PUBSUB_TOPIC not set - not registering a Gmail watch")
+    logger.info("Press Ctrl+C to stop\n")
+    
+    # Replies are sent from a background thread between checks
+    orchestrator.start_background_sending()
+    
+    try:
+        while True:
+            # Gmail watches expire after 7 days; renew daily
+            if topic and time.time() >= watch_renew_at:
+                if orchestrator.email_agent.watch(topic):
+                    logger.info(f"Gmail watch registered on {topic}")
+                    watch_renew_at = time.time() + 24 * 3600
+                else:
+                    watch_renew_at = time.time() + interval
+            
+            run_once(orchestrator)
+            
+            if receiver.wait(timeout=interval):
+                logger.info(f"Push notification received (historyId {receiver.latest_history_id})")
+            else:
+                logger.info("No notification - running safety-net poll")
+            
+    except KeyboardInterrupt:
+        logger.info("\n\nStopping AI Recruiter Agent...")
+        if topic:
+            orchestrator.email_agent.stop_watch()
+        receiver.stop()
+        orchestrator.outbox.stop(timeout=10)
+        sys.exit(0)
+
+
+def run_idle_daemon(orchestrator: JobApplicationOrchestrator, interval: int = 300):
+    """
+    Run agent woken by IMAP IDLE (MAIL_BACKEND=imap)
+    
+    The server announces new mail on a held-open connection, so replies go
+    out seconds after arrival; a poll every `interval` seconds still runs.
+    """
+    email_agent = orchestrator.email_agent
+    if not hasattr(email_agent, 'wait_for_mail'):
+        logger.error("IDLE mode needs the IMAP backend (set MAIL_BACKEND=imap)")
+        sys.exit(1)
+    
+    # Only fetch mail that arrived since the last check
+    if email_agent.state_manager is not None:
+        email_agent.incremental_sync = True
+    
+    logger.info("Starting AI Recruiter Agent in IMAP IDLE mode")
+    logger.info(f"Watching {email_agent.mailbox} on {email_agent.host}")
+    logger.info(f"Safety-net poll interval: {interval} seconds")
+    logger.info("Press Ctrl+C to stop\n")
+    
+    # Replies are sent from a background thread between checks
+    orchestrator.start_background_sending()
+    
+    try:
+        while True:
+            run_once(orchestrator)
+            
+            if email_agent.wait_for_mail(timeout=interval):
+                logger.info("New mail announced by IMAP IDLE")
+            else:
+                logger.info("No new mail - running safety-net poll")
+            
+    except KeyboardInterrupt:
+        logger.info("\n\nStopping AI Recruiter Agent...")
+        email_agent.close()
+        orchestrator.outbox.stop(timeout=10)
         sys.exit(0)
 
 
@@ -170,10 +339,14 @@ def setup_check(orchestrator: JobApplicationOrchestrator):
     """Check if setup is complete"""
     issues = []
     
-    # Check Gmail credentials
-    creds_path = os.getenv('GMAIL_CREDENTIALS_PATH', 'credentials/gmail_credentials.json')
-    if not os.path.exists(creds_path):
-        issues.append(f"Gmail credentials not found at {creds_path}")
+    # Check mail backend credentials
+    if os.getenv('MAIL_BACKEND', 'gmail').lower() == 'imap':
+        if not os.getenv('IMAP_USERNAME'):
+            issues.append("IMAP_USERNAME / IMAP_PASSWORD not set (MAIL_BACKEND=imap)")
+    else:
+        creds_path = os.getenv('GMAIL_CREDENTIALS_PATH', 'credentials/gmail_credentials.json')
+        if not os.path.exists(creds_path):
+            issues.append(f"Gmail credentials not found at {creds_path}")
     
     # Check LLM configuration
     llm_provider = os.getenv('LLM_PROVIDER', 'ollama')
@@ -205,9 +378,15 @@ def main():
     """Main entry point"""
     parser = argparse.ArgumentParser(description='AI Recruiter Agent - Automated job application assistant')
     parser.add_argument('--daemon', action='store_true', help='Run continuously in background')
+    parser.add_argument('--push', action='store_true', help='Run continuously, woken by Gmail push notifications')
+    parser.add_argument('--idle', action='store_true', help='Run continuously, woken by IMAP IDLE (MAIL_BACKEND=imap)')
+    parser.add_argument('--async', dest='use_async', action='store_true',
+                        help='Run continuously on an asyncio event loop (concurrent message processing)')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='Run continuously with N worker processes (for CPU-bound local models)')
     parser.add_argument('--once', action='store_true', help='Process messages once and exit')
     parser.add_argument('--interactive', action='store_true', help='Run in interactive mode')
-    parser.add_argument('--interval', type=int, default=300, help='Check interval in seconds (daemon mode)')
+    parser.add_argument('--interval', type=int, default=300, help='Check interval in seconds (daemon mode, safety-net poll in push/idle mode)')
     parser.add_argument('--setup-check', action='store_true', help='Check if setup is complete')
     
     args = parser.parse_args()
@@ -230,6 +409,14 @@ def main():
     # Run based on mode
     if args.once:
         run_once(orchestrator)
+    elif args.push:
+        run_push_daemon(orchestrator, args.interval)
+    elif args.idle:
+        run_idle_daemon(orchestrator, args.interval)
+    elif args.workers:
+        run_worker_daemon(orchestrator, args.workers, args.interval)
+    elif args.use_async:
+        run_async_daemon(orchestrator, args.interval)
     elif args.daemon:
         run_daemon(orchestrator, args.interval)
     elif args.interactive:
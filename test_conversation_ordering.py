@@ -0,0 +1,130 @@
+"""
+Check that the conversation pipeline keeps each Gmail thread in order
+
+Drives JobApplicationOrchestrator with the staged pipeline and several
+workers per converse step over a FakeGmailService inbox where every thread holds
+several unread messages. Each thread's messages must land in its
+conversation history oldest first and exactly once, and get exactly one
+outbox entry each, queued in the same order; lost or duplicated updates mean
+two messages of one thread ran at the same time. A message's state step must
+also wait until the thread's previous message has been dispatched.
+
+Run: python test_conversation_ordering.py   (or pytest test_conversation_ordering.py)
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import time
+
+from agents.fake_gmail import RECRUITER_SENDERS
+from load_test import build_simulated_orchestrator
+from utils.metrics import metrics
+
+THREADS = 6
+MESSAGES_PER_THREAD = 5
+
+
+def _fill_threads(gmail):
+    """Deliver MESSAGES_PER_THREAD recruiter messages into each of THREADS threads"""
+    expected = {}
+    for t in range(THREADS):
+        name, address = RECRUITER_SENDERS[t % len(RECRUITER_SENDERS)]
+        thread_id = None
+        for n in range(MESSAGES_PER_THREAD):
+            body = (f"Hi Elena, following up on the Senior QA Automation Engineer role (thread {t}, "
+                    f"note {n}). What is your rate expectation and availability for an interview?")
+            message = gmail.add_message(f"{name} <{address}>", 'Senior QA Automation Engineer role with Acme',
+                                        body, thread_id=thread_id)
+            thread_id = message['threadId']
+            expected.setdefault(thread_id, []).append((message['id'], body))
+    return expected
+
+
+def _widen_race_window(state_manager, delay: float = 0.005):
+    """Slow down reads outside a transaction, so two concurrent messages of one thread would both see no state"""
+    get_state = state_manager.get_state
+
+    def slow_get_state(thread_id, conn=None):
+        if conn is None:
+            time.sleep(delay)
+        return get_state(thread_id, conn)
+
+    state_manager.get_state = slow_get_state
+
+
+def _record_step_order(orchestrator):
+    """Wrap the email steps; returns (thread_id, dispatched before it) for each state step"""
+    steps = orchestrator.channel_stages['email']
+    dispatched, seen = {}, []
+    state, dispatch = steps['state'], steps['dispatch']
+
+    def recording_state(email):
+        seen.append((email['thread_id'], dispatched.get(email['thread_id'], 0)))
+        return state(email)
+
+    def recording_dispatch(email, *args):
+        result = dispatch(email, *args)
+        dispatched[email['thread_id']] = dispatched.get(email['thread_id'], 0) + 1
+        return result
+
+    orchestrator.channel_stages['email'] = dict(steps, state=recording_state, dispatch=recording_dispatch)
+    return seen
+
+
+def test_pipeline_keeps_thread_order():
+    workdir = tempfile.mkdtemp(prefix='aria-ordering-')
+    try:
+        orchestrator, gmail, _ = build_simulated_orchestrator(workdir, emails=0, llm_latency=0.01)
+        orchestrator.pipeline_enabled = True
+        orchestrator.pipeline_step_workers = {'state': 2, 'generate': 4, 'dispatch': 2}
+        orchestrator.llm_batch_mode = False
+        expected = _fill_threads(gmail)
+        _widen_race_window(orchestrator.state_manager)
+        seen = _record_step_order(orchestrator)
+
+        metrics.reset()
+        stdout = sys.stdout
+        with open(os.devnull, 'w') as devnull:
+            sys.stdout = devnull
+            try:
+                processed = orchestrator.process_new_messages()
+            finally:
+                sys.stdout = stdout
+
+        assert processed == THREADS * MESSAGES_PER_THREAD, processed
+
+        # The n-th message of a thread starts only after the n-1 before it were dispatched
+        for thread_id in expected:
+            before = [count for seen_thread, count in seen if seen_thread == thread_id]
+            assert before == list(range(MESSAGES_PER_THREAD)), (thread_id, before)
+
+        state_manager = orchestrator.state_manager
+        for thread_id, messages in expected.items():
+            bodies = [body for _, body in messages]
+            # Both the message log and the history carried on the conversation state
+            for history in (state_manager.get_conversation_history(thread_id),
+                            state_manager.get_state(thread_id).conversation_history):
+                incoming = [entry['content'] for entry in history if entry.get('direction') == 'incoming']
+                assert incoming == bodies, (thread_id, incoming)
+
+        conn = state_manager._connect()
+        rows = conn.execute("SELECT thread_id, idempotency_key FROM outbox ORDER BY id").fetchall()
+        conn.close()
+        assert len(rows) == THREADS * MESSAGES_PER_THREAD, len(rows)
+        for thread_id, messages in expected.items():
+            keys = [key for row_thread, key in rows if row_thread == thread_id]
+            assert keys == [f"email:{thread_id}:{msg_id}" for msg_id, _ in messages], (thread_id, keys)
+
+        # The converse stage still reports its state/generate/dispatch breakdown
+        summaries = metrics.snapshot()['summaries']
+        for step in ('state', 'generate', 'dispatch'):
+            assert summaries[f'pipeline.{step}.seconds']['count'] == THREADS * MESSAGES_PER_THREAD, step
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    test_pipeline_keeps_thread_order()
+    print(f"{THREADS} threads x {MESSAGES_PER_THREAD} messages: one history and one outbox entry each")
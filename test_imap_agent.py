@@ -0,0 +1,166 @@
+"""
+Check ImapAgent against a local IMAP/SMTP server
+
+Runs agents.fake_imap.FakeMailServer on localhost and covers the UID
+checkpoint (first run, incremental polls, commit only after handling,
+UIDVALIDITY change), flag updates, IDLE wake-ups, reply threading and
+batched replies.
+
+Run: python test_imap_agent.py   (or pytest test_imap_agent.py)
+"""
+
+import os
+import time
+import tempfile
+import threading
+
+from agents.fake_gmail import RECRUITER_SENDERS
+from agents.fake_imap import FakeMailServer
+from agents.imap_agent import ImapAgent
+from core.state_manager import StateManager
+
+
+def _recruiter_mail(server: FakeMailServer, count: int, **kwargs) -> list:
+    uids = []
+    for n in range(count):
+        name, address = RECRUITER_SENDERS[n % len(RECRUITER_SENDERS)]
+        uids.append(server.add_message(f"{name} <{address}>", f"Senior QA Automation Engineer role ({n})",
+                                       "Hi Elena, what is your rate expectation for this contract role?",
+                                       **kwargs))
+    return uids
+
+
+def _agent(server: FakeMailServer, state_manager=None) -> ImapAgent:
+    return ImapAgent(host='127.0.0.1', port=server.imap_port, use_ssl=False,
+                     username='elena', password='secret',
+                     smtp_host='127.0.0.1', smtp_port=server.smtp_port,
+                     from_address='elena@example.com',
+                     state_manager=state_manager, incremental_sync=state_manager is not None)
+
+
+def _state_manager() -> StateManager:
+    return StateManager(db_path=os.path.join(tempfile.mkdtemp(prefix='aria-imap-'), 'conversations.db'))
+
+
+def test_first_run_handles_every_unread_message():
+    with FakeMailServer() as server:
+        _recruiter_mail(server, 3, flags=['\\Seen'])
+        unread = _recruiter_mail(server, 25)
+        state_manager = _state_manager()
+        agent = _agent(server, state_manager)
+
+        emails = agent.get_unread_recruiter_emails(max_results=10)
+
+        assert sorted(int(e['id'].split('-')[1]) for e in emails) == unread
+        # Nothing is stored until the cycle's mail is handled
+        assert state_manager.get_sync_value(ImapAgent.LAST_UID_KEY) is None
+        agent.commit_sync_checkpoint()
+        assert state_manager.get_sync_value(ImapAgent.LAST_UID_KEY) == str(unread[-1])
+        agent.close()
+
+
+def test_incremental_polls_follow_the_checkpoint():
+    with FakeMailServer() as server:
+        _recruiter_mail(server, 2)
+        state_manager = _state_manager()
+        agent = _agent(server, state_manager)
+        agent.get_unread_recruiter_emails()
+        agent.commit_sync_checkpoint()
+
+        new = _recruiter_mail(server, 3)
+        first = agent.get_unread_recruiter_emails()
+        # Not committed (e.g. the cycle failed): the same mail comes back
+        again = agent.get_unread_recruiter_emails()
+        assert [e['id'] for e in first] == [e['id'] for e in again]
+        assert sorted(int(e['id'].split('-')[1]) for e in first) == new
+
+        agent.commit_sync_checkpoint()
+        assert agent.get_unread_recruiter_emails() == []
+        assert state_manager.get_sync_value(ImapAgent.LAST_UID_KEY) == str(new[-1])
+
+        # A rebuilt mailbox invalidates the stored UIDs: start over with an unread search
+        server.renumber()
+        agent.close()
+        agent = _agent(server, state_manager)
+        assert len(agent.get_unread_recruiter_emails()) == 5
+        agent.commit_sync_checkpoint()
+        assert state_manager.get_sync_value(ImapAgent.UIDVALIDITY_KEY) == str(server.uidvalidity)
+        agent.close()
+
+
+def test_flags_are_applied_in_one_store_per_change():
+    with FakeMailServer() as server:
+        uids = _recruiter_mail(server, 3)
+        agent = _agent(server)
+        ids = {int(e['id'].split('-')[1]): e['id'] for e in agent.get_unread_recruiter_emails()}
+
+        for msg_id in ids.values():
+            agent.queue_label(msg_id, 'AI-Recruiter/Processed')
+        agent.queue_mark_as_read(ids[uids[0]])
+
+        # One UID STORE for the labelled-and-read message, one for the other two
+        assert agent.flush_modifications() == 2
+        assert server.flags(uids[0]) == {'AI-Recruiter_Processed', '\\Seen'}
+        assert server.flags(uids[1]) == server.flags(uids[2]) == {'AI-Recruiter_Processed'}
+        assert sorted(e['id'] for e in agent.get_unread_recruiter_emails()) == sorted([ids[uids[1]], ids[uids[2]]])
+        agent.close()
+
+
+def test_idle_wakes_on_new_mail():
+    with FakeMailServer() as server:
+        agent = _agent(server)
+        assert agent.wait_for_mail(timeout=0.3) is False
+
+        threading.Timer(0.2, _recruiter_mail, args=(server, 1)).start()
+        started = time.monotonic()
+        assert agent.wait_for_mail(timeout=5) is True
+        assert time.monotonic() - started < 2
+        agent.close()
+
+
+def test_reply_threads_under_the_replied_message():
+    with FakeMailServer() as server:
+        name, address = RECRUITER_SENDERS[0]
+        root = '<root@talentbridge.example>'
+        server.add_message(f"{name} <{address}>", 'QA Architect role', 'Hi Elena, interested?', message_id=root)
+        server.add_message(f"{name} <{address}>", 'Re: QA Architect role',
+                           'Following up - what is your rate expectation for this contract role?',
+                           message_id='<followup@talentbridge.example>', in_reply_to=root)
+        agent = _agent(server)
+        followup = next(e for e in agent.get_unread_recruiter_emails()
+                        if e['message_id'] == '<followup@talentbridge.example>')
+
+        assert agent.send_reply(followup['thread_id'], address, followup['subject'], 'Thanks!',
+                                in_reply_to=followup['message_id'], references=followup['references'])
+
+        reply = server.sent[-1]
+        assert reply['In-Reply-To'] == '<followup@talentbridge.example>'
+        assert reply['References'].split() == [root, '<followup@talentbridge.example>']
+        assert reply['Subject'] == 'Re: QA Architect role'
+        agent.close()
+
+
+def test_replies_share_one_smtp_session():
+    with FakeMailServer() as server:
+        _recruiter_mail(server, 3)
+        agent = _agent(server)
+        emails = agent.get_unread_recruiter_emails()
+
+        sent = agent.send_replies([{'thread_id': e['thread_id'], 'to': e['from'], 'subject': e['subject'],
+                                    'body': 'Thanks!', 'in_reply_to': e['message_id'],
+                                    'references': e['references']} for e in emails])
+
+        assert sent == [True, True, True]
+        assert server.smtp_sessions == 1
+        assert [reply['In-Reply-To'] for reply in server.sent] == [e['message_id'] for e in emails]
+        agent.close()
+
+
+if __name__ == "__main__":
+    test_first_run_handles_every_unread_message()
+    test_incremental_polls_follow_the_checkpoint()
+    test_flags_are_applied_in_one_store_per_change()
+    test_idle_wakes_on_new_mail()
+    test_reply_threads_under_the_replied_message()
+    test_replies_share_one_smtp_session()
+    print("IMAP agent checks passed")
@@ -0,0 +1,109 @@
+"""
+Check that pooled Gmail services work with real batch requests
+
+Runs a googleapiclient BatchHttpRequest through GmailServicePool against a
+stubbed transport (no network), and checks that threads sharing expired
+credentials refresh them only once.
+
+Run: python test_service_pool.py   (or pytest test_service_pool.py)
+"""
+
+import json
+import re
+import threading
+import time
+
+import httplib2
+from google.oauth2.credentials import Credentials
+
+from agents.service_pool import GmailServicePool
+
+
+class StubTransport:
+    """httplib2.Http stand-in that answers every part of a batch request"""
+
+    def __init__(self):
+        self.requests = []
+
+    def request(self, uri, method='GET', body=None, headers=None, **kwargs):
+        self.requests.append((uri, method, headers or {}))
+        body = body.decode() if isinstance(body, bytes) else (body or '')
+        parts = ''.join(
+            f'--BOUNDARY\r\nContent-Type: application/http\r\nContent-ID: <response-{cid}>\r\n\r\n'
+            f'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n\r\n'
+            f'{json.dumps({"id": cid.split(" + ")[-1]})}\r\n'
+            for cid in re.findall(r'Content-ID: <([^>]+)>', body)
+        )
+        response = httplib2.Response({'status': '200', 'content-type': 'multipart/mixed; boundary=BOUNDARY'})
+        return response, (parts + '--BOUNDARY--').encode()
+
+
+class CountingCredentials(Credentials):
+    """OAuth credentials whose refresh is slow and counted instead of hitting Google"""
+
+    def __init__(self):
+        super().__init__(token=None, refresh_token='refresh', client_id='id', client_secret='secret',
+                         token_uri='https://oauth2.googleapis.com/token')
+        self.refreshes = 0
+
+    def refresh(self, request):
+        time.sleep(0.05)
+        self.refreshes += 1
+        self.token = f'token-{self.refreshes}'
+
+
+def _run_batch(pool, message_ids):
+    service = pool.get()
+    results = {}
+    batch = service.new_batch_http_request(
+        callback=lambda request_id, response, exception: results.__setitem__(request_id, (response, exception))
+    )
+    for message_id in message_ids:
+        batch.add(service.users().messages().get(userId='me', id=message_id), request_id=message_id)
+    batch.execute()
+    return results
+
+
+def test_batch_request_through_pool():
+    transport = StubTransport()
+    pool = GmailServicePool(Credentials(token='abc'), http_factory=lambda: transport)
+
+    results = _run_batch(pool, ['m1', 'm2'])
+
+    assert results == {'m1': ({'id': 'm1'}, None), 'm2': ({'id': 'm2'}, None)}, results
+    assert len(transport.requests) == 1
+    uri, method, headers = transport.requests[0]
+    assert uri.endswith('/batch') and method == 'POST', (uri, method)
+    assert headers.get('authorization') == 'Bearer abc', headers
+
+
+def test_concurrent_refresh_happens_once():
+    credentials = CountingCredentials()
+    transport = StubTransport()
+    pool = GmailServicePool(credentials, http_factory=lambda: transport)
+
+    errors = []
+
+    def fetch(index):
+        try:
+            results = _run_batch(pool, [f'm{index}'])
+            assert results[f'm{index}'][1] is None
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=fetch, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors, errors
+    assert credentials.refreshes == 1, credentials.refreshes
+    assert pool.size == 8
+    assert {headers.get('authorization') for _, _, headers in transport.requests} == {'Bearer token-1'}
+
+
+if __name__ == "__main__":
+    test_batch_request_through_pool()
+    test_concurrent_refresh_happens_once()
+    print("service pool checks passed")
@@ -0,0 +1,92 @@
+"""
+Check the multi-process work queue (main.py --workers N)
+
+Queues a FakeGmailService inbox through WorkerSupervisor and leases it the
+way worker processes do, without starting any: each conversation's messages
+must be leased oldest first, and messages given up on must record when.
+
+Run: python test_work_queue.py   (or pytest test_work_queue.py)
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+
+from agents.fake_gmail import RECRUITER_SENDERS
+from core.supervisor import WorkerSupervisor
+from load_test import build_simulated_orchestrator
+
+THREADS = 3
+MESSAGES_PER_THREAD = 4
+
+
+def _quiet(func, *args):
+    stdout = sys.stdout
+    with open(os.devnull, 'w') as devnull:
+        sys.stdout = devnull
+        try:
+            return func(*args)
+        finally:
+            sys.stdout = stdout
+
+
+def test_leases_follow_arrival_order_within_a_conversation():
+    workdir = tempfile.mkdtemp(prefix='aria-work-queue-')
+    try:
+        orchestrator, gmail, _ = build_simulated_orchestrator(workdir, emails=0)
+        # Interleave the threads, so queue order across conversations is mixed too
+        arrivals, thread_ids = {}, [None] * THREADS
+        for n in range(MESSAGES_PER_THREAD):
+            for t in range(THREADS):
+                name, address = RECRUITER_SENDERS[t % len(RECRUITER_SENDERS)]
+                message = gmail.add_message(f"{name} <{address}>", 'Senior QA Automation Engineer role',
+                                            f"Hi Elena, what is your rate expectation? (thread {t}, note {n})",
+                                            thread_id=thread_ids[t])
+                thread_ids[t] = message['threadId']
+                arrivals.setdefault(message['threadId'], []).append(message['id'])
+
+        supervisor = WorkerSupervisor(orchestrator, workers=1)
+        assert _quiet(supervisor.enqueue_new_messages) == THREADS * MESSAGES_PER_THREAD
+
+        state_manager = orchestrator.state_manager
+        leased = {}
+        while True:
+            work = state_manager.claim_work('worker-0', lease_seconds=60)
+            if work is None:
+                break
+            leased.setdefault(work['payload']['thread_id'], []).append(work['message_id'])
+            assert state_manager.complete_work(work['id'], 'worker-0', {})
+
+        assert leased == arrivals, leased
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_given_up_work_records_finished_at():
+    workdir = tempfile.mkdtemp(prefix='aria-work-queue-')
+    try:
+        orchestrator, _, _ = build_simulated_orchestrator(workdir, emails=0)
+        state_manager = orchestrator.state_manager
+        for message_id in ('m1', 'm2'):
+            state_manager.enqueue_work(message_id, f"email:{message_id}", 'email', {'id': message_id})
+
+        # Out of attempts after a processing error, and after the worker died
+        work = state_manager.claim_work('worker-0', lease_seconds=60, max_attempts=1)
+        assert state_manager.fail_work(work['id'], 'worker-0', 'boom', max_attempts=1)
+        state_manager.claim_work('worker-1', lease_seconds=60, max_attempts=1)
+        assert state_manager.release_work('worker-1', 'worker exited', max_attempts=1) == 1
+
+        conn = state_manager._connect()
+        rows = conn.execute("SELECT message_id, status, finished_at FROM work_queue ORDER BY id").fetchall()
+        conn.close()
+        assert [(message_id, status) for message_id, status, _ in rows] == [('m1', 'failed'), ('m2', 'failed')]
+        assert all(finished_at for _, _, finished_at in rows), rows
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    test_leases_follow_arrival_order_within_a_conversation()
+    test_given_up_work_records_finished_at()
+    print("work queue checks passed")
@@ -0,0 +1,142 @@
+"""
+Train the recruiter email classifier and report accuracy and speed
+
+Usage:
+    # Build a corpus from Gmail: emails ARIA labeled vs. read inbox mail it ignored
+    python train_recruiter_classifier.py --from-gmail 500
+
+    # Train from an existing local corpus (JSONL of {from, from_name, subject, is_recruiter})
+    python train_recruiter_classifier.py --corpus data/recruiter_corpus.jsonl
+
+The model is written to RECRUITER_MODEL_PATH (default data/recruiter_model.json)
+and is picked up by EmailAgent on the next start.
+"""
+
+import os
+import sys
+import json
+import time
+import zlib
+import argparse
+from dotenv import load_dotenv
+
+from agents.recruiter_classifier import RecruiterClassifier, is_recruiter_heuristic
+
+load_dotenv()
+
+PROCESSED_QUERY = 'label:ai-recruiter-processed'
+IGNORED_QUERY = 'in:inbox -label:ai-recruiter-processed -is:unread'
+
+
+def fetch_gmail_corpus(limit: int) -> list:
+    """Headers of labeled (recruiter) and ignored (other) emails"""
+    from agents.email_agent import EmailAgent
+
+    agent = EmailAgent(
+        credentials_path=os.getenv('GMAIL_CREDENTIALS_PATH', 'credentials/gmail_credentials.json'),
+        token_path=os.getenv('GMAIL_TOKEN_PATH', 'credentials/gmail_token.json')
+    )
+
+    corpus = []
+    for query, is_recruiter in [(PROCESSED_QUERY, True), (IGNORED_QUERY, False)]:
+        msg_ids, page_token = [], None
+        while len(msg_ids) < limit:
+            results = agent.service.users().messages().list(
+                userId='me', q=query, maxResults=min(500, limit - len(msg_ids)), pageToken=page_token
+            ).execute()
+            msg_ids.extend(msg['id'] for msg in results.get('messages', []))
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                break
+
+        fetched = agent._fetch_messages(msg_ids, format='metadata',
+                                        metadata_headers=agent.SCREENING_HEADERS)
+        for message in fetched.values():
+            email = agent._parse_message(message, include_body=False)
+            corpus.append({
+                'from': email.get('from', ''),
+                'from_name': email.get('from_name', ''),
+                'subject': email.get('subject', ''),
+                'is_recruiter': is_recruiter
+            })
+        print(f"Fetched {len(fetched)} emails for: {query}")
+
+    return corpus
+
+
+def report(name: str, predict, samples: list):
+    """Print accuracy / precision / recall and per-email latency"""
+    tp = fp = tn = fn = 0
+    start = time.perf_counter()
+    for email, actual in samples:
+        predicted = predict(email)
+        if predicted and actual:
+            tp += 1
+        elif predicted:
+            fp += 1
+        elif actual:
+            fn += 1
+        else:
+            tn += 1
+    elapsed = time.perf_counter() - start
+
+    total = max(len(samples), 1)
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    print(f"{name:<12} {(tp + tn) / total:>9.1%} {precision:>10.1%} {recall:>8.1%} "
+          f"{elapsed / total * 1e6:>12.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Train the recruiter email classifier')
+    parser.add_argument('--from-gmail', type=int, metavar='N',
+                        help='Fetch up to N labeled and N ignored emails from Gmail')
+    parser.add_argument('--corpus', default='data/recruiter_corpus.jsonl',
+                        help='Local corpus to read (or write, with --from-gmail)')
+    parser.add_argument('--model', default=os.getenv('RECRUITER_MODEL_PATH', 'data/recruiter_model.json'),
+                        help='Where to save the trained model')
+    args = parser.parse_args()
+
+    if args.from_gmail:
+        corpus = fetch_gmail_corpus(args.from_gmail)
+        os.makedirs(os.path.dirname(args.corpus) or '.', exist_ok=True)
+        with open(args.corpus, 'w') as f:
+            for row in corpus:
+                f.write(json.dumps(row) + '\n')
+        print(f"Saved corpus to {args.corpus}")
+    elif os.path.exists(args.corpus):
+        with open(args.corpus, 'r') as f:
+            corpus = [json.loads(line) for line in f if line.strip()]
+    else:
+        print(f"Corpus not found: {args.corpus} (use --from-gmail to build one)")
+        sys.exit(1)
+
+    samples = [(row, bool(row['is_recruiter'])) for row in corpus]
+
+    # Deterministic 80/20 split so repeated runs are comparable
+    def held_out(email):
+        key = f"{email.get('from')}|{email.get('subject')}".encode('utf-8')
+        return zlib.crc32(key) % 5 == 0
+
+    train = [s for s in samples if not held_out(s[0])]
+    test = [s for s in samples if held_out(s[0])] or train
+
+    classifier = RecruiterClassifier().train(train)
+
+    print("=" * 80)
+    print(f"RECRUITER CLASSIFIER - {len(train)} train / {len(test)} test "
+          f"({sum(1 for _, r in samples if r)} recruiter, {sum(1 for _, r in samples if not r)} other)")
+    print("=" * 80)
+    print(f"{'Method':<12} {'Accuracy':>9} {'Precision':>10} {'Recall':>8} {'us/email':>12}")
+    print("-" * 80)
+    report('heuristic', is_recruiter_heuristic, test)
+    report('model', classifier.is_recruiter, test)
+    print("=" * 80)
+
+    # Final model uses every sample
+    RecruiterClassifier().train(samples).save(args.model)
+    print(f"Model saved to {args.model}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,7 @@ Utility functions
 """
 
 from utils.logger import setup_logger, log_conversation, log_escalation
+from utils.metrics import Metrics, metrics
 
-__all__ = ['setup_logger', 'log_conversation', 'log_escalation']
+__all__ = ['setup_logger', 'log_conversation', 'log_escalation', 'Metrics', 'metrics']
 
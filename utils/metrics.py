@@ -0,0 +1,68 @@
+"""
+In-process metrics registry
+
+Counters, gauges and simple summaries (count/sum/min/max/last) shared by all
+components. Thread-safe; read with metrics.snapshot().
+"""
+
+import threading
+from typing import Dict
+
+
+class Metrics:
+    """Thread-safe counters, gauges and value summaries"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {}
+        self._gauges: Dict[str, float] = {}
+        self._summaries: Dict[str, Dict[str, float]] = {}
+
+    def increment(self, name: str, value: float = 1):
+        """Add to a counter"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def gauge(self, name: str, value: float):
+        """Set a gauge to its current value"""
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, value: float):
+        """Record one observation of a value (latency, size, ...)"""
+        with self._lock:
+            summary = self._summaries.get(name)
+            if summary is None:
+                self._summaries[name] = {
+                    'count': 1, 'sum': value, 'min': value, 'max': value, 'last': value
+                }
+                return
+
+            summary['count'] += 1
+            summary['sum'] += value
+            summary['min'] = min(summary['min'], value)
+            summary['max'] = max(summary['max'], value)
+            summary['last'] = value
+
+    def snapshot(self) -> Dict:
+        """Copy of all metrics, with an average added to each summary"""
+        with self._lock:
+            summaries = {
+                name: dict(summary, avg=summary['sum'] / summary['count'])
+                for name, summary in self._summaries.items()
+            }
+            return {
+                'counters': dict(self._counters),
+                'gauges': dict(self._gauges),
+                'summaries': summaries,
+            }
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._summaries.clear()
+
+
+# Shared registry
+metrics = Metrics()
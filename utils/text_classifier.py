@@ -0,0 +1,166 @@
+"""
+Tiny multinomial naive Bayes text classifier over hashed features
+
+Used where a keyword heuristic is good but a small trained model can do
+better (stage prediction, recruiter email detection). No third-party
+dependencies; models are persisted as plain JSON.
+"""
+
+import os
+import re
+import json
+import math
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9$][a-z0-9$+#.'-]*")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens, with trailing punctuation trimmed"""
+    return [token.rstrip(".'-") for token in TOKEN_PATTERN.findall((text or '').lower())]
+
+
+def hashed_features(text: str, n_features: int, bigrams: bool = True) -> Dict[int, int]:
+    """Map text to sparse {bucket: count} features using the hashing trick"""
+    tokens = tokenize(text)
+    grams = list(tokens)
+    if bigrams:
+        grams.extend(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+
+    features: Dict[int, int] = {}
+    for gram in grams:
+        # crc32 is stable across processes, unlike hash()
+        bucket = zlib.crc32(gram.encode('utf-8')) % n_features
+        features[bucket] = features.get(bucket, 0) + 1
+    return features
+
+
+class NaiveBayesTextClassifier:
+    """Multinomial naive Bayes with Laplace smoothing over hashed n-grams"""
+
+    def __init__(self, n_features: int = 2 ** 14, alpha: float = 1.0, bigrams: bool = True):
+        self.n_features = n_features
+        self.alpha = alpha
+        self.bigrams = bigrams
+        self.class_doc_counts: Dict[str, int] = {}
+        self.class_feature_counts: Dict[str, Dict[int, int]] = {}
+        self.class_totals: Dict[str, int] = {}
+        self._log_priors: Dict[str, float] = {}
+        self._log_unseen: Dict[str, float] = {}
+        self._log_likelihoods: Dict[str, Dict[int, float]] = {}
+
+    @property
+    def classes(self) -> List[str]:
+        return sorted(self.class_doc_counts)
+
+    @property
+    def is_trained(self) -> bool:
+        return bool(self.class_doc_counts)
+
+    def fit(self, samples: Iterable[Tuple[str, str]]) -> 'NaiveBayesTextClassifier':
+        """Train from (text, label) pairs, replacing any previous model"""
+        self.class_doc_counts = {}
+        self.class_feature_counts = {}
+        self.class_totals = {}
+        return self.partial_fit(samples)
+
+    def partial_fit(self, samples: Iterable[Tuple[str, str]]) -> 'NaiveBayesTextClassifier':
+        """Add (text, label) pairs to the current counts"""
+        for text, label in samples:
+            self.class_doc_counts[label] = self.class_doc_counts.get(label, 0) + 1
+            counts = self.class_feature_counts.setdefault(label, {})
+            for bucket, count in hashed_features(text, self.n_features, self.bigrams).items():
+                counts[bucket] = counts.get(bucket, 0) + count
+                self.class_totals[label] = self.class_totals.get(label, 0) + count
+
+        self._compile()
+        return self
+
+    def _compile(self):
+        """Precompute log probabilities so prediction is a few dict lookups"""
+        total_docs = sum(self.class_doc_counts.values())
+        self._log_priors = {}
+        self._log_unseen = {}
+        self._log_likelihoods = {}
+
+        for label, doc_count in self.class_doc_counts.items():
+            denominator = self.class_totals.get(label, 0) + self.alpha * self.n_features
+            self._log_priors[label] = math.log(doc_count / total_docs)
+            self._log_unseen[label] = math.log(self.alpha / denominator)
+            self._log_likelihoods[label] = {
+                bucket: math.log((count + self.alpha) / denominator)
+                for bucket, count in self.class_feature_counts.get(label, {}).items()
+            }
+
+    def predict_proba(self, text: str) -> Dict[str, float]:
+        """Posterior probability for every class"""
+        if not self.is_trained:
+            return {}
+
+        features = hashed_features(text, self.n_features, self.bigrams)
+        scores = {}
+        for label, log_prior in self._log_priors.items():
+            likelihoods = self._log_likelihoods[label]
+            unseen = self._log_unseen[label]
+            score = log_prior
+            for bucket, count in features.items():
+                score += count * likelihoods.get(bucket, unseen)
+            scores[label] = score
+
+        # Normalise in log space to avoid underflow
+        top = max(scores.values())
+        exp_scores = {label: math.exp(score - top) for label, score in scores.items()}
+        total = sum(exp_scores.values())
+        return {label: value / total for label, value in exp_scores.items()}
+
+    def predict(self, text: str) -> Tuple[Optional[str], float]:
+        """Most likely class and its probability"""
+        probabilities = self.predict_proba(text)
+        if not probabilities:
+            return None, 0.0
+        label = max(probabilities, key=probabilities.get)
+        return label, probabilities[label]
+
+    def save(self, path: str):
+        """Persist the model as JSON"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        data = {
+            'type': 'naive_bayes',
+            'n_features': self.n_features,
+            'alpha': self.alpha,
+            'bigrams': self.bigrams,
+            'class_doc_counts': self.class_doc_counts,
+            'class_totals': self.class_totals,
+            # JSON object keys must be strings
+            'class_feature_counts': {
+                label: {str(bucket): count for bucket, count in counts.items()}
+                for label, counts in self.class_feature_counts.items()
+            },
+        }
+        with open(path, 'w') as f:
+            json.dump(data, f)
+
+    @classmethod
+    def load(cls, path: str) -> 'NaiveBayesTextClassifier':
+        """Load a model saved with save()"""
+        with open(path, 'r') as f:
+            data = json.load(f)
+
+        model = cls(
+            n_features=data['n_features'],
+            alpha=data.get('alpha', 1.0),
+            bigrams=data.get('bigrams', True)
+        )
+        model.class_doc_counts = data['class_doc_counts']
+        model.class_totals = data['class_totals']
+        model.class_feature_counts = {
+            label: {int(bucket): count for bucket, count in counts.items()}
+            for label, counts in data['class_feature_counts'].items()
+        }
+        model._compile()
+        return model